@@ -0,0 +1,88 @@
+# Журнал ответов в тренировках: строка attempts на каждое отвеченное слово. Ответы копятся
+# в памяти и уходят в базу одной транзакцией executemany — раз в flush_interval секунд, когда
+# их набралось batch_size, и при остановке бота. В той же транзакции обновляются сводки:
+# word_stats (ответы и ошибки по каждому слову пользователя) и daily_stats (по дням), так что
+# «трудные слова» и статистика за неделю читаются из них, без прохода по журналу.
+# При падении процесса теряются ответы последних flush_interval секунд.
+import time
+from datetime import datetime, timedelta, timezone
+
+from storage import WriteBehind
+
+# Ошибка — оценка ниже 3 по шкале SM-2 (см. srs.schedule)
+FAILED_QUALITY = 3
+
+SQL_INSERT_ATTEMPTS = ("INSERT INTO attempts (user_id, dict_id, word_id, quality, answered_at) "
+                       "VALUES (?, ?, ?, ?, ?)")
+SQL_ADD_WORD_STATS = ("INSERT INTO word_stats (user_id, word_id, attempts, errors, last_at) VALUES (?, ?, ?, ?, ?) "
+                      "ON CONFLICT (user_id, word_id) DO UPDATE SET attempts = attempts + excluded.attempts, "
+                      "errors = errors + excluded.errors, last_at = max(last_at, excluded.last_at)")
+SQL_ADD_DAILY_STATS = ("INSERT INTO daily_stats (user_id, day, attempts, errors) VALUES (?, ?, ?, ?) "
+                       "ON CONFLICT (user_id, day) DO UPDATE SET attempts = attempts + excluded.attempts, "
+                       "errors = errors + excluded.errors")
+SQL_HARDEST_WORDS = ("SELECT w.eng, (SELECT group_concat(rus, ';') FROM translations WHERE word_id = w.id), "
+                     "s.errors, s.attempts FROM word_stats s JOIN words w ON w.id = s.word_id "
+                     "WHERE s.user_id = ? AND s.errors > 0 "
+                     "ORDER BY CAST(s.errors AS REAL) / s.attempts DESC, s.errors DESC, s.last_at DESC LIMIT ?")
+SQL_DAILY_STATS = ("SELECT coalesce(sum(attempts), 0), coalesce(sum(errors), 0) FROM daily_stats "
+                   "WHERE user_id = ? AND day >= ?")
+
+
+def day_of(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def write_attempts(conn, rows):
+    # rows — [(user_id, dict_id, word_id, quality, answered_at)]; сводки складываются в памяти,
+    # в базу — по строке на слово и на день
+    words, days = {}, {}
+    for user_id, _, word_id, quality, answered_at in rows:
+        failed = int(quality < FAILED_QUALITY)
+        attempts, errors, last_at = words.get((user_id, word_id), (0, 0, 0))
+        words[user_id, word_id] = (attempts + 1, errors + failed, max(last_at, answered_at))
+        key = (user_id, day_of(answered_at))
+        attempts, errors = days.get(key, (0, 0))
+        days[key] = (attempts + 1, errors + failed)
+    conn.executemany(SQL_INSERT_ATTEMPTS, rows)
+    conn.executemany(SQL_ADD_WORD_STATS, [key + value for key, value in words.items()])
+    conn.executemany(SQL_ADD_DAILY_STATS, [key + value for key, value in days.items()])
+
+
+def hardest_words(conn, user_id, limit):
+    # [(eng, переводы через ";", ошибок, ответов)] — сначала с наибольшей долей ошибок
+    return conn.execute(SQL_HARDEST_WORDS, (user_id, limit)).fetchall()
+
+
+def recent_stats(conn, user_id, days, now=None):
+    # (ответов, ошибок) за последние days дней, включая сегодня
+    now = time.time() if now is None else now
+    since = day_of(now - timedelta(days=days - 1).total_seconds())
+    return conn.execute(SQL_DAILY_STATS, (user_id, since)).fetchone()
+
+
+class AttemptLog(WriteBehind):
+    def __init__(self, db, flush_interval=2.0, batch_size=500):
+        super().__init__(flush_interval)
+        self.db = db
+        self.batch_size = batch_size
+        self.written = 0
+        self._buffer = []
+
+    def add(self, user_id, dict_id, word_id, quality, now=None):
+        self._buffer.append((user_id, dict_id, word_id, quality, time.time() if now is None else now))
+        if len(self._buffer) >= self.batch_size:
+            self._flush_soon()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    async def flush(self):
+        rows, self._buffer = self._buffer, []
+        if rows:
+            try:
+                await self.db.write(write_attempts, rows)
+            except Exception:
+                # Не потеряли: вернём в начало буфера, порядок ответов сохранится
+                self._buffer[:0] = rows
+                raise
+            self.written += len(rows)
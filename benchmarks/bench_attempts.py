@@ -0,0 +1,95 @@
+# Журнал ответов: запись строки на каждый ответ против буфера со сбросом пачками, и «трудные
+# слова» из сводок против подсчёта по журналу. Запуск из корня репозитория:
+# python -m benchmarks.bench_attempts --users 1000 --answers 20000 --log 1000000
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from attempts import AttemptLog, hardest_words, recent_stats, write_attempts
+from benchmarks.dataset import dict_id, generate
+from repository import Database
+
+WORDS = 100
+CONCURRENCY = 100
+REPEATS = 200
+SQL_NAIVE_HARDEST = ("SELECT word_id, sum(quality < 3) AS errors, count(*) AS total FROM attempts "
+                     "WHERE user_id = ? GROUP BY word_id HAVING errors > 0 "
+                     "ORDER BY CAST(errors AS REAL) / total DESC LIMIT 10")
+
+
+def answers(rng, users, count, now):
+    # Слова первого словаря каждого пользователя: id назначены в generate() по порядку
+    return [(user_id, dict_id(user_id, 0, 1), (user_id - 1) * WORDS + rng.randrange(WORDS) + 1,
+             rng.choice((1, 3, 4, 4)), now - rng.random() * 14 * 86400)
+            for user_id in (rng.randint(1, users) for _ in range(count))]
+
+
+async def per_answer(db, rows):
+    # Как было бы без буфера: транзакция на каждый ответ, CONCURRENCY пользователей одновременно
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(row):
+        async with semaphore:
+            await db.write(write_attempts, [row])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(row) for row in rows))
+    return len(rows) / (time.perf_counter() - start)
+
+
+async def buffered(db, rows):
+    log = AttemptLog(db)
+    await log.start()
+    start = time.perf_counter()
+    for i, row in enumerate(rows):
+        log.add(*row)
+        if i % CONCURRENCY == 0:
+            await asyncio.sleep(0)
+    await log.close()
+    return len(rows) / (time.perf_counter() - start)
+
+
+def timed(fn, rng, users):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(rng.randint(1, users))
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--answers", type=int, default=20_000, help="ответов для сравнения записи")
+    parser.add_argument("--log", type=int, default=1_000_000, help="строк журнала для сравнения чтения")
+    args = parser.parse_args()
+    rng = random.Random(1)
+    now = time.time()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        generate(path, args.users, 1, WORDS)
+        db = Database(path)
+        rows = answers(rng, args.users, args.answers, now)
+        direct = asyncio.run(per_answer(db, rows))
+        batched = asyncio.run(buffered(db, rows))
+        db.close()
+        print(f"write: {direct:,.0f} answers/s one transaction each, {batched:,.0f} answers/s buffered")
+
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("BEGIN")
+        for start in range(0, args.log, 50_000):
+            write_attempts(conn, answers(rng, args.users, min(50_000, args.log - start), now))
+        conn.execute("COMMIT")
+        naive = timed(lambda user_id: conn.execute(SQL_NAIVE_HARDEST, (user_id,)).fetchall(), rng, args.users)
+        rollup = timed(lambda user_id: (hardest_words(conn, user_id, 10), recent_stats(conn, user_id, 7)),
+                       rng, args.users)
+        print(f"hardest words with {args.log:,} log rows: {naive:.2f} ms from the log, {rollup:.3f} ms from rollups")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
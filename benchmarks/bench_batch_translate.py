@@ -0,0 +1,86 @@
+# Пакетный перевод: список слов по одному (как если бы пользователь слал их отдельными
+# сообщениями) против одного задания translate_batch, и сохранение выбранных переводов
+# запросом на слово против одной транзакции import_pairs. Переводчик — заглушка с задержкой.
+# Запуск из корня репозитория: python -m benchmarks.bench_batch_translate --latency 0.2
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from bulk import import_pairs
+from migrations import migrate, split_translations
+from repository import Database
+from translation import StubBackend, TranslationService, split_phrases, translate_batch
+
+BATCH_CONCURRENCY = 3
+
+
+def word(i):
+    # Токенизатор берёт только буквы: номер записываем буквами
+    return "w" + "".join("abcdefghij"[int(digit)] for digit in str(i))
+
+
+async def one_by_one(phrases, latency):
+    service = TranslationService(StubBackend(delay=latency))
+    start = time.perf_counter()
+    for phrase in phrases:
+        await service.translate(phrase, "en", "ru")
+    return time.perf_counter() - start
+
+
+async def batched(phrases, latency):
+    service = TranslationService(StubBackend(delay=latency))
+    updates = []
+
+    async def on_progress(done, total):
+        updates.append(done)
+
+    start = time.perf_counter()
+    results = await translate_batch(phrases, lambda p: service.translate(p, "en", "ru"), BATCH_CONCURRENCY,
+                                    on_progress)
+    return time.perf_counter() - start, sum(r is not None for r in results), len(updates)
+
+
+async def save(tmp, pairs):
+    path = os.path.join(tmp, "words.db")
+    migrate(path)
+    db = Database(path)
+    try:
+        single_dict = await db.create_dict(1, "single")
+        batch_dict = await db.create_dict(1, "batch")
+        start = time.perf_counter()
+        for eng, rus in pairs:
+            await db.upsert_word(1, single_dict, eng, rus)
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        await db.write(import_pairs, 1, batch_dict, [(eng, split_translations(rus)) for eng, rus in pairs])
+        return single, time.perf_counter() - start
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=50, help="слов в списке (больше 50 за раз не берётся)")
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка переводчика, с")
+    args = parser.parse_args()
+    text = "\n".join(f"{word(i)}, {word(i)}" for i in range(args.items))  # каждое слово повторено
+    start = time.perf_counter()
+    phrases, found = split_phrases(text)
+    split_ms = (time.perf_counter() - start) * 1000
+    print(f"split: {len(text.split())} tokens -> {len(phrases)} phrases (found {found}) in {split_ms:.2f} ms")
+
+    sequential = asyncio.run(one_by_one(phrases, args.latency))
+    elapsed, translated, updates = asyncio.run(batched(phrases, args.latency))
+    print(f"translate {len(phrases)}: {sequential:.2f}s one by one, {elapsed:.2f}s batched "
+          f"({translated} ok, {updates} progress callbacks)")
+
+    pairs = [(phrase, f"слово{i}; перевод{i}") for i, phrase in enumerate(phrases)]
+    with tempfile.TemporaryDirectory() as tmp:
+        single, batch = asyncio.run(save(tmp, pairs))
+    print(f"save {len(pairs)}: {single * 1000:.1f} ms upsert per word, {batch * 1000:.1f} ms one import_pairs")
+
+
+if __name__ == "__main__":
+    main()
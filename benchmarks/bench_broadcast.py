@@ -0,0 +1,106 @@
+# Рассылка по всем users через очередь исходящих: пропускная способность и время до конца
+# против наивного цикла send_message, продолжение после остановки посередине (сколько
+# пользователей получили сообщение дважды), удаление заблокировавших и задержка обычных
+# ответов, пока идёт рассылка. Bot API — заглушка с задержкой --latency.
+# Запуск из корня репозитория: python -m benchmarks.bench_broadcast --users 5000 --rate 500
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from aiogram import Bot
+
+from benchmarks.dataset import generate
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramSession
+from broadcast import ANNOUNCEMENT, Broadcaster, create_broadcast, pending_broadcasts
+from outbound import OutboundQueue
+from repository import Database
+
+NAIVE_USERS = 100
+BLOCKED_EVERY = 50
+INTERACTIVE_CHAT = -1
+
+
+class CountingSession(FakeTelegramSession):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = Counter()
+
+    async def make_request(self, bot, method, timeout=None):
+        result = await super().make_request(bot, method, timeout)
+        self.received[method.chat_id] += 1
+        return result
+
+
+async def naive(latency):
+    bot = Bot(FAKE_TOKEN, session=FakeTelegramSession(latency))
+    start = time.perf_counter()
+    for user_id in range(1, NAIVE_USERS + 1):
+        await bot.send_message(user_id, "news")
+    return NAIVE_USERS / (time.perf_counter() - start)
+
+
+async def interactive(bot, latencies):
+    # Обычные ответы раз в 50 мс, пока идёт рассылка
+    while True:
+        start = time.perf_counter()
+        await bot.send_message(INTERACTIVE_CHAT - len(latencies), "reply")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+
+async def run(path, args):
+    db = Database(path)
+    blocked = range(BLOCKED_EVERY, args.users + 1, BLOCKED_EVERY)
+    session = CountingSession(args.latency, blocked=blocked)
+    outbound = OutboundQueue(rate=args.rate, chat_rate=1.0, chat_burst=3)
+    session.middleware(outbound)
+    bot = Bot(FAKE_TOKEN, session=session)
+    broadcaster = Broadcaster(db, bot, concurrency=args.concurrency)
+    broadcast_id = await db.write(create_broadcast, ANNOUNCEMENT, "news")
+
+    latencies = []
+    probe = asyncio.create_task(interactive(bot, latencies))
+    start = time.perf_counter()
+    # Останавливаемся на середине, как при перезапуске бота, и продолжаем по сохранённому курсору
+    first = asyncio.create_task(broadcaster.deliver(broadcast_id, ANNOUNCEMENT, "news"))
+    await asyncio.sleep(args.users / 2 / min(args.rate, args.concurrency / args.latency))
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    (_, kind, text, admin_id, last_user_id), = await db.read(pending_broadcasts)
+    report = await broadcaster.deliver(broadcast_id, kind, text, admin_id, last_user_id)
+    elapsed = time.perf_counter() - start
+    probe.cancel()
+    await outbound.close()
+
+    received = [count for chat_id, count in session.received.items() if chat_id > 0]
+    users_left = await db.read(lambda conn: conn.execute("SELECT count(*) FROM users").fetchone()[0])
+    db.close()
+    print(report)
+    print(f"wall {elapsed:.1f}s, {len(received) / elapsed:.0f} users/s; stopped at user {last_user_id}, "
+          f"received twice: {sum(count > 1 for count in received)}, "
+          f"missed: {args.users - len(blocked) - len(received)}")
+    print(f"blocked users removed: {args.users - users_left} of {len(blocked)}")
+    print(f"interactive replies during broadcast: p50 {statistics.median(latencies) * 1000:.0f} ms, "
+          f"max {max(latencies) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=500, help="общий лимит бота, сообщений в секунду")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа Bot API, с")
+    args = parser.parse_args()
+    print(f"naive send_message loop: {asyncio.run(naive(args.latency)):.0f} messages/s")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        generate(path, args.users, 1, 1)
+        asyncio.run(run(path, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# Пропускная способность обработчиков до и после перехода на repository.Database.
+# Запуск из корня репозитория: python -m benchmarks.bench_db --users 300
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from migrations import migrate
+from repository import Database, _save_rating
+
+WORDS_PER_USER = 10
+
+
+# --- Как было: новое соединение на каждый запрос прямо в event loop ---
+def merge_translations(existing_rus, new_rus):
+    existing_set = set(map(str.strip, existing_rus.split(";")))
+    new_set = set(map(str.strip, new_rus.split(";")))
+    return ";".join(sorted(existing_set.union(new_set)))
+
+
+class LegacyDatabase:
+    def __init__(self, path):
+        self.path = path
+
+    async def add_user(self, user_id):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+
+    async def create_dict(self, user_id, name):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("INSERT INTO dictionaries (user_id, name) VALUES (?, ?)", (user_id, name))
+
+    async def get_dicts(self, user_id):
+        with sqlite3.connect(self.path) as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM dictionaries WHERE user_id = ?", (user_id,))]
+
+    async def get_dict_id(self, user_id, name):
+        with sqlite3.connect(self.path) as conn:
+            row = conn.execute("SELECT id FROM dictionaries WHERE user_id = ? AND name = ?", (user_id, name)).fetchone()
+            return row[0] if row else None
+
+    async def upsert_word(self, user_id, dict_id, eng, rus):
+        with sqlite3.connect(self.path) as conn:
+            row = conn.execute("SELECT id, rus FROM words WHERE dict_id = ? AND eng = ?", (dict_id, eng)).fetchone()
+            if row:
+                conn.execute("UPDATE words SET rus = ? WHERE id = ?", (merge_translations(row[1], rus), row[0]))
+            else:
+                conn.execute("INSERT INTO words (dict_id, eng, rus) VALUES (?, ?, ?)", (dict_id, eng, rus))
+            conn.execute("DELETE FROM ratings WHERE user_id = ? AND dict_id = ?", (user_id, dict_id))
+
+    async def get_words(self, dict_id):
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute("SELECT eng, rus FROM words WHERE dict_id = ?", (dict_id,)).fetchall()
+
+    async def save_rating(self, user_id, dict_id, correct, total):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("INSERT OR IGNORE INTO ratings (user_id, dict_id, last_score, best_score, total_words) "
+                         "VALUES (?, ?, 0, 0, ?)", (user_id, dict_id, total))
+            conn.execute("UPDATE ratings SET last_score = ?, best_score = MAX(best_score, ?), total_words = ? "
+                         "WHERE user_id = ? AND dict_id = ?", (correct, correct, total, user_id, dict_id))
+
+    async def get_rating(self, user_id, dict_id):
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute("SELECT last_score, best_score, total_words FROM ratings "
+                                "WHERE user_id = ? AND dict_id = ?", (user_id, dict_id)).fetchone()
+
+    def close(self):
+        pass
+
+
+# --- Как стало: repository.Database. Бот давно обходится без поиска словаря по имени
+# и чтения словаря целиком, но сценарий сравнения остаётся прежним ---
+SQL_GET_DICTS = "SELECT name FROM dictionaries WHERE user_id = ?"
+SQL_GET_DICT_ID = "SELECT id FROM dictionaries WHERE user_id = ? AND name = ?"
+SQL_GET_WORDS = ("SELECT w.eng, group_concat(t.rus, ';') FROM words w "
+                 "JOIN translations t ON t.word_id = w.id "
+                 "WHERE w.dict_id = ? GROUP BY w.id ORDER BY w.id")
+SQL_GET_RATING = "SELECT last_score, best_score, total_words FROM ratings WHERE user_id = ? AND dict_id = ?"
+
+
+def _get_dict_id(conn, user_id, name):
+    row = conn.execute(SQL_GET_DICT_ID, (user_id, name)).fetchone()
+    return row[0] if row else None
+
+
+class BenchDatabase(Database):
+    async def get_dicts(self, user_id):
+        return await self.read(lambda conn: [row[0] for row in conn.execute(SQL_GET_DICTS, (user_id,))])
+
+    async def get_dict_id(self, user_id, name):
+        return await self.read(_get_dict_id, user_id, name)
+
+    async def get_words(self, dict_id):
+        return await self.read(lambda conn: conn.execute(SQL_GET_WORDS, (dict_id,)).fetchall())
+
+    async def save_rating(self, user_id, dict_id, correct, total):
+        await self.write(_save_rating, user_id, dict_id, correct, total)
+
+    async def get_rating(self, user_id, dict_id):
+        return await self.read(lambda conn: conn.execute(SQL_GET_RATING, (user_id, dict_id)).fetchone())
+
+
+# --- Сценарий одного пользователя: каждый шаг — обработчик + ответ в Telegram ---
+async def simulate_user(db, user_id, send_latency, counter):
+    async def handled():
+        counter[0] += 1
+        await asyncio.sleep(send_latency)  # message.answer(...)
+
+    await db.add_user(user_id)
+    await handled()
+    await db.create_dict(user_id, "main")
+    await handled()
+    await db.get_dicts(user_id)
+    await handled()
+    dict_id = await db.get_dict_id(user_id, "main")
+    for i in range(WORDS_PER_USER):
+        await db.upsert_word(user_id, dict_id, f"word{i}", f"слово{i}")
+        await handled()
+    words = await db.get_words(dict_id)
+    await handled()
+    for _ in words:
+        await db.get_dict_id(user_id, "main")
+        await handled()
+    await db.save_rating(user_id, dict_id, len(words) // 2, len(words))
+    await handled()
+    await db.get_rating(user_id, dict_id)
+    await handled()
+
+
+async def measure_lag(stop, result):
+    # Задержка event loop: насколько позже запланированного просыпается таймер
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        result[0] = max(result[0], time.perf_counter() - start - 0.005)
+
+
+async def run(db, users, send_latency):
+    counter, lag = [0], [0.0]
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop, lag))
+    start = time.perf_counter()
+    await asyncio.gather(*(simulate_user(db, user_id, send_latency, counter) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    return counter[0], elapsed, lag[0]
+
+
+def bench(name, factory, users, send_latency):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "words.db")
+        migrate(path)
+        db = factory(path)
+        try:
+            handled, elapsed, lag = asyncio.run(run(db, users, send_latency))
+        finally:
+            db.close()
+    print(f"{name:<8} handlers={handled:<6} time={elapsed:7.2f}s "
+          f"throughput={handled / elapsed:9.1f}/s max_loop_lag={lag * 1000:8.1f}ms")
+    return handled / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--send-latency", type=float, default=0.02, help="имитация ответа Telegram, сек")
+    args = parser.parse_args()
+    print(f"{args.users} simulated users, send latency {args.send_latency * 1000:.0f}ms")
+    before = bench("before", LegacyDatabase, args.users, args.send_latency)
+    after = bench("after", BenchDatabase, args.users, args.send_latency)
+    print(f"speedup x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Скорость проверки ответов: длинные ответы тестов по пунктам (с опечатками и ошибками)
+# и пачка ответов тренировки. Сравнивается с прежней проверкой — точным сравнением строк.
+# Запуск из корня репозитория: python -m benchmarks.bench_grading --items 10 50 200
+import argparse
+import random
+import string
+import time
+
+from grading import compile_key, compile_translations
+
+REPEATS = 200
+
+
+def phrase(rng):
+    return " ".join("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9)))
+                    for _ in range(rng.randint(1, 4)))
+
+
+def spoil(rng, text):
+    # Треть пунктов с опечаткой, шестая часть — совсем неверные
+    roll = rng.random()
+    if roll < 1 / 3 and len(text) > 4:
+        i = rng.randrange(len(text))
+        return text[:i] + "x" + text[i + 1:]
+    if roll < 1 / 2:
+        return phrase(rng)
+    return text.upper() + "."
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = fn()
+    return (time.perf_counter() - start) / REPEATS * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 50, 200], help="пунктов в ответе теста")
+    parser.add_argument("--batch", type=int, default=20, help="слов в тренировке")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"{'items':>6}{'compile ms':>12}{'grade ms':>10}{'exact ms':>10}{'passed':>8}")
+    for count in args.items:
+        items = [phrase(rng) for _ in range(count)]
+        key_text = "\n".join(f"{i}) {item}" for i, item in enumerate(items, 1))
+        answer = "\n".join(spoil(rng, item) for item in items)
+        start = time.perf_counter()
+        key = compile_key.__wrapped__(key_text)
+        compiled = (time.perf_counter() - start) * 1000
+        graded, results = timed(lambda: key.grade(answer))
+        exact, _ = timed(lambda: answer.strip().lower() == key_text.strip().lower())
+        passed = sum(result.ok for result in results)
+        print(f"{count:>6}{compiled:>12.3f}{graded:>10.3f}{exact:>10.4f}{passed:>5}/{count}")
+
+    words = [compile_translations(f"слово{i};перевод{i}") for i in range(args.batch)]
+    answers = [rng.choice([f"слово{i}", f"слвоо{i}", f"перевд{i}", "не знаю"]) for i in range(args.batch)]
+    graded, _ = timed(lambda: [word.grade(answer) for word, answer in zip(words, answers)])
+    print(f"\ntraining batch of {args.batch} answers: {graded:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Импорт и экспорт словаря файлом против добавления слов по одному.
+# Запуск из корня репозитория: python -m benchmarks.bench_import --rows 50000
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from bulk import export_words, import_file
+from migrations import migrate
+from repository import Database
+
+ONE_BY_ONE_SAMPLE = 2000
+
+
+def make_file(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            f.write(f"word{i}\tслово{i};перевод{i}\n")
+
+
+async def run(tmp, rows):
+    path = os.path.join(tmp, "words.db")
+    migrate(path)
+    db = Database(path)
+    try:
+        user_id = 1
+        bulk_dict = await db.create_dict(user_id, "bulk")
+        single_dict = await db.create_dict(user_id, "single")
+        source = os.path.join(tmp, "import.tsv")
+        make_file(source, rows)
+
+        start = time.perf_counter()
+        imported = await db.write(import_file, user_id, bulk_dict, source)
+        import_time = time.perf_counter() - start
+        print(f"import   rows={imported[0]} words={imported[1]} translations={imported[2]} "
+              f"time={import_time:.2f}s ({imported[0] / import_time:,.0f} rows/s)")
+
+        start = time.perf_counter()
+        for i in range(ONE_BY_ONE_SAMPLE):
+            await db.upsert_word(user_id, single_dict, f"word{i}", f"слово{i};перевод{i}")
+        single_time = (time.perf_counter() - start) / ONE_BY_ONE_SAMPLE * rows
+        print(f"one by one (DB only, без чата) ~{single_time:.2f}s for {rows} rows "
+              f"(extrapolated from {ONE_BY_ONE_SAMPLE})")
+
+        start = time.perf_counter()
+        count = await db.read(export_words, bulk_dict, os.path.join(tmp, "export.tsv"))
+        print(f"export   rows={count} time={time.perf_counter() - start:.2f}s")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(tmp, args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Таблица лидеров: топ и место игрока из готовых агрегатов против подсчёта по ratings на каждый
+# запрос. Запуск из корня репозитория: python -m benchmarks.bench_leaderboard --users 1000 10000 100000
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from leaderboard import GLOBAL, record_session, standings
+from migrations import migrate
+
+DICTS_PER_USER = 3
+REPEATS = 200
+# Как посчитали бы без агрегатов: сумма лучших результатов каждого игрока, сортировка, место
+SQL_NAIVE_TOP = ("SELECT user_id, sum(best_score) AS score FROM ratings GROUP BY user_id "
+                 "ORDER BY score DESC LIMIT ?")
+SQL_NAIVE_RANK = ("SELECT count(*) + 1 FROM (SELECT sum(best_score) AS score FROM ratings GROUP BY user_id) "
+                  "WHERE score > (SELECT sum(best_score) FROM ratings WHERE user_id = ?)")
+
+
+def fill(conn, users, rng):
+    ratings = []
+    conn.execute("BEGIN")
+    for user_id in range(1, users + 1):
+        for k in range(DICTS_PER_USER):
+            correct = rng.randint(0, 20)
+            ratings.append((user_id, user_id * DICTS_PER_USER + k, correct, correct, 20))
+            record_session(conn, user_id, f"user{user_id}", rng.choice((30, 120, 500, 2000)), correct)
+    conn.executemany("INSERT INTO ratings (user_id, dict_id, last_score, best_score, total_words) "
+                     "VALUES (?, ?, ?, ?, ?)", ratings)
+    conn.execute("COMMIT")
+
+
+def timed(fn, rng, users):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(rng.randint(1, users))
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'users':>8}{'update ms':>11}{'naive ms':>10}{'boards ms':>11}")
+    for users in args.users:
+        rng = random.Random(args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            migrate(path)
+            conn = sqlite3.connect(path, isolation_level=None)
+            start = time.perf_counter()
+            fill(conn, users, rng)
+            update = (time.perf_counter() - start) / (users * DICTS_PER_USER) * 1000
+
+            def naive(user_id):
+                conn.execute(SQL_NAIVE_TOP, (10,)).fetchall()
+                conn.execute(SQL_NAIVE_RANK, (user_id,)).fetchone()
+
+            naive_ms = timed(naive, rng, users)
+            boards_ms = timed(lambda user_id: standings(conn, GLOBAL, user_id, 10), rng, users)
+            conn.close()
+        print(f"{users:>8}{update:>11.3f}{naive_ms:>10.3f}{boards_ms:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Офлайн-словарь переводов: полная сборка и слияние с новыми парами, размер файла, поиск по
+# mmap против кэша переводов в базе, и цена триггера lexicon_delta при импорте словаря.
+# Запуск из корня репозитория: python -m benchmarks.bench_lexicon --users 1000 --big 200000
+import argparse
+import io
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+
+from benchmarks.dataset import generate
+from bulk import import_words
+from lexicon import Lexicon, trim_delta, update_lexicon
+from repository import _get_cached_translation, _put_cached_translation, _upsert_word
+
+BIG_USER = 10 ** 9
+LOOKUPS = 20_000
+SQL_DROP_TRIGGER = "DROP TRIGGER trg_translations_insert_lexicon"
+
+
+def random_word(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+
+
+def timed_import(conn, rng, rows):
+    dict_id = conn.execute("INSERT INTO dictionaries (user_id, name) VALUES (?, 'import')", (BIG_USER,)).lastrowid
+    source = io.StringIO("".join(f"{random_word(rng)}{i}\tперевод{i};{random_word(rng)}\n" for i in range(rows)))
+    start = time.perf_counter()
+    conn.execute("BEGIN")
+    import_words(conn, BIG_USER, dict_id, source)
+    conn.execute("COMMIT")
+    return rows / (time.perf_counter() - start)
+
+
+def rebuild(conn, path, full):
+    start = time.perf_counter()
+    last = update_lexicon(conn, path, full_every=0 if full else float("inf"))
+    elapsed = time.perf_counter() - start
+    trim_delta(conn, last)
+    return elapsed
+
+
+def per_call(fn, keys):
+    start = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000, help="пользователей с общими словами (3 словаря по 100)")
+    parser.add_argument("--big", type=int, default=200_000, help="уникальных слов у одного пользователя")
+    parser.add_argument("--delta", type=int, default=1000, help="новых слов перед пересборкой")
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        lexicon_path = path + ".lexicon"
+        generate(path, args.users, 3, 100)
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with_trigger = timed_import(conn, rng, args.big)
+        full = rebuild(conn, lexicon_path, full=True)
+        lexicon = Lexicon(lexicon_path)
+        lexicon.reload()
+        print(f"full build: {full:.2f}s, {lexicon.count} entries, {os.path.getsize(lexicon_path) / 2 ** 20:.1f} MiB")
+
+        conn.execute("BEGIN")
+        for i in range(args.delta):
+            _upsert_word(conn, rng.randint(1, args.users), 3, f"new{i}", f"новое{i}")
+        conn.execute("COMMIT")
+        merge = rebuild(conn, lexicon_path, full=False)
+        print(f"incremental: {args.delta} new words merged in {merge:.2f}s ({full / merge:.1f}x faster than full)")
+
+        lexicon.reload()
+        hits = [f"word{rng.randrange(100)}" for _ in range(LOOKUPS)]
+        misses = [random_word(rng) + "q" for _ in range(LOOKUPS)]
+        for key in hits:
+            _put_cached_translation(conn, key, "en", "ru", "перевод", time.time())
+        print(f"lexicon lookup: hit {per_call(lambda k: lexicon.lookup(k, 'en'), hits):.1f} us, "
+              f"miss {per_call(lambda k: lexicon.lookup(k, 'en'), misses):.1f} us")
+        print(f"translation_cache row: {per_call(lambda k: _get_cached_translation(conn, k, 'en', 'ru', 0), hits):.1f} us")
+        lexicon.close()
+
+        conn.execute(SQL_DROP_TRIGGER)
+        without_trigger = timed_import(conn, rng, args.big)
+        print(f"import: {with_trigger:,.0f} rows/s with lexicon_delta trigger, {without_trigger:,.0f} without")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
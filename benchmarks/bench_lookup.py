@@ -0,0 +1,68 @@
+# Задержка горячих запросов (словарь по имени, слово в словаре, вставка перевода)
+# на схеме без индексов (версия 1) и после миграций, на разных объёмах words.
+# Запуск из корня репозитория: python -m benchmarks.bench_lookup --sizes 10000 100000 1000000
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from migrations import migrate, SCHEMA_VERSION
+
+WORDS_PER_DICT = 100
+DICTS_PER_USER = 5
+QUERIES = 2000
+
+
+def fill(path, words):
+    dicts = max(1, words // WORDS_PER_DICT)
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO dictionaries (id, user_id, name) VALUES (?, ?, ?)",
+                         ((d, d // DICTS_PER_USER, f"dict{d}") for d in range(1, dicts + 1)))
+        conn.executemany("INSERT INTO words (dict_id, eng, rus) VALUES (?, ?, ?)",
+                         ((i // WORDS_PER_DICT + 1, f"word{i}", f"слово{i};перевод{i}") for i in range(words)))
+    return dicts
+
+
+def timed(conn, sql, params):
+    start = time.perf_counter()
+    for p in params:
+        conn.execute(sql, p).fetchall()
+    return (time.perf_counter() - start) / len(params) * 1e6
+
+
+def probe(path, words, dicts, version):
+    rng = random.Random(1)
+    dict_params = [(d // DICTS_PER_USER, f"dict{d}") for d in (rng.randint(1, dicts) for _ in range(QUERIES))]
+    word_params = [(i // WORDS_PER_DICT + 1, f"word{i}") for i in (rng.randrange(words) for _ in range(QUERIES))]
+    with sqlite3.connect(path) as conn:
+        dict_us = timed(conn, "SELECT id FROM dictionaries WHERE user_id = ? AND name = ?", dict_params)
+        word_us = timed(conn, "SELECT id FROM words WHERE dict_id = ? AND eng = ?", word_params)
+        if version >= 2:
+            sql = "INSERT OR IGNORE INTO translations (word_id, rus) SELECT id, 'новый' FROM words WHERE dict_id = ? AND eng = ?"
+        else:
+            sql = "UPDATE words SET rus = rus || ';новый' WHERE dict_id = ? AND eng = ?"
+        upsert_us = timed(conn, sql, word_params[:200])
+    print(f"{words:>9} words  v{version}  dict by name {dict_us:9.1f}us  word by eng {word_us:9.1f}us  "
+          f"add translation {upsert_us:9.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    for words in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "words.db")
+            migrate(path, target=1)
+            dicts = fill(path, words)
+            probe(path, words, dicts, 1)
+            start = time.perf_counter()
+            migrate(path)
+            print(f"{'':>9}        migration to v{SCHEMA_VERSION}: {time.perf_counter() - start:.2f}s")
+            probe(path, words, dicts, SCHEMA_VERSION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Поиск по словарям через FTS5: задержка запросов разной длины у пользователя с большим словарём
+# на фоне остальных пользователей, а также цена поддержки индекса при импорте и добавлении слов.
+# Запуск из корня репозитория: python -m benchmarks.bench_search --big 200000 --users 1000
+import argparse
+import io
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+
+from benchmarks.dataset import generate
+from bulk import import_words
+from repository import _upsert_word
+from search import search_words
+
+BIG_USER = 10 ** 9
+QUERIES = ("w", "wo", "wor", "word1", "word12", "word12345", "qzx", "сл", "слово77", "ещё1")
+REPEATS = 50
+UPSERTS = 500
+
+
+def random_word(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--big", type=int, default=200_000, help="слов у одного пользователя")
+    parser.add_argument("--users", type=int, default=1000, help="остальных пользователей (3 словаря по 100 слов)")
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        generate(path, args.users, 3, 100)
+        print(f"dataset: {args.users * 300} words, {time.perf_counter() - start:.1f}s")
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        dict_id = conn.execute("INSERT INTO dictionaries (user_id, name) VALUES (?, 'big')", (BIG_USER,)).lastrowid
+        source = io.StringIO("".join(f"word{i}\tслово{i};{random_word(rng)}\n" for i in range(args.big)))
+        start = time.perf_counter()
+        conn.execute("BEGIN")
+        rows, _, _ = import_words(conn, BIG_USER, dict_id, source)
+        conn.execute("COMMIT")
+        elapsed = time.perf_counter() - start
+        print(f"import with index: {rows} rows, {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+        start = time.perf_counter()
+        for i in range(UPSERTS):
+            conn.execute("BEGIN")
+            _upsert_word(conn, BIG_USER, dict_id, f"new{i}", f"новое{i};ещё{i}")
+            conn.execute("COMMIT")
+        print(f"add word: {(time.perf_counter() - start) / UPSERTS * 1000:.2f} ms per word\n")
+
+        print(f"{'query':>14}{'found':>7}{'big ms':>9}{'small ms':>10}")
+        for query in QUERIES:
+            timings = []
+            for user_id in (BIG_USER, 1):
+                start = time.perf_counter()
+                for _ in range(REPEATS):
+                    found = search_words(conn, user_id, query, 20)
+                timings.append((time.perf_counter() - start) / REPEATS * 1000)
+                if user_id == BIG_USER:
+                    count = len(found)
+            print(f"{query:>14}{count:>7}{timings[0]:>9.2f}{timings[1]:>10.2f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Синтетическая words.db: users пользователей, у каждого dicts словарей по words слов.
+# Запуск из корня репозитория: python -m benchmarks.dataset bench.db --users 1000 --dicts 3 --words 200
+import argparse
+import os
+import sqlite3
+import time
+
+from migrations import migrate
+
+
+def word(i):
+    return f"word{i}"
+
+
+def translation(i):
+    return f"слово{i}"
+
+
+def dict_name(k):
+    return f"dict{k}"
+
+
+def dict_id(user_id, k, dicts):
+    # id словарей в generate() назначаются явно
+    return user_id * dicts + k
+
+
+def test_files(root, variants=3):
+    # Минимальные тесты всех трёх типов для каталога
+    for test_type in ("listening", "writing", "reading"):
+        os.makedirs(os.path.join(root, test_type, "answers"), exist_ok=True)
+        for v in range(1, variants + 1):
+            if test_type == "listening":
+                directory = os.path.join(root, test_type, "questions", str(v))
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, "audio.mp3"), "wb") as f:
+                    f.write(b"\0" * 1024)
+                questions = os.path.join(directory, "questions.txt")
+            else:
+                os.makedirs(os.path.join(root, test_type, "questions"), exist_ok=True)
+                questions = os.path.join(root, test_type, "questions", f"{v}.txt")
+            with open(questions, "w", encoding="utf-8") as f:
+                f.write(f"{test_type} {v}: 1) ... 2) ... 3) ...")
+            with open(os.path.join(root, test_type, "answers", f"{v}.txt"), "w", encoding="utf-8") as f:
+                f.write("a b c")
+
+
+def generate(path, users, dicts, words):
+    if os.path.exists(path):
+        os.remove(path)
+    migrate(path)
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO users (user_id) VALUES (?)", ((u,) for u in range(1, users + 1)))
+        conn.executemany("INSERT INTO dictionaries (id, user_id, name) VALUES (?, ?, ?)",
+                         ((dict_id(u, k, dicts), u, dict_name(k)) for u in range(1, users + 1) for k in range(dicts)))
+        # Одним выражением: триггеры поискового индекса не сбрасывают его на диск после каждой строки
+        conn.execute("WITH RECURSIVE n (i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < ? - 1) "
+                     "INSERT INTO words (dict_id, eng) SELECT d.id, 'word' || n.i "
+                     "FROM dictionaries d CROSS JOIN n ORDER BY d.id, n.i", (words,))
+        conn.execute("INSERT INTO translations (word_id, rus) "
+                     "SELECT id, 'слово' || substr(eng, 5) FROM words")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--dicts", type=int, default=3)
+    parser.add_argument("--words", type=int, default=200)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    generate(args.path, args.users, args.dicts, args.words)
+    print(f"{args.path}: {args.users * args.dicts * args.words} words in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# Локальная заглушка Bot API: сессия aiogram, которая отвечает на все методы сама,
+# без сети. Можно добавить искусственную задержку, чтобы имитировать Telegram, и чаты,
+# заблокировавшие бота (на любой запрос — 403).
+import asyncio
+import datetime
+import itertools
+import time
+import typing
+from collections import Counter
+
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.types import Audio, CallbackQuery, Chat, Document, File, Message, Update, User
+from aiohttp import web
+
+FAKE_TOKEN = "123456:fake-token-for-benchmarks"
+
+
+class FakeTelegramSession(BaseSession):
+    def __init__(self, latency=0.0, download=b"", blocked=()):
+        super().__init__()
+        self.latency = latency
+        self.download = download
+        self.blocked = set(blocked)
+        self.calls = Counter()
+        self.last_text = {}
+        self._ids = itertools.count(1)
+
+    def _message(self, method):
+        chat_id = getattr(method, "chat_id", None) or 0
+        text = getattr(method, "text", None)
+        if text is not None:
+            self.last_text[chat_id] = text
+        message_id = next(self._ids)
+        extra = {}
+        if hasattr(method, "audio"):
+            extra["audio"] = Audio(file_id=f"audio-{message_id}", file_unique_id=str(message_id), duration=1)
+        if hasattr(method, "document"):
+            extra["document"] = Document(file_id=f"doc-{message_id}", file_unique_id=str(message_id))
+        return Message(message_id=message_id, date=datetime.datetime.now(), chat=Chat(id=chat_id, type="private"),
+                       text=text, **extra)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if getattr(method, "chat_id", None) in self.blocked:
+            raise TelegramForbiddenError(method=method, message="Forbidden: bot was blocked by the user")
+        returning = method.__returning__
+        if returning is Message or Message in typing.get_args(returning):
+            return self._message(method)
+        if returning is File:
+            return File(file_id=method.file_id, file_unique_id=method.file_id, file_path=f"files/{method.file_id}")
+        if returning is User:
+            return User(id=123456, is_bot=True, first_name="bench")
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield self.download
+
+    async def close(self):
+        pass
+
+
+# --- Входящие апдейты ---
+_update_ids = itertools.count(1)
+
+
+def _user(user_id):
+    return User(id=user_id, is_bot=False, first_name=f"user{user_id}")
+
+
+def _chat(user_id):
+    return Chat(id=user_id, type="private")
+
+
+def text_update(user_id, text):
+    return Update(update_id=next(_update_ids), message=Message(
+        message_id=next(_update_ids), date=datetime.datetime.now(), chat=_chat(user_id),
+        from_user=_user(user_id), text=text))
+
+
+def document_update(user_id, file_id, file_size):
+    return Update(update_id=next(_update_ids), message=Message(
+        message_id=next(_update_ids), date=datetime.datetime.now(), chat=_chat(user_id),
+        from_user=_user(user_id), document=Document(file_id=file_id, file_unique_id=file_id, file_size=file_size)))
+
+
+def callback_update(user_id, data):
+    message = Message(message_id=next(_update_ids), date=datetime.datetime.now(), chat=_chat(user_id),
+                      from_user=User(id=123456, is_bot=True, first_name="bench"), text="menu")
+    return Update(update_id=next(_update_ids), callback_query=CallbackQuery(
+        id=str(next(_update_ids)), from_user=_user(user_id), chat_instance=str(user_id), message=message, data=data))
+
+
+# --- Отправка апдейтов на вебхук, как это делает Telegram ---
+async def post_update(http, url, update, secret=None):
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+    async with http.post(url, data=update.model_dump_json(exclude_none=True, by_alias=True), headers=headers) as response:
+        return response.status
+
+
+# --- Заглушка Bot API по HTTP: для ботов в других процессах (TELEGRAM_API_URL) ---
+def api_app(calls=None, latency=0.0, updates=None, log=None):
+    # updates — апдейты для getUpdates (отдаются один раз), log — список (время, метод) вызовов
+    calls = calls if calls is not None else Counter()
+    ids = itertools.count(1)
+    pending = list(updates or [])
+
+    async def handle(request):
+        method = request.match_info["method"].lower()
+        calls[method] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        params = await request.post()
+        if log is not None:
+            log.append((time.perf_counter(), method))
+        if method == "getupdates":
+            if not pending:
+                await asyncio.sleep(min(float(params.get("timeout") or 0), 0.5))
+            result = [update.model_dump(mode="json", exclude_none=True, by_alias=True) for update in pending]
+            pending.clear()
+        elif method.startswith(("send", "edit")):
+            chat_id = int(params.get("chat_id") or 0)
+            result = {"message_id": next(ids), "date": 0, "chat": {"id": chat_id, "type": "private"},
+                      "text": params.get("text")}
+        elif method == "getfile":
+            result = {"file_id": params["file_id"], "file_unique_id": params["file_id"],
+                      "file_path": f"files/{params['file_id']}"}
+        elif method == "getme":
+            result = {"id": 123456, "is_bot": True, "first_name": "bench"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    app = web.Application()
+    app["calls"] = calls
+    app.router.add_post("/bot{token}/{method}", handle)
+    return app
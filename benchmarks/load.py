@@ -0,0 +1,205 @@
+# Нагрузочный прогон настоящего Dispatcher из pick_me_bot на заглушке Bot API.
+# Виртуальные пользователи параллельно проигрывают сценарии (словари, добавление слов,
+# тренировка, перевод через заглушку переводчика, тесты); для каждого маршрута
+# считаются пропускная способность и задержки p50/p95/p99.
+# Запуск из корня репозитория:
+#   python -m benchmarks.load --users 1000 --active 200 --iterations 5
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from collections import defaultdict
+
+from aiogram import Bot
+from aiogram.client.bot import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import StorageKey
+
+from benchmarks import dataset
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramSession, callback_update, text_update
+
+SCENARIO_WEIGHTS = {"browse": 3, "add_word": 2, "train": 3, "translate": 1, "test": 1}
+BOLD = re.compile(r"<b>(.*?)</b>")
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def report(self, elapsed):
+        total = sum(len(v) for v in self.latencies.values())
+        rows = []
+        print(f"{'route':<40}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for route in sorted(self.latencies, key=lambda r: -len(self.latencies[r])):
+            values = sorted(self.latencies[route])
+            row = {"route": route, "count": len(values), "mean": sum(values) / len(values) * 1000,
+                   "p50": percentile(values, 50) * 1000, "p95": percentile(values, 95) * 1000,
+                   "p99": percentile(values, 99) * 1000, "errors": self.errors[route]}
+            rows.append(row)
+            print(f"{route:<40}{row['count']:>8}{row['mean']:>10.2f}{row['p50']:>10.2f}"
+                  f"{row['p95']:>10.2f}{row['p99']:>10.2f}{row['errors']:>8}")
+        everything = sorted(v for values in self.latencies.values() for v in values)
+        summary = {"updates": total, "elapsed": elapsed, "throughput": total / elapsed,
+                   "p50": percentile(everything, 50) * 1000, "p95": percentile(everything, 95) * 1000,
+                   "p99": percentile(everything, 99) * 1000}
+        print(f"\n{total} updates in {elapsed:.2f}s: {summary['throughput']:.1f} updates/s, "
+              f"p50 {summary['p50']:.2f}ms, p95 {summary['p95']:.2f}ms, p99 {summary['p99']:.2f}ms")
+        return {"summary": summary, "routes": rows}
+
+
+class VirtualUser:
+    def __init__(self, app, bot, session, recorder, user_id, dicts, rng):
+        self.app = app
+        self.bot = bot
+        self.session = session
+        self.recorder = recorder
+        self.user_id = user_id
+        self.dicts = dicts
+        self.rng = rng
+        self.added = 0
+
+    async def route_of(self, update):
+        if update.callback_query:
+            data = update.callback_query.data
+            return data.split(":")[0] + ":" if ":" in data else data
+        text = update.message.text or ""
+        if text.startswith("/"):
+            return text.split()[0]
+        key = StorageKey(bot_id=self.bot.id, chat_id=self.user_id, user_id=self.user_id)
+        state = await self.app.dp.fsm.storage.get_state(key)
+        return f"msg:{state}" if state else "msg:answer"
+
+    async def send(self, update):
+        route = await self.route_of(update)
+        start = time.perf_counter()
+        try:
+            await self.app.dp.feed_update(self.bot, update)
+        except Exception:
+            self.recorder.errors[route] += 1
+        self.recorder.latencies[route].append(time.perf_counter() - start)
+
+    async def tap(self, data):
+        await self.send(callback_update(self.user_id, data))
+
+    async def say(self, text):
+        await self.send(text_update(self.user_id, text))
+
+    def last_text(self):
+        return self.session.last_text.get(self.user_id, "")
+
+    def dict_id(self):
+        return dataset.dict_id(self.user_id, self.rng.randrange(self.dicts), self.dicts)
+
+    # --- Сценарии ---
+    async def browse(self):
+        dict_id = self.dict_id()
+        for data in ("menu_dicts", "list_dicts", f"dict:{dict_id}", f"show:{dict_id}"):
+            await self.tap(data)
+
+    async def add_word(self):
+        dict_id = self.dict_id()
+        self.added += 1
+        await self.tap(f"dict:{dict_id}")
+        await self.tap(f"add:{dict_id}")
+        await self.say(f"new{self.user_id}x{self.added}")
+        await self.say("новое")
+
+    async def train(self, answers=5):
+        await self.tap(f"train:{self.dict_id()}")
+        for _ in range(answers):
+            text = self.last_text()
+            if "Как переводится" not in text:
+                break
+            eng = BOLD.search(text).group(1)
+            correct = dataset.translation(eng[4:]) if eng.startswith("word") else "новое"
+            await self.say(correct if self.rng.random() < 0.7 else "не знаю")
+
+    async def translate(self):
+        await self.tap("menu_translate")
+        await self.tap("to_ru")
+        await self.say(dataset.word(self.rng.randrange(1000)))
+        await self.tap(f"save_trans:{self.dict_id()}")
+
+    async def test(self):
+        await self.tap("menu_tests")
+        await self.tap(self.rng.choice(["test_listen", "test_writ", "test_read"]))
+        await self.tap(f"var{self.rng.randint(1, 3)}")
+        await self.say(self.rng.choice(["a b c", "a b d"]))
+
+    async def run(self, iterations):
+        await self.say("/start")
+        names, weights = zip(*SCENARIO_WEIGHTS.items())
+        for _ in range(iterations):
+            await getattr(self, self.rng.choices(names, weights)[0])()
+
+
+async def run(app, root, args):
+    from translation import StubBackend
+
+    session = FakeTelegramSession(latency=args.latency)
+    bot = Bot(FAKE_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    app.setup_session(session)
+    app.translation.backend = StubBackend(delay=args.translate_latency)
+    app.catalog.root = root
+    await app.dp.emit_startup(bot=bot)
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    users = [VirtualUser(app, bot, session, recorder, user_id, args.dicts, random.Random(rng.random()))
+             for user_id in rng.sample(range(1, args.users + 1), min(args.active, args.users))]
+    start = time.perf_counter()
+    await asyncio.gather(*(user.run(args.iterations) for user in users))
+    elapsed = time.perf_counter() - start
+    await app.dp.emit_shutdown(bot=bot)
+    return recorder.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000, help="пользователей в синтетической базе")
+    parser.add_argument("--dicts", type=int, default=3, help="словарей у каждого пользователя")
+    parser.add_argument("--words", type=int, default=200, help="слов в каждом словаре")
+    parser.add_argument("--active", type=int, default=200, help="одновременно активных пользователей")
+    parser.add_argument("--iterations", type=int, default=5, help="сценариев на пользователя")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка заглушки Bot API, сек")
+    parser.add_argument("--translate-latency", type=float, default=0.05, help="задержка заглушки переводчика, сек")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "words.db")
+        start = time.perf_counter()
+        dataset.generate(path, args.users, args.dicts, args.words)
+        dataset.test_files(root)
+        print(f"dataset: {args.users * args.dicts * args.words} words, {time.perf_counter() - start:.1f}s")
+        os.environ["WORDS_DB"] = path
+        os.environ.setdefault("BOT_TOKEN", FAKE_TOKEN)
+        # Виртуальные пользователи отвечают мгновенно: лимиты Telegram здесь мерили бы сами себя
+        os.environ.setdefault("OUTBOUND_RATE", "1000000")
+        os.environ.setdefault("OUTBOUND_CHAT_RATE", "1000000")
+        app = importlib.import_module("pick_me_bot")
+        app.create_app()
+        try:
+            result = asyncio.run(run(app, root, args))
+        finally:
+            app.db.close()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Холодный старт бота: время импорта pick_me_bot и время от запуска процесса до ответа на первый
+# апдейт (polling против HTTP-заглушки Bot API, база уже с актуальной схемой). Каждый замер —
+# новый процесс, берётся медиана. --script позволяет сравнить с другой копией бота.
+# Запуск из корня репозитория: python -m benchmarks.startup --runs 5
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+from benchmarks import dataset
+from benchmarks.fake_telegram import FAKE_TOKEN, api_app, text_update
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pick_me_bot.py")
+IMPORT_CODE = "import time; start = time.perf_counter(); import pick_me_bot; print(time.perf_counter() - start)"
+
+
+def import_time(script, env):
+    output = subprocess.run([sys.executable, "-c", IMPORT_CODE], cwd=os.path.dirname(script), env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.split()[-1])
+
+
+async def first_update(script, env, port):
+    log = []
+    runner = web.AppRunner(api_app(updates=[text_update(1, "/start")], log=log))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    env = dict(env, TELEGRAM_API_URL=f"http://127.0.0.1:{port}")
+    try:
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(sys.executable, script, cwd=os.path.dirname(script), env=env,
+                                                       stdout=asyncio.subprocess.DEVNULL,
+                                                       stderr=asyncio.subprocess.DEVNULL)
+        while not any(method == "sendmessage" for _, method in log):
+            if process.returncode is not None:
+                raise RuntimeError(f"bot exited with code {process.returncode}")
+            await asyncio.sleep(0.005)
+        elapsed = next(at for at, method in log if method == "sendmessage") - start
+        process.terminate()
+        await process.wait()
+        return elapsed
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--script", default=BOT_SCRIPT, help="pick_me_bot.py другой копии бота")
+    parser.add_argument("--port", type=int, default=8443)
+    args = parser.parse_args()
+    script = os.path.abspath(args.script)
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "words.db")
+        dataset.generate(path, 100, 3, 100)
+        env = dict(os.environ, WORDS_DB=path, BOT_TOKEN=FAKE_TOKEN, BOT_MODE="polling")
+        for name in ("METRICS_PORT", "BOT_CONFIG", "WORKER_INDEX"):
+            env.pop(name, None)
+        imports = [import_time(script, env) for _ in range(args.runs)]
+        firsts = [asyncio.run(first_update(script, env, args.port)) for _ in range(args.runs)]
+    print(f"{script}")
+    print(f"import pick_me_bot:       median {statistics.median(imports) * 1000:7.0f} ms, "
+          f"min {min(imports) * 1000:.0f} ms")
+    print(f"start to first response: median {statistics.median(firsts) * 1000:7.0f} ms, "
+          f"min {min(firsts) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
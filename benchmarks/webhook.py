@@ -0,0 +1,110 @@
+# Режим вебхука под нагрузкой: заглушка шлёт апдейты по HTTP, как Telegram, а бот отвечает
+# в заглушку Bot API. Проверяется, что апдейты каждого пользователя обработаны в том порядке,
+# в котором пришли, и что остановка дорабатывает все принятые апдейты.
+# Запуск из корня репозитория:
+#   python -m benchmarks.webhook --users 1000 --active 300 --concurrency 64
+import argparse
+import asyncio
+import importlib
+import os
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+
+import aiohttp
+from aiogram import Bot
+from aiogram.client.bot import DefaultBotProperties
+from aiogram.enums import ParseMode
+
+from benchmarks import dataset
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeTelegramSession, callback_update, post_update, text_update
+
+SECRET = "bench-secret"
+
+
+def script(user_id):
+    # Добавление слова: без соблюдения порядка FSM получит перевод раньше слова
+    dict_id = dataset.dict_id(user_id, 0, 1)
+    return [text_update(user_id, "/start"), callback_update(user_id, "menu_dicts"),
+            callback_update(user_id, f"dict:{dict_id}"), callback_update(user_id, f"add:{dict_id}"),
+            text_update(user_id, f"hook{user_id}"), text_update(user_id, "вебхук")]
+
+
+async def run(app, args):
+    from webhook import run_webhook, update_owner, wait_listening
+
+    session = FakeTelegramSession(latency=args.latency)
+    bot = Bot(FAKE_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    app.setup_session(session)
+    seen = defaultdict(list)
+
+    @app.dp.update.outer_middleware()
+    async def record(handler, update, data):
+        seen[update_owner(update)].append(update.update_id)
+        return await handler(update, data)
+
+    stop = asyncio.Event()
+    server = asyncio.create_task(run_webhook(app.dp, bot, "127.0.0.1", args.port, secret=SECRET,
+                                             concurrency=args.concurrency, drain_timeout=60, stop=stop))
+    url = f"http://127.0.0.1:{args.port}/webhook"
+    sent = defaultdict(list)
+    statuses = defaultdict(int)
+    async with aiohttp.ClientSession() as http:
+        await wait_listening(http, url)
+
+        async def user(user_id):
+            for update in script(user_id):
+                status = await post_update(http, url, update, SECRET)
+                statuses[status] += 1
+                if status == 200:
+                    sent[user_id].append(update.update_id)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(u) for u in range(1, args.active + 1)))
+        posted = time.perf_counter() - start
+    # Останавливаемся, не дожидаясь обработки: её должен доделать drain
+    stop.set()
+    processor = await server
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(ids) for ids in sent.values())
+    out_of_order = sum(1 for user_id, ids in sent.items() if seen[user_id] != ids)
+    print(f"{total} updates posted in {posted:.2f}s ({total / posted:.1f}/s), "
+          f"processed {processor.processed} in {elapsed:.2f}s ({processor.processed / elapsed:.1f}/s)")
+    print(f"HTTP statuses: {dict(statuses)}, users out of order: {out_of_order}")
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000, help="пользователей в синтетической базе")
+    parser.add_argument("--words", type=int, default=50, help="слов в каждом словаре")
+    parser.add_argument("--active", type=int, default=300, help="одновременно пишущих пользователей")
+    parser.add_argument("--concurrency", type=int, default=64, help="апдейтов в обработке одновременно")
+    parser.add_argument("--latency", type=float, default=0.005, help="задержка заглушки Bot API, сек")
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "words.db")
+        dataset.generate(path, args.users, 1, args.words)
+        os.environ["WORDS_DB"] = path
+        os.environ.setdefault("BOT_TOKEN", FAKE_TOKEN)
+        # Виртуальные пользователи отвечают мгновенно: лимиты Telegram здесь мерили бы сами себя
+        os.environ.setdefault("OUTBOUND_RATE", "1000000")
+        os.environ.setdefault("OUTBOUND_CHAT_RATE", "1000000")
+        app = importlib.import_module("pick_me_bot")
+        app.create_app()
+        try:
+            sent = asyncio.run(run(app, args))
+        finally:
+            app.db.close()
+        with sqlite3.connect(path) as conn:
+            added = conn.execute("SELECT count(*) FROM words w JOIN translations t ON t.word_id = w.id "
+                                 "WHERE w.eng LIKE 'hook%' AND t.rus = 'вебхук'").fetchone()[0]
+        print(f"words added through the FSM: {added}/{len(sent)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Масштабирование по процессам: pick_me_bot запускается в режиме супервизора с N воркерами
+# против HTTP-заглушки Bot API, нагрузка приходит на вебхук супервизора. Время считается от
+# первого апдейта до завершения супервизора по SIGTERM, то есть включает дообработку очередей.
+# Запуск из корня репозитория:
+#   python -m benchmarks.workers --workers 1,2,4 --active 400
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import sqlite3
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks import dataset
+from benchmarks.fake_telegram import FAKE_TOKEN, api_app, callback_update, post_update, text_update
+from webhook import wait_listening
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pick_me_bot.py")
+
+
+def script(user_id):
+    # Рендеринг списка слов, клавиатуры и FSM добавления слова — то, что грузит процессор
+    dict_id = dataset.dict_id(user_id, 0, 1)
+    return [text_update(user_id, "/start"), callback_update(user_id, "menu_dicts"),
+            callback_update(user_id, "list_dicts"), callback_update(user_id, f"dict:{dict_id}"),
+            callback_update(user_id, f"show:{dict_id}"), callback_update(user_id, f"add:{dict_id}"),
+            text_update(user_id, f"proc{user_id}"), text_update(user_id, "процесс")]
+
+
+async def measure(workers, path, args, api_url):
+    env = dict(os.environ, BOT_MODE="supervisor", WORKERS=str(workers), WEBHOOK_HOST="127.0.0.1",
+               WEBHOOK_PORT=str(args.port), WORKER_PORT=str(args.port + 1), WORDS_DB=path,
+               BOT_TOKEN=FAKE_TOKEN, TELEGRAM_API_URL=api_url)
+    # Меряем процессор, а не лимиты Telegram: общий OUTBOUND_RATE супервизор делит между воркерами
+    env.setdefault("OUTBOUND_RATE", "1000000")
+    env.setdefault("OUTBOUND_CHAT_RATE", "1000000")
+    env.pop("WEBHOOK_URL", None)
+    process = await asyncio.create_subprocess_exec(sys.executable, BOT_SCRIPT, env=env,
+                                                   stdout=asyncio.subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{args.port}/webhook"
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as http:
+        await wait_listening(http, url, timeout=60)
+
+        async def user(user_id):
+            for update in script(user_id):
+                await post_update(http, url, update)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(u) for u in range(1, args.active + 1)))
+    process.send_signal(signal.SIGTERM)
+    await process.wait()
+    return time.perf_counter() - start
+
+
+async def run(args, root):
+    runner = web.AppRunner(api_app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.api_port).start()
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    source = os.path.join(root, "source.db")
+    dataset.generate(source, args.users, 1, args.words)
+    updates = args.active * len(script(1))
+    baseline = None
+    try:
+        for workers in args.workers:
+            path = os.path.join(root, f"words{workers}.db")
+            shutil.copy(source, path)
+            elapsed = await measure(workers, path, args, api_url)
+            baseline = baseline or updates / elapsed
+            with sqlite3.connect(path) as conn:
+                added = conn.execute("SELECT count(*) FROM words WHERE eng LIKE 'proc%'").fetchone()[0]
+            print(f"{workers} workers: {updates} updates in {elapsed:.2f}s, {updates / elapsed:.1f} updates/s, "
+                  f"x{updates / elapsed / baseline:.2f}, words added {added}/{args.active}")
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=lambda v: [int(n) for n in v.split(",")], default=[1, 2, 4],
+                        help="числа воркеров через запятую")
+    parser.add_argument("--users", type=int, default=1000, help="пользователей в синтетической базе")
+    parser.add_argument("--words", type=int, default=200, help="слов в словаре")
+    parser.add_argument("--active", type=int, default=400, help="пишущих пользователей")
+    parser.add_argument("--port", type=int, default=8090, help="порт супервизора, воркеры — следующие")
+    parser.add_argument("--api-port", type=int, default=8081, help="порт заглушки Bot API")
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory() as root:
+        asyncio.run(run(args, root))
+
+
+if __name__ == "__main__":
+    main()
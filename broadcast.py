@@ -0,0 +1,201 @@
+# Рассылки: ежедневное напоминание о словах к повторению и разовые объявления администратора.
+# Каждая рассылка — строка broadcasts. Получатели читаются из users порциями по ключу
+# (user_id > последнего обработанного), порция уходит через очередь исходящих с приоритетом
+# массовых сообщений и не больше concurrency отправок одновременно, а общий лимит бота
+# соблюдает сама очередь. После каждой порции в ту же строку пишутся курсор и счётчики,
+# поэтому прерванная рассылка продолжается с места остановки (повторно получит сообщение
+# не больше одной порции). Заблокировавшие бота удаляются из users; словари остаются,
+# и после /start пользователь снова получает рассылки.
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from aiogram.exceptions import TelegramForbiddenError
+
+from metrics import Counter
+from outbound import bulk, merged
+
+log = logging.getLogger("pick_me_bot.broadcast")
+
+REMINDER, ANNOUNCEMENT = "reminder", "broadcast"
+SENT, FAILED, BLOCKED = "sent", "failed", "blocked"
+BATCH_SIZE = 200
+# Рассылки, созданные другими воркерами, подхватываются не позже чем через столько секунд
+POLL_SECONDS = 60
+REMINDER_TEXT = ("❤️Зай, пора позаниматься! Слов к повторению: <b>{due}</b> 🐾\n"
+                 "Открой словарь и нажми «🧠 Тренировка».")
+
+SQL_CREATE = ("INSERT OR IGNORE INTO broadcasts (key, kind, text, admin_id, created_at) "
+              "VALUES (?, ?, ?, ?, ?)")
+SQL_ABANDON_REMINDERS = ("UPDATE broadcasts SET finished_at = ? "
+                         "WHERE kind = 'reminder' AND finished_at IS NULL AND key < ?")
+SQL_PENDING = ("SELECT id, kind, text, admin_id, last_user_id FROM broadcasts "
+               "WHERE finished_at IS NULL ORDER BY id")
+SQL_START = "UPDATE broadcasts SET started_at = coalesce(started_at, ?) WHERE id = ?"
+SQL_RECIPIENTS = "SELECT user_id, NULL FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?"
+SQL_REMINDER_RECIPIENTS = ("SELECT u.user_id, (SELECT count(*) FROM review_state r "
+                           "WHERE r.user_id = u.user_id AND r.due_at <= ?) "
+                           "FROM users u WHERE u.user_id > ? ORDER BY u.user_id LIMIT ?")
+SQL_REMOVE_USERS = "DELETE FROM users WHERE user_id IN (SELECT value FROM json_each(?))"
+SQL_PROGRESS = ("UPDATE broadcasts SET last_user_id = ?, sent = sent + ?, failed = failed + ?, "
+                "removed = removed + ?, seconds = seconds + ? WHERE id = ?")
+SQL_FINISH = "UPDATE broadcasts SET finished_at = ? WHERE id = ?"
+SQL_STATS = "SELECT id, kind, sent, failed, removed, seconds, finished_at FROM broadcasts WHERE id = ?"
+SQL_RECENT = ("SELECT id, kind, sent, failed, removed, seconds, finished_at FROM broadcasts "
+              "ORDER BY id DESC LIMIT ?")
+
+MESSAGES = Counter("bot_broadcast_messages_total", "Сообщения рассылок", ["kind", "result"])
+
+
+# --- Расписание ---
+def _today_at(reminder_time, now):
+    hour, minute = reminder_time
+    return datetime.fromtimestamp(now, timezone.utc).replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+
+def next_reminder(reminder_time, now):
+    # Ближайший момент напоминания (время — UTC) после now
+    at = _today_at(reminder_time, now)
+    return (at if at.timestamp() > now else at + timedelta(days=1)).timestamp()
+
+
+def reminder_key(now):
+    return f"reminder:{datetime.fromtimestamp(now, timezone.utc):%Y-%m-%d}"
+
+
+# --- Запросы ---
+def create_broadcast(conn, kind, text, admin_id=None, key=None, now=None):
+    now = time.time() if now is None else now
+    return conn.execute(SQL_CREATE, (key, kind, text, admin_id, now)).lastrowid
+
+
+def plan_reminder(conn, reminder_time, now=None):
+    # Сегодняшнее напоминание, если его время прошло; вчерашние недосланные уже не актуальны
+    now = time.time() if now is None else now
+    key = reminder_key(now)
+    conn.execute(SQL_ABANDON_REMINDERS, (now, key))
+    if now >= _today_at(reminder_time, now).timestamp():
+        create_broadcast(conn, REMINDER, None, key=key, now=now)
+
+
+def pending_broadcasts(conn):
+    return conn.execute(SQL_PENDING).fetchall()
+
+
+def start_broadcast(conn, broadcast_id, now):
+    conn.execute(SQL_START, (now, broadcast_id))
+
+
+def recipients(conn, kind, after, limit, now):
+    # [(user_id, слов к повторению)]; для объявлений второе поле — None
+    if kind == REMINDER:
+        return conn.execute(SQL_REMINDER_RECIPIENTS, (now, after, limit)).fetchall()
+    return conn.execute(SQL_RECIPIENTS, (after, limit)).fetchall()
+
+
+def save_progress(conn, broadcast_id, last_user_id, sent, failed, blocked, seconds):
+    # Курсор, счётчики и удаление заблокировавших — одной транзакцией
+    if blocked:
+        conn.execute(SQL_REMOVE_USERS, (json.dumps(blocked),))
+    conn.execute(SQL_PROGRESS, (last_user_id, sent, failed, len(blocked), seconds, broadcast_id))
+
+
+def finish_broadcast(conn, broadcast_id, now):
+    conn.execute(SQL_FINISH, (now, broadcast_id))
+    return conn.execute(SQL_STATS, (broadcast_id,)).fetchone()
+
+
+def recent_broadcasts(conn, limit):
+    return conn.execute(SQL_RECENT, (limit,)).fetchall()
+
+
+def describe(row):
+    broadcast_id, kind, sent, failed, removed, seconds, finished_at = row
+    title = "Напоминание" if kind == REMINDER else "Рассылка"
+    status = "завершена" if finished_at is not None else "идёт"
+    rate = sent / seconds if seconds else 0.0
+    return (f"📣 {title} #{broadcast_id} {status}: отправлено {sent}, ошибок {failed}, "
+            f"удалено заблокировавших {removed}; {seconds:.0f} с, {rate:.1f} сообщ./с")
+
+
+# --- Рассыльщик ---
+class Broadcaster:
+    def __init__(self, db, bot, reminder_time=None, concurrency=20, batch_size=BATCH_SIZE):
+        self.db = db
+        self.bot = bot
+        self.reminder_time = reminder_time
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+
+    async def announce(self, text, admin_id):
+        broadcast_id = await self.db.write(create_broadcast, ANNOUNCEMENT, text, admin_id)
+        self._wakeup.set()
+        return broadcast_id
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self._run_pending()
+            except Exception:
+                # Ошибка базы или Bot API не должна останавливать рассылки до перезапуска:
+                # прерванная продолжится с сохранённого курсора на следующем круге
+                log.exception("broadcast loop failed, retrying")
+            timeout = POLL_SECONDS
+            if self.reminder_time is not None:
+                timeout = min(timeout, next_reminder(self.reminder_time, time.time()) - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_pending(self):
+        if self.reminder_time is not None:
+            await self.db.write(plan_reminder, self.reminder_time, time.time())
+        for broadcast_id, kind, text, admin_id, last_user_id in await self.db.read(pending_broadcasts):
+            # Сбой одной рассылки не задерживает следующие
+            try:
+                await self.deliver(broadcast_id, kind, text, admin_id, last_user_id)
+            except Exception:
+                log.exception("broadcast %s failed, will resume later", broadcast_id)
+
+    async def deliver(self, broadcast_id, kind, text, admin_id=None, last_user_id=0):
+        await self.db.write(start_broadcast, broadcast_id, time.time())
+        # Рассылки никто не правит, поэтому их можно склеивать с соседними сообщениями чата
+        with bulk(), merged():
+            while True:
+                start = time.monotonic()
+                rows = await self.db.read(recipients, kind, last_user_id, self.batch_size, time.time())
+                if not rows:
+                    break
+                messages = [(user_id, text if kind == ANNOUNCEMENT else REMINDER_TEXT.format(due=due))
+                            for user_id, due in rows if kind == ANNOUNCEMENT or due]
+                results = await asyncio.gather(*(self._send(kind, user_id, message) for user_id, message in messages))
+                last_user_id = rows[-1][0]
+                blocked = [user_id for (user_id, _), result in zip(messages, results) if result == BLOCKED]
+                await self.db.write(save_progress, broadcast_id, last_user_id, results.count(SENT),
+                                    results.count(FAILED), blocked, time.monotonic() - start)
+        report = describe(await self.db.write(finish_broadcast, broadcast_id, time.time()))
+        log.info(report)
+        if admin_id is not None:
+            try:
+                await self.bot.send_message(admin_id, report)
+            except Exception as e:
+                log.warning("broadcast %s: report to %s failed: %s", broadcast_id, admin_id, e)
+        return report
+
+    async def _send(self, kind, user_id, text):
+        async with self._semaphore:
+            try:
+                await self.bot.send_message(user_id, text)
+                result = SENT
+            except TelegramForbiddenError:
+                result = BLOCKED
+            except Exception as e:
+                log.warning("broadcast to %s failed: %s", user_id, e)
+                result = FAILED
+        MESSAGES.inc(kind=kind, result=result)
+        return result
@@ -0,0 +1,94 @@
+import csv
+import itertools
+import json
+
+from migrations import split_translations
+from repository import SQL_RESET_RATING
+
+BATCH_SIZE = 1000
+HEADER_WORDS = {"eng", "english", "word", "слово", "английский"}
+SQL_EXPORT_WORDS = ("SELECT w.eng, (SELECT group_concat(rus, ';') FROM translations WHERE word_id = w.id) "
+                    "FROM words w WHERE w.dict_id = ? ORDER BY w.id")
+# Пачка слов — одним запросом по JSON-массиву: триггеры поискового индекса срабатывают внутри
+# одного выражения, и FTS5 сбрасывает накопленное на диск раз за пачку, а не на каждую строку
+SQL_IMPORT_WORDS = "INSERT OR IGNORE INTO words (dict_id, eng) SELECT ?, value FROM json_each(?)"
+SQL_IMPORT_TRANSLATIONS = ("INSERT OR IGNORE INTO translations (word_id, rus) "
+                           "SELECT w.id, json_extract(j.value, '$[1]') FROM json_each(?) j "
+                           "CROSS JOIN words w ON w.dict_id = ? AND w.eng = json_extract(j.value, '$[0]')")
+
+
+class ImportFileError(Exception):
+    pass
+
+
+# --- Импорт ---
+# Файл: по строке на слово, "eng<разделитель>перевод[;перевод...]". Разделитель —
+# табуляция, запятая или точка с запятой, определяется по первой строке.
+# Битая строка или не UTF-8 — ImportFileError с номером строки; транзакция импорта откатывается.
+def sniff_delimiter(line):
+    for delimiter in ("\t", ",", ";"):
+        if delimiter in line:
+            return delimiter
+    return "\t"
+
+
+def iter_words(f):
+    lines = iter(f)
+    first = next(lines, "")
+    reader = csv.reader(itertools.chain([first], lines), delimiter=sniff_delimiter(first))
+    try:
+        for number, row in enumerate(reader):
+            if len(row) < 2 or number == 0 and row[0].strip().lower() in HEADER_WORDS:
+                continue
+            eng = row[0].strip().lower()
+            # При разделителе ";" лишние колонки — это дополнительные переводы
+            rus = [r for cell in row[1:] for r in split_translations(cell.lower())]
+            if eng and rus:
+                yield eng, rus
+    except csv.Error as e:
+        raise ImportFileError(f"строка {reader.line_num}: {e}") from e
+
+
+def decode_lines(f):
+    # Построчно, а не буферами TextIOWrapper: так известна строка с ошибкой кодировки
+    for number, line in enumerate(f, 1):
+        try:
+            text = line.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise ImportFileError(f"строка {number}: файл не в кодировке UTF-8") from e
+        yield text.removeprefix("\ufeff") if number == 1 else text
+
+
+def import_words(conn, user_id, dict_id, f):
+    # Выполняется в потоке-писателе одной транзакцией; файл читается по частям
+    return import_pairs(conn, user_id, dict_id, iter_words(f))
+
+
+def import_pairs(conn, user_id, dict_id, pairs):
+    # pairs — (eng, [переводы]) в нижнем регистре; пачками по BATCH_SIZE, по запросу на пачку
+    rows = added_words = added_translations = 0
+    source = iter(pairs)
+    for batch in iter(lambda: list(itertools.islice(source, BATCH_SIZE)), []):
+        rows += len(batch)
+        added_words += conn.execute(SQL_IMPORT_WORDS, (dict_id, json.dumps([eng for eng, _ in batch]))).rowcount
+        added_translations += conn.execute(
+            SQL_IMPORT_TRANSLATIONS, (json.dumps([(eng, r) for eng, rus in batch for r in rus]), dict_id)).rowcount
+    conn.execute(SQL_RESET_RATING, (user_id, dict_id))
+    return rows, added_words, added_translations
+
+
+# --- Экспорт ---
+def export_words(conn, dict_id, path):
+    # Курсор отдаёт строки по мере чтения — словарь целиком в память не попадает
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        for eng, rus in conn.execute(SQL_EXPORT_WORDS, (dict_id,)):
+            writer.writerow((eng, rus or ""))
+            count += 1
+    return count
+
+
+def import_file(conn, user_id, dict_id, path):
+    with open(path, "rb") as f:
+        return import_words(conn, user_id, dict_id, decode_lines(f))
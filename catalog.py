@@ -0,0 +1,162 @@
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from grading import AnswerKey, compile_key
+
+TEST_TYPES = ("listening", "writing", "reading")
+
+
+@dataclass
+class TestVariant:
+    test_type: str
+    name: str
+    questions: str
+    answer: Optional[str]
+    audio: Optional[str] = None
+    audio_mtime: int = 0
+    key: Optional[AnswerKey] = None
+
+
+def _natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+class TestCatalog:
+    # Индекс тестов в памяти. Раскладка файлов:
+    #   listening/questions/<вариант>/audio.mp3 и questions.txt
+    #   writing|reading/questions/<вариант>.txt
+    #   <тип>/answers/<вариант>.txt
+    # Не чаще раза в check_interval секунд в отдельном потоке сверяются mtime файлов каталога;
+    # индекс перестраивается, только если они изменились, и перечитываются только изменённые файлы.
+    def __init__(self, root=".", db=None, check_interval=5.0):
+        self.root = root
+        self.db = db
+        self.check_interval = check_interval
+        self._files = {}
+        self._index = {}
+        self._file_ids = {}
+        self._signature = None
+        self._checked_at = None
+        self._refreshing = None
+
+    def _read(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._files.pop(path, None)
+            return None
+        cached = self._files.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        self._files[path] = (mtime, text)
+        return text
+
+    def _scan_type(self, test_type):
+        questions_dir = os.path.join(self.root, test_type, "questions")
+        answers_dir = os.path.join(self.root, test_type, "answers")
+        variants = {}
+        try:
+            entries = list(os.scandir(questions_dir))
+        except FileNotFoundError:
+            return variants
+        for entry in entries:
+            audio, audio_mtime = None, 0
+            if test_type == "listening":
+                if not entry.is_dir():
+                    continue
+                name = entry.name
+                questions = self._read(os.path.join(entry.path, "questions.txt"))
+                audio = os.path.join(entry.path, "audio.mp3")
+                try:
+                    audio_mtime = os.stat(audio).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+            else:
+                if not entry.name.endswith(".txt"):
+                    continue
+                name = entry.name[:-len(".txt")]
+                questions = self._read(entry.path)
+            if questions is None:
+                continue
+            answer = self._read(os.path.join(answers_dir, f"{name}.txt"))
+            if answer is not None and answer.strip():
+                # Ключ компилируется один раз на содержимое файла (compile_key кэширует)
+                variants[name] = TestVariant(test_type, name, questions, answer.strip(), audio, audio_mtime,
+                                             compile_key(answer))
+            else:
+                variants[name] = TestVariant(test_type, name, questions, None, audio, audio_mtime)
+        return variants
+
+    def _stat_tree(self):
+        # (путь, mtime) всех файлов каталога: только scandir и stat, без чтения файлов
+        stats = []
+        for test_type in TEST_TYPES:
+            dirs = [os.path.join(self.root, test_type, "questions"), os.path.join(self.root, test_type, "answers")]
+            while dirs:
+                try:
+                    entries = list(os.scandir(dirs.pop()))
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            dirs.append(entry.path)
+                        else:
+                            stats.append((entry.path, entry.stat().st_mtime_ns))
+                    except FileNotFoundError:
+                        continue
+        return sorted(stats)
+
+    def scan(self):
+        # Снимок mtime берётся до чтения: файл, изменённый во время скана, попадёт в следующий
+        self._signature = self._stat_tree()
+        self._index = {test_type: self._scan_type(test_type) for test_type in TEST_TYPES}
+        self._checked_at = time.monotonic()
+
+    def _rescan(self):
+        if self._signature is None or self._stat_tree() != self._signature:
+            self.scan()
+
+    async def _refresh_in_thread(self):
+        try:
+            await asyncio.to_thread(self._rescan)
+        finally:
+            self._checked_at = time.monotonic()
+            self._refreshing = None
+
+    async def refresh(self):
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        # Одновременные запросы ждут одну и ту же проверку
+        if self._refreshing is None:
+            self._refreshing = asyncio.create_task(self._refresh_in_thread())
+        await asyncio.shield(self._refreshing)
+
+    async def variants(self, test_type):
+        await self.refresh()
+        return sorted(self._index.get(test_type, {}), key=_natural_key)
+
+    async def get(self, test_type, name):
+        await self.refresh()
+        return self._index.get(test_type, {}).get(name)
+
+    # --- file_id загруженных в Telegram файлов ---
+    # file_id привязан к mtime: если файл заменили, он загрузится заново
+    async def load_file_ids(self):
+        if self.db is not None:
+            self._file_ids = {path: (mtime, file_id) for path, mtime, file_id in await self.db.get_file_ids()}
+
+    def file_id(self, path, mtime):
+        cached = self._file_ids.get(path)
+        return cached[1] if cached and cached[0] == mtime else None
+
+    async def remember_file_id(self, path, mtime, file_id):
+        self._file_ids[path] = (mtime, file_id)
+        if self.db is not None:
+            await self.db.save_file_id(path, mtime, file_id)
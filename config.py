@@ -0,0 +1,89 @@
+# Настройки бота. Берутся из переменных окружения; дополнительно — из файла KEY=VALUE
+# (путь в BOT_CONFIG или аргументом load_config), переменные окружения важнее файла.
+import os
+from dataclasses import dataclass, field, fields
+
+
+def _setting(env, default=None, convert=None):
+    return field(default=default, metadata={"env": env, "convert": convert or type(default)})
+
+
+def _optional_int(value):
+    return int(value) if value else None
+
+
+def _id_list(value):
+    return tuple(int(part) for part in value.replace(",", " ").split())
+
+
+def _time_of_day(value):
+    # "ЧЧ:ММ" или "off"
+    if value.lower() == "off":
+        return None
+    hour, minute = value.split(":")
+    return int(hour), int(minute)
+
+
+@dataclass(frozen=True)
+class Config:
+    token: str = _setting("BOT_TOKEN", convert=str)
+    # Свой Bot API сервер (локальный telegram-bot-api или заглушка), по умолчанию api.telegram.org
+    api_url: str = _setting("TELEGRAM_API_URL", convert=str)
+    db_path: str = _setting("WORDS_DB", "words.db")
+    # Prometheus-метрики на http://METRICS_HOST:METRICS_PORT/metrics; без порта сервер не поднимается
+    metrics_host: str = _setting("METRICS_HOST", "127.0.0.1")
+    metrics_port: int = _setting("METRICS_PORT", 0)
+    # polling, webhook или supervisor; вебхук слушает WEBHOOK_HOST:WEBHOOK_PORT и регистрируется по WEBHOOK_URL
+    mode: str = _setting("BOT_MODE", "polling")
+    webhook_url: str = _setting("WEBHOOK_URL", convert=str)
+    webhook_path: str = _setting("WEBHOOK_PATH", "/webhook")
+    webhook_host: str = _setting("WEBHOOK_HOST", "0.0.0.0")
+    webhook_port: int = _setting("WEBHOOK_PORT", 8080)
+    webhook_secret: str = _setting("WEBHOOK_SECRET", convert=str)
+    webhook_concurrency: int = _setting("WEBHOOK_CONCURRENCY", 64)
+    # Супервизор принимает вебхук сам и раздаёт апдейты WORKERS воркерам на портах WORKER_PORT + i
+    workers: int = _setting("WORKERS", os.cpu_count() or 1)
+    worker_port: int = _setting("WORKER_PORT", 9000)
+    # Номер воркера выставляет супервизор; воркеры пишут в базу по очереди через файл-замок
+    worker_index: int = _setting("WORKER_INDEX", convert=_optional_int)
+    # Лимиты исходящих сообщений: на бота и на каждый чат (сообщений в секунду и пачка подряд)
+    outbound_rate: float = _setting("OUTBOUND_RATE", 30.0)
+    outbound_chat_rate: float = _setting("OUTBOUND_CHAT_RATE", 1.0)
+    outbound_chat_burst: int = _setting("OUTBOUND_CHAT_BURST", 3)
+    # Порог для лога медленных обработчиков, SQL и вызовов переводчика, мс (0 — выключен)
+    slow_log_ms: int = _setting("SLOW_LOG_MS", 0)
+    # Офлайн-словарь переводов (lexicon.py): файл, по умолчанию рядом с базой, и период его пересборки, с
+    lexicon_path: str = _setting("LEXICON_PATH", convert=str)
+    lexicon_interval: int = _setting("LEXICON_INTERVAL", 300)
+    # Кто может делать рассылки (/broadcast): id пользователей через запятую
+    admin_ids: tuple = _setting("ADMIN_IDS", (), _id_list)
+    # Ежедневное напоминание о словах к повторению, время UTC ("off" — выключено)
+    reminder_time: tuple = _setting("REMINDER_TIME", (16, 0), _time_of_day)
+    broadcast_concurrency: int = _setting("BROADCAST_CONCURRENCY", 20)
+    # FSM-состояния и тренировки, не менявшиеся столько дней, удаляются из базы
+    state_ttl_days: int = _setting("STATE_TTL_DAYS", 30)
+
+
+def read_file(path):
+    values = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            values[key.strip()] = value.strip().strip("\"'")
+    return values
+
+
+def load_config(path=None, environ=None):
+    environ = os.environ if environ is None else environ
+    path = path or environ.get("BOT_CONFIG")
+    values = read_file(path) if path else {}
+    values.update(environ)
+    options = {}
+    for setting in fields(Config):
+        value = values.get(setting.metadata["env"])
+        if value is not None and value != "":
+            options[setting.name] = setting.metadata["convert"](value)
+    return Config(**options)
@@ -0,0 +1,93 @@
+# Метаданные словарей пользователя (id, название, число слов, рейтинг) и готовые клавиатуры
+# к ним, в ограниченном LRU. Навигация по меню словарей обходится без базы; после изменений
+# (новый словарь, добавление или удаление слов, рейтинг) запись сбрасывается и при следующем
+# обращении читается заново одним запросом.
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+
+@dataclass
+class DictInfo:
+    id: int
+    name: str
+    words: int
+    rating: tuple = None  # (последняя попытка, лучшая, всего слов)
+
+
+class UserDicts:
+    def __init__(self, rows):
+        self.by_id = {}
+        for dict_id, name, words, last, best, total in rows:
+            self.by_id[dict_id] = DictInfo(dict_id, name, words, None if last is None else (last, best, total))
+        self._keyboards = {}
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def get(self, dict_id):
+        return self.by_id.get(dict_id)
+
+    def keyboard(self, action, back=None):
+        # По кнопке на словарь с callback_data "<action>:<id>"; строится один раз
+        kb = self._keyboards.get((action, back))
+        if kb is None:
+            builder = InlineKeyboardBuilder()
+            for info in self:
+                builder.button(text=info.name, callback_data=f"{action}:{info.id}")
+            if back:
+                builder.button(text="🔙 Назад", callback_data=back)
+            kb = self._keyboards[(action, back)] = builder.as_markup()
+        return kb
+
+
+@lru_cache(maxsize=10_000)
+def dict_menu_keyboard(dict_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="➕ Добавить слово", callback_data=f"add:{dict_id}")],
+        [InlineKeyboardButton(text="🧠 Тренировка", callback_data=f"train:{dict_id}")],
+        [InlineKeyboardButton(text="📄 Показать слова", callback_data=f"show:{dict_id}")],
+        [InlineKeyboardButton(text="📈 Рейтинг", callback_data=f"rate:{dict_id}")],
+        [InlineKeyboardButton(text="🗑️ Удалить перевод", callback_data=f"del:{dict_id}")],
+        [InlineKeyboardButton(text="📥 Импорт из файла", callback_data=f"import:{dict_id}"),
+         InlineKeyboardButton(text="📤 Экспорт в файл", callback_data=f"export:{dict_id}")],
+        [InlineKeyboardButton(text="🔙 Назад", callback_data="list_dicts")]
+    ])
+
+
+class DictionaryCache:
+    def __init__(self, db, max_users=10_000):
+        self.db = db
+        self.max_users = max_users
+        self.stats = Counter()
+        self._users = OrderedDict()
+        self._epoch = 0
+
+    async def get(self, user_id):
+        entry = self._users.get(user_id)
+        if entry is not None:
+            self.stats["hits"] += 1
+            self._users.move_to_end(user_id)
+            return entry
+        self.stats["misses"] += 1
+        epoch = self._epoch
+        entry = UserDicts(await self.db.get_dict_meta(user_id))
+        # Если пока читали, что-то сбросили, прочитанное могло устареть — не запоминаем
+        if epoch == self._epoch:
+            self._users[user_id] = entry
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return entry
+
+    def invalidate(self, user_id):
+        self._epoch += 1
+        self._users.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._users)
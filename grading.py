@@ -0,0 +1,190 @@
+# Проверка ответов. Ключ ответа компилируется один раз: текст нормализуется (регистр,
+# пробелы, ё/е, пунктуация), делится на пункты, у каждого пункта — множество допустимых
+# вариантов с заранее построенными битовыми масками символов. Ответ сверяется с вариантом
+# сначала точно, потом с допуском на опечатки: расстояние Левенштейна считается битово-
+# параллельным алгоритмом Майерса (одна итерация на символ ответа) и обрывается, как только
+# превышение допуска стало неизбежным. Числа и однобуквенные слова (варианты ответа
+# «a»/«b», коды вроде «b2») опечаток не допускают: «1991» вместо «1990» — ошибка.
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+EXACT, TYPO, WRONG, MISSING = "exact", "typo", "wrong", "missing"
+
+_SPACES = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+_YO = str.maketrans("ё", "е")
+_NUMBERED = re.compile(r"(?:^|\s)\d+\s*[.)]\s*")
+_LIST = re.compile(r"[,;]")
+_ITEM_NUMBER = re.compile(r"^\d+\s*[.)]\s*")
+# Способы разбить ответ на пункты — в порядке предпочтения
+SPLIT_MODES = ("lines", "numbered", "list", "words")
+ALTERNATIVES = re.compile(r"[/|]")
+_DIGIT = re.compile(r"\d")
+
+
+def normalize(text):
+    text = _PUNCTUATION.sub(" ", text.casefold().translate(_YO))
+    return _SPACES.sub(" ", text).strip()
+
+
+def typo_limit(length):
+    # Короткие слова — только точно, дальше одна-две опечатки
+    if length < 4:
+        return 0
+    return 1 if length < 8 else 2
+
+
+def exact_tokens(text):
+    # Слова, которые должны совпасть точно, — по порядку
+    return tuple(token for token in text.split() if len(token) == 1 or _DIGIT.search(token))
+
+
+def char_masks(text):
+    # Для каждого символа — битовая маска его позиций в text
+    masks = {}
+    for i, char in enumerate(text):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+def within_distance(a, b, limit, masks=None):
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if a == b:
+        return True
+    if limit == 0 or not b:
+        return len(a) <= limit
+    masks = masks if masks is not None else char_masks(b)
+    full = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    pv, mv, score = full, 0, len(b)
+    remaining = len(a)
+    for char in a:
+        eq = masks.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv
+        remaining -= 1
+        # Каждый следующий символ уменьшает расстояние не больше чем на 1
+        if score - remaining > limit:
+            return False
+    return score <= limit
+
+
+def split_items(text, mode):
+    if mode == "lines":
+        items = text.splitlines()
+    elif mode == "numbered":
+        items = _NUMBERED.split(text)
+    elif mode == "list":
+        items = _LIST.split(text)
+    else:
+        items = text.split()
+    items = (_ITEM_NUMBER.sub("", item.strip()) for item in items)
+    return [item for item in items if item]
+
+
+@dataclass
+class ItemResult:
+    verdict: str
+    answer: str
+    expected: str
+
+    @property
+    def ok(self):
+        return self.verdict in (EXACT, TYPO)
+
+
+class AnswerSet:
+    # Один пункт: несколько допустимых вариантов
+    __slots__ = ("display", "variants", "_masks")
+
+    def __init__(self, variants, display):
+        self.display = display
+        self.variants = frozenset(v for v in map(normalize, variants) if v)
+        self._masks = [(variant, char_masks(variant), exact_tokens(variant)) for variant in self.variants]
+
+    def grade(self, answer):
+        text = normalize(answer)
+        if not text:
+            return ItemResult(MISSING, answer, self.display)
+        if text in self.variants:
+            return ItemResult(EXACT, answer, self.display)
+        limit = typo_limit(len(text))
+        if limit:
+            exact = exact_tokens(text)
+            if any(exact == variant_exact and within_distance(text, variant, limit, masks)
+                   for variant, masks, variant_exact in self._masks):
+                return ItemResult(TYPO, answer, self.display)
+        return ItemResult(WRONG, answer, self.display)
+
+
+@lru_cache(maxsize=50_000)
+def compile_translations(rus):
+    # Переводы слова из group_concat(rus, ';')
+    variants = [r.strip() for r in rus.split(";") if r.strip()]
+    return AnswerSet(variants, " / ".join(variants))
+
+
+class AnswerKey:
+    def __init__(self, text):
+        self.text = text.strip()
+        self.mode = self._detect_mode(self.text)
+        raw = split_items(self.text, self.mode)
+        self.items = [AnswerSet(ALTERNATIVES.split(item), item) for item in raw]
+        # Сколько слов в каждом пункте (по первому варианту)
+        self._sizes = [len(ALTERNATIVES.split(item)[0].split()) for item in raw]
+        self._words = sum(self._sizes)
+
+    @staticmethod
+    def _detect_mode(text):
+        if len(split_items(text, "lines")) > 1:
+            return "lines"
+        if len(split_items(text, "numbered")) > 1 and _NUMBERED.match(text):
+            return "numbered"
+        if len(split_items(text, "list")) > 1:
+            return "list"
+        return "words"
+
+    def _split_answer(self, text):
+        # Сначала так же, как ключ; если число пунктов не сошлось — другими способами.
+        # Ответ в одну строку через пробел делится по числу слов в пунктах ключа.
+        items = split_items(text, self.mode)
+        if len(items) == len(self.items):
+            return items
+        candidates = [split_items(text, mode) for mode in SPLIT_MODES]
+        for candidate in candidates:
+            if len(candidate) == len(self.items):
+                return candidate
+        words = text.split()
+        if len(words) == self._words:
+            chunks, start = [], 0
+            for size in self._sizes:
+                chunks.append(" ".join(words[start:start + size]))
+                start += size
+            return chunks
+        # Иначе — разбиение, давшее больше всего пунктов, но не больше, чем в ключе
+        fitting = [candidate for candidate in candidates if len(candidate) <= len(self.items)]
+        return max(fitting, key=len) if fitting else items
+
+    def grade(self, text):
+        answers = self._split_answer(text)
+        return [item.grade(answers[i] if i < len(answers) else "") for i, item in enumerate(self.items)]
+
+    def __len__(self):
+        return len(self.items)
+
+
+@lru_cache(maxsize=1024)
+def compile_key(text):
+    return AnswerKey(text)
@@ -0,0 +1,93 @@
+# Таблицы лидеров: общая, по размеру словаря и недельная. Очки — верные ответы в законченных
+# тренировках. Счёт каждого игрока на каждой доске хранится готовым (leaderboard_scores),
+# рядом — гистограмма «сколько игроков набрали ровно столько очков» (leaderboard_histogram)
+# и число игроков на доске. Законченная тренировка меняет по строке счёта и по две строки
+# гистограммы на доску в той же транзакции, что и рейтинг словаря. Топ читается по индексу
+# (board, score DESC), место игрока — суммой гистограммы выше его счёта: строк в ней столько,
+# сколько разных значений очков, а не игроков.
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+GLOBAL = "all"
+# Границы размеров словаря: до 50 слов, 50–199, 200–999, 1000 и больше
+SIZE_BUCKETS = (50, 200, 1000)
+WEEKS_KEPT = 8
+
+SQL_SET_NAME = ("INSERT INTO users (user_id, name) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET name = excluded.name")
+SQL_GET_SCORE = "SELECT score FROM leaderboard_scores WHERE board = ? AND user_id = ?"
+SQL_SAVE_SCORE = ("INSERT INTO leaderboard_scores (board, user_id, score, updated_at) VALUES (?, ?, ?, ?) "
+                  "ON CONFLICT (board, user_id) DO UPDATE SET score = excluded.score, updated_at = excluded.updated_at")
+SQL_HISTOGRAM_ADD = ("INSERT INTO leaderboard_histogram (board, score, users) VALUES (?, ?, 1) "
+                     "ON CONFLICT (board, score) DO UPDATE SET users = users + 1")
+SQL_HISTOGRAM_REMOVE = "UPDATE leaderboard_histogram SET users = users - 1 WHERE board = ? AND score = ?"
+SQL_HISTOGRAM_PRUNE = "DELETE FROM leaderboard_histogram WHERE board = ? AND score = ? AND users <= 0"
+SQL_BOARD_JOIN = ("INSERT INTO leaderboard_boards (board, users) VALUES (?, 1) "
+                  "ON CONFLICT (board) DO UPDATE SET users = users + 1")
+SQL_TOP = ("SELECT s.user_id, u.name, s.score FROM leaderboard_scores s "
+           "LEFT JOIN users u ON u.user_id = s.user_id "
+           "WHERE s.board = ? ORDER BY s.score DESC, s.updated_at LIMIT ?")
+SQL_PLAYERS_ABOVE = "SELECT coalesce(sum(users), 0) FROM leaderboard_histogram WHERE board = ? AND score > ?"
+SQL_PLAYERS = "SELECT users FROM leaderboard_boards WHERE board = ?"
+SQL_PURGE_WEEKS = {table: f"DELETE FROM {table} WHERE board >= 'week:' AND board < ?"
+                   for table in ("leaderboard_scores", "leaderboard_histogram", "leaderboard_boards")}
+
+
+def size_board(words):
+    return f"size:{bisect_right(SIZE_BUCKETS, words)}"
+
+
+def week_board(now=None):
+    year, week, _ = datetime.fromtimestamp(now or time.time(), timezone.utc).isocalendar()
+    return f"week:{year}-W{week:02d}"
+
+
+def boards_for(words, now=None):
+    return GLOBAL, size_board(words), week_board(now)
+
+
+def add_points(conn, board, user_id, points, now):
+    old = conn.execute(SQL_GET_SCORE, (board, user_id)).fetchone()
+    score = (old[0] if old else 0) + points
+    conn.execute(SQL_SAVE_SCORE, (board, user_id, score, now))
+    if old:
+        conn.execute(SQL_HISTOGRAM_REMOVE, (board, old[0]))
+        conn.execute(SQL_HISTOGRAM_PRUNE, (board, old[0]))
+    else:
+        conn.execute(SQL_BOARD_JOIN, (board,))
+    conn.execute(SQL_HISTOGRAM_ADD, (board, score))
+    return score
+
+
+def record_session(conn, user_id, name, words, correct, now=None):
+    # Законченная тренировка по словарю из words слов: correct очков на все три доски
+    if correct <= 0:
+        return
+    now = now or time.time()
+    if name:
+        conn.execute(SQL_SET_NAME, (user_id, name))
+    for board in boards_for(words, now):
+        add_points(conn, board, user_id, correct, now)
+
+
+def standings(conn, board, user_id, limit):
+    # Топ доски и место игрока: (топ [(user_id, name, score)], очки, место, игроков) или None вместо
+    # очков и места, если игрок на доске ещё не появлялся. Одинаковые очки делят место.
+    top = conn.execute(SQL_TOP, (board, limit)).fetchall()
+    row = conn.execute(SQL_PLAYERS, (board,)).fetchone()
+    players = row[0] if row else 0
+    mine = conn.execute(SQL_GET_SCORE, (board, user_id)).fetchone()
+    if mine is None:
+        return top, None, None, players
+    # Сумма гистограммы читает по строке на каждое значение очков выше игрока, а count(*) по
+    # idx_leaderboard_top — по строке на каждого игрока выше. Разных значений не больше самого
+    # высокого счёта и обычно на порядки меньше, чем игроков, поэтому место считаем по гистограмме.
+    above = conn.execute(SQL_PLAYERS_ABOVE, (board, mine[0])).fetchone()[0]
+    return top, mine[0], above + 1, players
+
+
+def purge_weeks(conn, now=None, keep=WEEKS_KEPT):
+    # Недельные доски старше keep недель больше никто не откроет
+    oldest = week_board((now or time.time()) - timedelta(weeks=keep).total_seconds())
+    return sum(conn.execute(sql, (oldest,)).rowcount for sql in SQL_PURGE_WEEKS.values())
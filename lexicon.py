@@ -0,0 +1,302 @@
+# Офлайн-словарь: пары английское слово — перевод из словарей всех пользователей, сведённые
+# в один отсортированный файл с частотами. Файл открывается через mmap, поиск — двоичный
+# по таблице смещений, без базы и сети, поэтому перевод частых слов не ходит в googletrans.
+#
+# Формат: заголовок, записи и таблица смещений записей (uint32 от начала данных, на одно
+# больше числа записей). Запись — "<e|r><слово>\t<перевод>\t<частота>\t..." в UTF-8:
+# "e" — с английского, "r" — с русского, переводы по убыванию частоты. Частота — число слов
+# в словарях с такой парой.
+#
+# Новые переводы триггер складывает в lexicon_delta (см. migrations._lexicon_delta). Сборка
+# читает только их и сливает с прежним файлом: нетронутые записи переносятся кусками байтов
+# без разбора, заново кодируются только записи новых слов. Забранные строки затем удаляются
+# из lexicon_delta. Удалённые слова из частот уходят при полной пересборке раз в
+# FULL_REBUILD_SECONDS. Сборка — отдельный процесс (python lexicon.py words.db words.db.lexicon),
+# чтобы разбор сотен тысяч строк не держал GIL бота.
+import argparse
+import asyncio
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+MAGIC = b"PMLEX01\0"
+# magic, последний учтённый id в lexicon_delta, время полной сборки, число записей, смещение таблицы
+HEADER = struct.Struct("<8sQdQQ")
+FULL_REBUILD_SECONDS = 24 * 3600
+# Каждый SPARSE_STEP-й ключ держится в памяти: двоичный поиск по ним идёт в bisect,
+# по файлу остаётся несколько шагов внутри блока
+SPARSE_STEP = 16
+# Чужой перевод предлагается, только если он есть хотя бы в двух словарях: так в подсказки
+# не попадают опечатки и личные пометки одного пользователя
+MIN_COUNT = 2
+SUGGESTIONS = 3
+PREFIXES = {"en": b"e", "ru": b"r"}
+
+SQL_LAST_DELTA = "SELECT coalesce(max(id), 0) FROM lexicon_delta"
+SQL_ALL_PAIRS = ("SELECT w.eng, t.rus, count(*) FROM translations t JOIN words w ON w.id = t.word_id "
+                 "GROUP BY w.eng, t.rus")
+SQL_DELTA_PAIRS = ("SELECT w.eng, d.rus, count(*) FROM lexicon_delta d JOIN words w ON w.id = d.word_id "
+                   "WHERE d.id > ? AND d.id <= ? GROUP BY w.eng, d.rus")
+SQL_TRIM_DELTA = "DELETE FROM lexicon_delta WHERE id <= ?"
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+# --- Записи ---
+def read_header(path):
+    # (last_delta, full_at, count, index_offset) или None, если файла нет или он не наш
+    try:
+        with open(path, "rb") as f:
+            data = f.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, *fields = HEADER.unpack(data)
+    return tuple(fields) if magic == MAGIC else None
+
+
+def _encode(key, counts):
+    if len(counts) == 1:
+        (term, count), = counts.items()
+        return key + f"\t{term}\t{count}".encode()
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return key + "".join(f"\t{term}\t{count}" for term, count in ranked).encode()
+
+
+def _decode(entry):
+    parts = entry.decode().split("\t")
+    return {parts[i]: int(parts[i + 1]) for i in range(1, len(parts), 2)}
+
+
+def _pairs_delta(rows):
+    # {ключ: {перевод: частота}} в обе стороны; одинаковые после normalize пары складываются
+    delta = {}
+    seen = {}
+    for eng, rus, count in rows:
+        eng = seen.get(eng) or seen.setdefault(eng, normalize(eng or ""))
+        rus = normalize(rus or "")
+        if not eng or not rus or "\t" in eng or "\t" in rus:
+            continue
+        for key, term in ((b"e" + eng.encode(), rus), (b"r" + rus.encode(), eng)):
+            counts = delta.get(key)
+            if counts is None:
+                delta[key] = {term: count}
+            else:
+                counts[term] = counts.get(term, 0) + count
+    return sorted(delta.items())
+
+
+# --- Поиск ---
+class Lexicon:
+    # Файл отображён в память целиком; reload() переоткрывает его, если сборка положила новый
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.stats = Counter()
+        self._mm = None
+        self._offsets = None
+        self._sparse = []
+        self._stamp = None
+
+    def reload(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return False
+        header = read_header(self.path)
+        if header is None:
+            return False
+        _, _, count, index_offset = header
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.close()
+        self._mm = mm
+        self._offsets = memoryview(mm)[index_offset:index_offset + (count + 1) * 4].cast("I")
+        self.count = count
+        self._sparse = [self._key(i) for i in range(0, count, SPARSE_STEP)]
+        self._stamp = stamp
+        return True
+
+    def close(self):
+        if self._mm is not None:
+            self._offsets.release()
+            self._mm.close()
+            self._mm = self._offsets = None
+            self._sparse = []
+            self.count = 0
+            self._stamp = None
+
+    def _bounds(self, i):
+        return HEADER.size + self._offsets[i], HEADER.size + self._offsets[i + 1]
+
+    def _key(self, i):
+        start, end = self._bounds(i)
+        return self._mm[start:self._mm.find(b"\t", start, end)]
+
+    def _lower_bound(self, key, lo=0):
+        # Номер первой записи с ключом >= key (не меньше lo)
+        block = bisect_left(self._sparse, key)
+        hi = min(block * SPARSE_STEP, self.count)
+        if block:
+            lo = max(lo, (block - 1) * SPARSE_STEP + 1)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, key):
+        i = self._lower_bound(key)
+        return i if i < self.count and self._key(i) == key else None
+
+    def lookup(self, text, src, limit=SUGGESTIONS):
+        # Самые частые переводы [(перевод, частота)]; пустой список — промах
+        found = []
+        if self._mm is not None:
+            i = self._find(PREFIXES[src] + normalize(text).encode())
+            if i is not None:
+                start, end = self._bounds(i)
+                # Переводы в записи уже по убыванию частоты
+                found = [(term, count) for term, count in _decode(self._mm[start:end]).items()
+                         if count >= MIN_COUNT][:limit]
+        self.stats["hits" if found else "misses"] += 1
+        return found
+
+
+# --- Сборка ---
+def _write(path, header_fields, fill):
+    # Пишет во временный файл и подменяет прежний: читатели видят либо старый файл, либо новый
+    tmp = path + ".tmp"
+    offsets = array("I", [0])
+    with open(tmp, "wb") as f:
+        f.write(bytes(HEADER.size))
+        fill(f, offsets)
+        index_offset = f.tell()
+        offsets.tofile(f)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, *header_fields, len(offsets) - 1, index_offset))
+    os.replace(tmp, path)
+
+
+def _write_all(delta):
+    def fill(f, offsets):
+        size = 0
+        for key, counts in delta:
+            size += f.write(_encode(key, counts))
+            offsets.append(size)
+    return fill
+
+
+def _write_merged(old, delta):
+    def fill(f, offsets):
+        size = 0
+        pos = 0
+
+        def copy(until):
+            # Записи pos..until-1 прежнего файла одним куском, смещения сдвигаются
+            nonlocal size
+            start, end = old._offsets[pos], old._offsets[until]
+            f.write(old._mm[HEADER.size + start:HEADER.size + end])
+            shift = size - start
+            offsets.extend(offset + shift for offset in old._offsets[pos + 1:until + 1])
+            size += end - start
+
+        for key, counts in delta:
+            i = old._lower_bound(key, pos)
+            copy(i)
+            pos = i
+            if i < old.count and old._key(i) == key:
+                start, end = old._bounds(i)
+                for term, count in _decode(old._mm[start:end]).items():
+                    counts[term] = counts.get(term, 0) + count
+                pos = i + 1
+            size += f.write(_encode(key, counts))
+            offsets.append(size)
+        copy(old.count)
+    return fill
+
+
+def update_lexicon(conn, path, now=None, full_every=FULL_REBUILD_SECONDS):
+    # Возвращает id, до которого lexicon_delta можно очистить (trim_delta),
+    # или None, если новых пар не было
+    now = time.time() if now is None else now
+    header = read_header(path)
+    full = header is None or now - header[1] >= full_every
+    # Снимок одной транзакцией: граница lexicon_delta и пары до неё согласованы
+    conn.execute("BEGIN")
+    try:
+        last = conn.execute(SQL_LAST_DELTA).fetchone()[0]
+        if full:
+            rows = conn.execute(SQL_ALL_PAIRS).fetchall()
+        elif last > header[0]:
+            rows = conn.execute(SQL_DELTA_PAIRS, (header[0], last)).fetchall()
+        else:
+            return None
+    finally:
+        conn.execute("COMMIT")
+    delta = _pairs_delta(rows)
+    if full:
+        _write(path, (last, now), _write_all(delta))
+        return last
+    old = Lexicon(path)
+    old.reload()
+    try:
+        _write(path, (last, header[1]), _write_merged(old, delta))
+    finally:
+        old.close()
+    return last
+
+
+def trim_delta(conn, last_delta):
+    return conn.execute(SQL_TRIM_DELTA, (last_delta,)).rowcount
+
+
+async def build_lexicon(db_path, path):
+    # Сборка в отдельном процессе; результат — как у update_lexicon
+    process = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), db_path, path,
+                                                   stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        out, err = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode:
+        lines = err.decode(errors="replace").strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"код выхода {process.returncode}")
+    out = out.strip()
+    return int(out) if out else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Собирает офлайн-словарь переводов из words.db")
+    parser.add_argument("db")
+    parser.add_argument("lexicon")
+    parser.add_argument("--full", action="store_true", help="пересобрать целиком, а не дописать новые пары")
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA query_only=ON")
+        last = update_lexicon(conn, args.lexicon, full_every=0 if args.full else FULL_REBUILD_SECONDS)
+    finally:
+        conn.close()
+    print("" if last is None else last)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import CallbackQuery, Message
+from aiohttp import web
+
+slow_log = logging.getLogger("pick_me_bot.slow")
+# Порог медленного запроса/обработчика в секундах; None — лог выключен
+slow_threshold = None
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def set_slow_threshold(ms):
+    global slow_threshold
+    slow_threshold = ms / 1000 if ms else None
+
+
+def check_slow(kind, name, seconds):
+    if slow_threshold is not None and seconds >= slow_threshold:
+        slow_log.warning("slow %s %s: %.1f ms", kind, name, seconds * 1000)
+
+
+# --- Метрики в формате Prometheus ---
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [f"{self.name}{_labels(self.labels, key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    # Значение либо выставляется через set(), либо вычисляется при каждом чтении
+    # функцией fn, которая возвращает число или словарь {значения меток: число}
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY, fn=None):
+        super().__init__(name, help, labels, registry)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.fn is not None:
+            values = self.fn()
+            values = values if isinstance(values, dict) else {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_labels(self.labels, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY, buckets=BUCKETS):
+        super().__init__(name, help, labels, registry)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][i] += 1
+            counts[1] += 1
+            counts[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for key, (buckets, count, total) in self._values.items():
+                for bound, value in zip(self.buckets, buckets):
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', bound)])} {value}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+        return lines
+
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Время обработчика по маршруту", ["route"])
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Исключения в обработчиках", ["route"])
+DB_CALL_SECONDS = Histogram("bot_db_call_seconds", "Вызов репозитория с ожиданием в пуле", ["call", "mode"])
+SQL_SECONDS = Histogram("bot_sql_statement_seconds", "Выполнение SQL-выражения", ["statement"])
+TRANSLATOR_SECONDS = Histogram("bot_translator_seconds", "Вызов бэкенда перевода", ["backend", "outcome"])
+BOT_API_SECONDS = Histogram("bot_api_request_seconds", "Запрос к Bot API", ["method", "outcome"])
+
+
+# --- Хуки ---
+def route_of(event, raw_state=None):
+    if isinstance(event, CallbackQuery):
+        data = event.data or ""
+        if ":" in data:
+            return data.split(":")[0] + ":"
+        # var1, var2... — один маршрут
+        return "var*" if data.startswith("var") else data
+    if isinstance(event, Message):
+        if event.text and event.text.startswith("/"):
+            return event.text.split()[0].split("@")[0]
+        return raw_state or "message"
+    return type(event).__name__
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        route = route_of(event, data.get("raw_state"))
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(route=route)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            HANDLER_SECONDS.observe(elapsed, route=route)
+            check_slow("handler", route, elapsed)
+
+
+class RequestTimingMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await make_request(bot, method)
+            outcome = "ok"
+            return result
+        finally:
+            BOT_API_SECONDS.observe(time.perf_counter() - start, method=name, outcome=outcome)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    return " ".join(sql.split())[:80]
+
+
+class TimedConnection(sqlite3.Connection):
+    # Соединение, которое замеряет каждое выражение (подключается через factory=)
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._observe(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            self._observe(sql, time.perf_counter() - start)
+
+    @staticmethod
+    def _observe(sql, elapsed):
+        label = statement_label(sql)
+        SQL_SECONDS.observe(elapsed, statement=label)
+        check_slow("sql", label, elapsed)
+
+
+# --- HTTP ---
+async def _metrics_handler(request):
+    return web.Response(text=request.app["registry"].render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_server(host="127.0.0.1", port=9100, registry=REGISTRY):
+    app = web.Application()
+    app["registry"] = registry
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,310 @@
+import sqlite3
+
+from leaderboard import GLOBAL, SIZE_BUCKETS
+
+
+# --- Миграции ---
+# Номер версии хранится в PRAGMA user_version. Миграция N переводит базу
+# с версии N-1 на N; уже применённые миграции повторно не запускаются.
+def _baseline(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS dictionaries (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER,
+                        name TEXT)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS words (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        dict_id INTEGER,
+                        eng TEXT,
+                        rus TEXT)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS ratings (
+                        user_id INTEGER,
+                        dict_id INTEGER,
+                        last_score INTEGER,
+                        best_score INTEGER,
+                        total_words INTEGER,
+                        PRIMARY KEY (user_id, dict_id))""")
+
+
+def _indexes_and_translations(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_dictionaries_user_name ON dictionaries (user_id, name, id)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS translations (
+                        word_id INTEGER NOT NULL,
+                        rus TEXT NOT NULL,
+                        PRIMARY KEY (word_id, rus)) WITHOUT ROWID""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_words_delete_translations AFTER DELETE ON words
+                    BEGIN
+                        DELETE FROM translations WHERE word_id = old.id;
+                    END""")
+
+    # Переносим строки "a;b;c" из words.rus в translations. Дубликаты (dict_id, eng)
+    # склеиваются в самую раннюю запись, иначе не получится уникальный индекс.
+    canonical = {}
+    duplicates = []
+
+    def pairs():
+        for word_id, dict_id, eng, rus in conn.execute("SELECT id, dict_id, eng, rus FROM words ORDER BY id"):
+            target = canonical.setdefault((dict_id, eng), word_id)
+            if target != word_id:
+                duplicates.append((word_id,))
+            for r in split_translations(rus or ""):
+                yield target, r
+
+    conn.executemany("INSERT OR IGNORE INTO translations (word_id, rus) VALUES (?, ?)", pairs())
+    conn.executemany("DELETE FROM words WHERE id = ?", duplicates)
+    # Колонка rus остаётся для совместимости со старыми копиями бота, но больше не ведётся
+    conn.execute("UPDATE words SET rus = NULL")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_words_dict_eng ON words (dict_id, eng)")
+
+
+def _translation_cache(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS translation_cache (
+                        text TEXT NOT NULL,
+                        src TEXT NOT NULL,
+                        dest TEXT NOT NULL,
+                        result TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        PRIMARY KEY (text, src, dest)) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_translation_cache_created ON translation_cache (created_at)")
+
+
+def _sessions(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS fsm_storage (
+                        key TEXT PRIMARY KEY,
+                        state TEXT,
+                        data TEXT NOT NULL,
+                        updated_at REAL NOT NULL) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated ON fsm_storage (updated_at)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS training_sessions (
+                        user_id INTEGER PRIMARY KEY,
+                        dict_id INTEGER NOT NULL,
+                        word_ids TEXT NOT NULL,
+                        idx INTEGER NOT NULL,
+                        correct INTEGER NOT NULL,
+                        mistakes TEXT NOT NULL,
+                        updated_at REAL NOT NULL)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_training_sessions_updated ON training_sessions (updated_at)")
+
+
+def _media_files(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS media_files (
+                        path TEXT PRIMARY KEY,
+                        mtime INTEGER NOT NULL,
+                        file_id TEXT NOT NULL) WITHOUT ROWID""")
+
+
+def _words_order_index(conn):
+    # Постраничный просмотр в порядке добавления: WHERE dict_id = ? AND id > ? ORDER BY id
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_words_dict_id ON words (dict_id, id)")
+
+
+def _review_schedule(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS review_state (
+                        user_id INTEGER NOT NULL,
+                        word_id INTEGER NOT NULL,
+                        dict_id INTEGER NOT NULL,
+                        ease REAL NOT NULL,
+                        interval_days REAL NOT NULL,
+                        repetitions INTEGER NOT NULL,
+                        due_at REAL NOT NULL,
+                        PRIMARY KEY (user_id, word_id)) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_review_state_due ON review_state (user_id, dict_id, due_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_review_state_word ON review_state (word_id)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS review_progress (
+                        user_id INTEGER NOT NULL,
+                        dict_id INTEGER NOT NULL,
+                        last_new_id INTEGER NOT NULL,
+                        PRIMARY KEY (user_id, dict_id)) WITHOUT ROWID""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_words_delete_reviews AFTER DELETE ON words
+                    BEGIN
+                        DELETE FROM review_state WHERE word_id = old.id;
+                    END""")
+
+
+def _leaderboards(conn):
+    conn.execute("ALTER TABLE users ADD COLUMN name TEXT")
+    conn.execute("""CREATE TABLE IF NOT EXISTS leaderboard_scores (
+                        board TEXT NOT NULL,
+                        user_id INTEGER NOT NULL,
+                        score INTEGER NOT NULL,
+                        updated_at REAL NOT NULL,
+                        PRIMARY KEY (board, user_id)) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_leaderboard_top "
+                 "ON leaderboard_scores (board, score DESC, updated_at)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS leaderboard_histogram (
+                        board TEXT NOT NULL,
+                        score INTEGER NOT NULL,
+                        users INTEGER NOT NULL,
+                        PRIMARY KEY (board, score)) WITHOUT ROWID""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS leaderboard_boards (
+                        board TEXT PRIMARY KEY,
+                        users INTEGER NOT NULL) WITHOUT ROWID""")
+    # Доска копит верные ответы всех законченных тренировок, а ratings помнит только лучшую
+    # и последнюю. Если они различаются, это две разные тренировки, иначе — минимум одна:
+    # начинаем с этой нижней оценки той же величины, что потом прибавляет record_session.
+    bucket = " ".join(f"WHEN words < {limit} THEN {i}" for i, limit in enumerate(SIZE_BUCKETS))
+    conn.execute(f"""WITH seed AS (
+                         SELECT user_id,
+                                coalesce(best_score, 0)
+                                + CASE WHEN last_score < best_score THEN last_score ELSE 0 END AS points,
+                                (SELECT count(*) FROM words WHERE dict_id = r.dict_id) AS words
+                         FROM ratings r)
+                     INSERT INTO leaderboard_scores (board, user_id, score, updated_at)
+                     SELECT board, user_id, sum(points), 0 FROM (
+                         SELECT '{GLOBAL}' AS board, user_id, points FROM seed
+                         UNION ALL
+                         SELECT 'size:' || CASE {bucket} ELSE {len(SIZE_BUCKETS)} END, user_id, points FROM seed)
+                     GROUP BY board, user_id HAVING sum(points) > 0""")
+    conn.execute("""INSERT INTO leaderboard_histogram (board, score, users)
+                    SELECT board, score, count(*) FROM leaderboard_scores GROUP BY board, score""")
+    conn.execute("""INSERT INTO leaderboard_boards (board, users)
+                    SELECT board, count(*) FROM leaderboard_scores GROUP BY board""")
+
+
+def _word_search(conn):
+    # Строка индекса — английское слово или один его перевод: так добавление перевода — это
+    # вставка в индекс, а не переиндексация всей строки слова. owner и word — токены "u<user_id>"
+    # и "w<word_id>": первый ограничивает поиск словарями пользователя, по второму удаляются
+    # строки слова. unicode61 убирает диакритику у латиницы, ё заменяется на е отдельно.
+    conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS word_search USING fts5 (
+                        owner, word, eng, rus,
+                        tokenize = 'unicode61 remove_diacritics 2',
+                        prefix = '2 3')""")
+    fold = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_words_insert_search AFTER INSERT ON words
+                    BEGIN
+                        INSERT INTO word_search (owner, word, eng)
+                        SELECT 'u' || user_id, 'w' || new.id, new.eng FROM dictionaries WHERE id = new.dict_id;
+                    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_translations_insert_search AFTER INSERT ON translations
+                     BEGIN
+                         INSERT INTO word_search (owner, word, rus)
+                         SELECT 'u' || d.user_id, 'w' || new.word_id, {fold.format("new.rus")}
+                         FROM words w JOIN dictionaries d ON d.id = w.dict_id WHERE w.id = new.word_id;
+                     END""")
+    # Переводы удаляются только вместе со словом (trg_words_delete_translations)
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_words_delete_search AFTER DELETE ON words
+                    BEGIN
+                        DELETE FROM word_search WHERE rowid IN (
+                            SELECT rowid FROM word_search WHERE word_search MATCH 'word : w' || old.id);
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_words_update_search AFTER UPDATE OF eng ON words
+                    BEGIN
+                        UPDATE word_search SET eng = new.eng
+                        WHERE rowid IN (SELECT rowid FROM word_search WHERE word_search MATCH 'word : w' || new.id)
+                          AND eng IS NOT NULL;
+                    END""")
+    conn.execute("""INSERT INTO word_search (owner, word, eng)
+                    SELECT 'u' || d.user_id, 'w' || w.id, w.eng FROM words w JOIN dictionaries d ON d.id = w.dict_id""")
+    conn.execute(f"""INSERT INTO word_search (owner, word, rus)
+                     SELECT 'u' || d.user_id, 'w' || t.word_id, {fold.format("t.rus")} FROM translations t
+                     JOIN words w ON w.id = t.word_id JOIN dictionaries d ON d.id = w.dict_id""")
+
+
+def _lexicon_delta(conn):
+    # Новые переводы для офлайн-словаря (lexicon.py): сборка забирает их по id и удаляет.
+    # AUTOINCREMENT — чтобы id не начинались заново, когда таблица опустеет
+    conn.execute("""CREATE TABLE IF NOT EXISTS lexicon_delta (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        word_id INTEGER NOT NULL,
+                        rus TEXT NOT NULL)""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_translations_insert_lexicon AFTER INSERT ON translations
+                    BEGIN
+                        INSERT INTO lexicon_delta (word_id, rus) VALUES (new.word_id, new.rus);
+                    END""")
+
+
+def _broadcasts(conn):
+    # Рассылки и их прогресс (broadcast.py); key — у ежедневных напоминаний, по одному на день
+    conn.execute("""CREATE TABLE IF NOT EXISTS broadcasts (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        key TEXT UNIQUE,
+                        kind TEXT NOT NULL,
+                        text TEXT,
+                        admin_id INTEGER,
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL,
+                        last_user_id INTEGER NOT NULL DEFAULT 0,
+                        sent INTEGER NOT NULL DEFAULT 0,
+                        failed INTEGER NOT NULL DEFAULT 0,
+                        removed INTEGER NOT NULL DEFAULT 0,
+                        seconds REAL NOT NULL DEFAULT 0)""")
+
+
+def _attempts(conn):
+    # Журнал ответов и сводки по нему (attempts.py): сводки обновляет тот же сброс буфера
+    conn.execute("""CREATE TABLE IF NOT EXISTS attempts (
+                        id INTEGER PRIMARY KEY,
+                        user_id INTEGER NOT NULL,
+                        dict_id INTEGER NOT NULL,
+                        word_id INTEGER NOT NULL,
+                        quality INTEGER NOT NULL,
+                        answered_at REAL NOT NULL)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS word_stats (
+                        user_id INTEGER NOT NULL,
+                        word_id INTEGER NOT NULL,
+                        attempts INTEGER NOT NULL,
+                        errors INTEGER NOT NULL,
+                        last_at REAL NOT NULL,
+                        PRIMARY KEY (user_id, word_id)) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_word_stats_word ON word_stats (word_id)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS daily_stats (
+                        user_id INTEGER NOT NULL,
+                        day TEXT NOT NULL,
+                        attempts INTEGER NOT NULL,
+                        errors INTEGER NOT NULL,
+                        PRIMARY KEY (user_id, day)) WITHOUT ROWID""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_words_delete_word_stats AFTER DELETE ON words
+                    BEGIN
+                        DELETE FROM word_stats WHERE word_id = old.id;
+                    END""")
+
+
+MIGRATIONS = [
+    _baseline,
+    _indexes_and_translations,
+    _translation_cache,
+    _sessions,
+    _media_files,
+    _words_order_index,
+    _review_schedule,
+    _leaderboards,
+    _word_search,
+    _lexicon_delta,
+    _broadcasts,
+    _attempts,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def split_translations(rus):
+    return [r.strip() for r in rus.split(";") if r.strip()]
+
+
+def migrate(path, target=SCHEMA_VERSION):
+    # Возвращает версию схемы после миграции
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        # Тёплая база — одно чтение заголовка, без блокировок и проверок схемы
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= target:
+            return version
+        # WAL сохраняется в файле базы: читатели не ждут писателя
+        conn.execute("PRAGMA journal_mode=WAL")
+        while version < target:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Версию перечитываем под блокировкой записи: другой процесс мог уже мигрировать
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < target:
+                    MIGRATIONS[version](conn)
+                    version += 1
+                    conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return version
+    finally:
+        conn.close()
@@ -0,0 +1,301 @@
+# Единая очередь исходящих сообщений. Все send*/edit* запросы бота проходят через
+# middleware сессии: общий лимит на бота и token bucket на каждый чат, повтор после
+# TelegramRetryAfter, интерактивные ответы раньше массовых рассылок. Запросы в один чат
+# уходят строго по очереди. Тексты, отправленные внутри merged() и скопившиеся в очереди
+# одного чата, склеиваются в одно сообщение, если у них одинаковые параметры и нет клавиатур.
+# Склеенные отправители получают один и тот же Message, поэтому склеивать можно только
+# сообщения, которые потом никто не правит.
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from aiogram.client.default import Default
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendChatAction, SendMessage
+
+from metrics import Counter, Histogram
+from render import MESSAGE_LIMIT, text_length
+
+log = logging.getLogger("pick_me_bot.outbound")
+
+INTERACTIVE, BULK = 0, 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+MERGE_SEPARATOR = "\n\n"
+QUEUED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+_priority = contextvars.ContextVar("outbound_priority", default=INTERACTIVE)
+_merge = contextvars.ContextVar("outbound_merge", default=False)
+
+SEND_SECONDS = Histogram("bot_outbound_send_seconds", "Отправка с ожиданием в очереди", ["priority"])
+RETRIES = Counter("bot_outbound_retries_total", "Повторы после TelegramRetryAfter")
+MERGED = Counter("bot_outbound_merged_total", "Сообщения, склеенные с предыдущими")
+
+
+@contextmanager
+def bulk():
+    # Всё, что отправлено внутри блока, уступает интерактивным ответам
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def merged():
+    # Отправленное внутри блока можно склеить с соседними сообщениями того же чата
+    token = _merge.set(True)
+    try:
+        yield
+    finally:
+        _merge.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def delay(self, now):
+        # Через сколько секунд будет доступен токен
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, now, seconds):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = min(self.tokens, 0)
+
+
+class _Job:
+    __slots__ = ("make_request", "bot", "method", "future", "priority", "merge", "seq", "enqueued", "attempts")
+
+    def __init__(self, make_request, bot, method, priority, merge, seq, now):
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.future = asyncio.get_running_loop().create_future()
+        self.priority = priority
+        self.merge = merge
+        self.seq = seq
+        self.enqueued = now
+        self.attempts = 0
+
+
+class _Chat:
+    __slots__ = ("bucket", "jobs", "busy", "touched")
+
+    def __init__(self, bucket, now):
+        self.bucket = bucket
+        self.jobs = deque()
+        self.busy = False
+        self.touched = now
+
+
+def _resolve(future, result=None, exception=None):
+    # Отправитель мог уже перестать ждать (отмена обработчика)
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+def _same(a, b):
+    if isinstance(a, Default) or isinstance(b, Default):
+        return isinstance(a, Default) and isinstance(b, Default) and a.name == b.name
+    return a == b
+
+
+def _mergeable(first, second):
+    if type(first) is not SendMessage or type(second) is not SendMessage:
+        return False
+    # Сообщения с клавиатурой потом правят по нажатию кнопки — их не склеиваем
+    if first.reply_markup is not None or second.reply_markup is not None or first.entities or second.entities:
+        return False
+    return all(_same(getattr(first, name), getattr(second, name))
+               for name in type(first).model_fields if name != "text")
+
+
+class OutboundQueue(BaseRequestMiddleware):
+    def __init__(self, rate=30.0, chat_rate=1.0, chat_burst=3, max_retries=5, merge=True, max_idle=60.0):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.merge = merge
+        self.max_idle = max_idle
+        self._global = TokenBucket(rate, rate, time.monotonic())
+        self._chats = {}
+        self._ready = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._sending = set()
+        self.depth = {INTERACTIVE: 0, BULK: 0}
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        name = type(method).__name__
+        if chat_id is None or isinstance(method, SendChatAction) or not name.startswith(QUEUED_PREFIXES):
+            return await make_request(bot, method)
+        now = time.monotonic()
+        job = _Job(make_request, bot, method, _priority.get(), _merge.get(), next(self._seq), now)
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(TokenBucket(self.chat_rate, self.chat_burst, now), now)
+        try:
+            if (not chat.jobs and not chat.busy and not self._ready
+                    and self._global.delay(now) <= 0 and chat.bucket.delay(now) <= 0):
+                # Очередь пуста и лимиты не мешают — отправляем сразу, без перехода в фоновую задачу
+                self._global.take()
+                chat.bucket.take()
+                chat.busy = True
+                await self._send(chat_id, chat, [job])
+            else:
+                chat.jobs.append(job)
+                self.depth[job.priority] += 1
+                if len(chat.jobs) == 1 and not chat.busy:
+                    self._schedule(chat_id, chat)
+                self._ensure_running()
+            return await job.future
+        finally:
+            SEND_SECONDS.observe(time.monotonic() - now, priority=PRIORITY_NAMES[job.priority])
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _schedule(self, chat_id, chat):
+        head = chat.jobs[0]
+        heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+
+    def _pick(self, now):
+        # Самый приоритетный чат, у которого есть токен; остальные возвращаются в кучу
+        postponed = []
+        picked, wait = None, None
+        while self._ready:
+            entry = heapq.heappop(self._ready)
+            chat = self._chats[entry[2]]
+            delay = chat.bucket.delay(now)
+            if delay <= 0:
+                picked = entry[2]
+                break
+            postponed.append(entry)
+            wait = delay if wait is None else min(wait, delay)
+        for entry in postponed:
+            heapq.heappush(self._ready, entry)
+        return picked, wait
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            chat_id, wait = self._pick(now)
+            if chat_id is None:
+                self._wakeup.clear()
+                self._prune(now)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            delay = self._global.delay(now)
+            if delay > 0:
+                self._schedule(chat_id, self._chats[chat_id])
+                await asyncio.sleep(delay)
+                continue
+            self._global.take()
+            chat = self._chats[chat_id]
+            chat.bucket.take()
+            chat.busy = True
+            jobs = self._take_jobs(chat)
+            task = asyncio.create_task(self._send(chat_id, chat, jobs))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    def _take_jobs(self, chat):
+        jobs = [chat.jobs.popleft()]
+        if self.merge:
+            length = text_length(jobs[0].method.text) if type(jobs[0].method) is SendMessage else 0
+            while (chat.jobs and jobs[-1].merge and chat.jobs[0].merge
+                   and _mergeable(jobs[-1].method, chat.jobs[0].method)):
+                length += text_length(MERGE_SEPARATOR + chat.jobs[0].method.text)
+                if length > MESSAGE_LIMIT:
+                    break
+                jobs.append(chat.jobs.popleft())
+        for job in jobs:
+            self.depth[job.priority] -= 1
+        return jobs
+
+    async def _send(self, chat_id, chat, jobs):
+        method = jobs[0].method
+        if len(jobs) > 1:
+            method = method.model_copy(update={
+                "text": MERGE_SEPARATOR.join(job.method.text for job in jobs)})
+            MERGED.inc(len(jobs) - 1)
+        try:
+            result = await jobs[0].make_request(jobs[0].bot, method)
+        except TelegramRetryAfter as e:
+            jobs[0].attempts += 1
+            if jobs[0].attempts > self.max_retries:
+                for job in jobs:
+                    _resolve(job.future, exception=e)
+            else:
+                RETRIES.inc()
+                log.warning("flood control in chat %s, retry in %s s", chat_id, e.retry_after)
+                # 429 относится ко всему боту: паузу получают и чат, и общий лимит
+                now = time.monotonic()
+                chat.bucket.block(now, e.retry_after)
+                self._global.block(now, e.retry_after)
+                # Склеенные сообщения возвращаются в очередь по отдельности
+                for job in reversed(jobs):
+                    chat.jobs.appendleft(job)
+                    self.depth[job.priority] += 1
+        except Exception as e:
+            for job in jobs:
+                _resolve(job.future, exception=e)
+        else:
+            for job in jobs:
+                _resolve(job.future, result)
+        finally:
+            chat.busy = False
+            chat.touched = time.monotonic()
+            if chat.jobs:
+                self._schedule(chat_id, chat)
+                self._ensure_running()
+
+    def _prune(self, now):
+        # Забываем чаты, в которые давно ничего не отправляли
+        if len(self._chats) < 1000:
+            return
+        idle = [chat_id for chat_id, chat in self._chats.items()
+                if not chat.jobs and not chat.busy and now - chat.touched > self.max_idle]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def pending(self):
+        return sum(self.depth.values()) + len(self._sending)
+
+    async def close(self):
+        # Дожидаемся отправки всего, что уже в очереди
+        while self.pending():
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
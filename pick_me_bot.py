@@ -1,20 +1,42 @@
 import asyncio
-import sqlite3
+import html
+import os
 import random
-from aiogram import Bot, Dispatcher, F
+import tempfile
+import time
+from io import BytesIO
+from aiogram import Bot, Dispatcher, F, Router
 from aiogram.enums import ParseMode
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.types import (Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile,
+                           InlineQuery, InlineQueryResultArticle, InputTextMessageContent)
 from aiogram.client.bot import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
-from aiogram.filters import Command
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.filters import Command, CommandObject
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-import os
-from googletrans import Translator
-
-API_TOKEN = "BOT_API_TOKEN"
-
+from aiogram.exceptions import TelegramBadRequest
+from attempts import AttemptLog, hardest_words, recent_stats
+from broadcast import Broadcaster, describe, recent_broadcasts
+from bulk import ImportFileError, export_words, import_file, import_pairs
+from catalog import TestCatalog
+from config import load_config
+from dictionaries import DictionaryCache, dict_menu_keyboard
+from grading import EXACT, MISSING, TYPO, compile_translations
+from leaderboard import GLOBAL, SIZE_BUCKETS, purge_weeks, standings, week_board
+from lexicon import Lexicon, build_lexicon, trim_delta
+from metrics import Gauge, HandlerTimingMiddleware, RequestTimingMiddleware, set_slow_threshold, start_server
+from render import MessageBuffer, truncate
+from srs import QUALITY_CORRECT, QUALITY_TYPO, QUALITY_WRONG, next_words, record_answer
+from migrations import migrate, split_translations
+from outbound import PRIORITY_NAMES, OutboundQueue
+from repository import Database
+from search import search_words
+from storage import SQLiteStorage, TrainingSessionStore
+from supervisor import run_supervisor
+from translation import GoogleBackend, TranslationService, split_phrases, translate_batch
+from webhook import run_webhook
 
 # --- FSM ---
 class DictFSM(StatesGroup):
@@ -28,65 +50,223 @@ class DeleteWordFSM(StatesGroup):
     waiting_for_rus_word = State()
 
 
-class TestFSM(StatesGroup):
-    waiting_for_answer = State()
-
-
-class TranslateFSM(StatesGroup):
-    waiting_for_dict_name = State()
-    waiting_for_word_eng = State()
-    waiting_for_word_rus = State()
+class ImportFSM(StatesGroup):
+    waiting_for_file = State()
 
 
-# --- Init ---
-dp = Dispatcher(storage=MemoryStorage())
-bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+class WordsFSM(StatesGroup):
+    waiting_for_prefix = State()
 
 
-# --- DB ---
-def init_db():
-    with sqlite3.connect("words.db") as conn:
-        c = conn.cursor()
-        c.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY)")
-        c.execute("""CREATE TABLE IF NOT EXISTS dictionaries (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER,
-                        name TEXT)""")
-        c.execute("""CREATE TABLE IF NOT EXISTS words (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        dict_id INTEGER,
-                        eng TEXT,
-                        rus TEXT)""")
-        c.execute("""CREATE TABLE IF NOT EXISTS ratings (
-                        user_id INTEGER,
-                        dict_id INTEGER,
-                        last_score INTEGER,
-                        best_score INTEGER,
-                        total_words INTEGER,
-                        PRIMARY KEY (user_id, dict_id))""")
-        conn.commit()
+class SearchFSM(StatesGroup):
+    waiting_for_query = State()
 
 
-init_db()
-
-
-# --- DB helpers ---
-def get_dicts(user_id):
-    with sqlite3.connect("words.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT name FROM dictionaries WHERE user_id = ?", (user_id,))
-        return [row[0] for row in c.fetchall()]
+class TestFSM(StatesGroup):
+    waiting_for_answer = State()
 
 
-def get_dict_id(user_id, dict_name):
-    with sqlite3.connect("words.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT id FROM dictionaries WHERE user_id = ? AND name = ?", (user_id, dict_name))
-        row = c.fetchone()
-        return row[0] if row else None
+class TranslateFSM(StatesGroup):
+    waiting_for_dict_name = State()
+    waiting_for_word_eng = State()
+    waiting_for_word_rus = State()
 
 
-translator = Translator()
+# --- Приложение ---
+# Обработчики регистрируются на router при импорте модуля, а всё, что открывает файлы,
+# соединения и потоки (база, бот, переводчик), создаёт create_app(): импорт модуля
+# ничего не запускает. Компоненты — глобальные имена модуля, их и используют обработчики.
+router = Router()
+config = db = bot = dp = storage = sessions = translation = lexicon = catalog = dict_cache = outbound = None
+broadcaster = attempts = None
+
+
+def create_app(app_config=None):
+    global config, db, bot, dp, storage, sessions, translation, lexicon, catalog, dict_cache, outbound, broadcaster
+    global attempts
+    config = app_config or load_config()
+    set_slow_threshold(config.slow_log_ms)
+    migrate(config.db_path)
+    lock = config.db_path + ".lock" if config.worker_index is not None else None
+    db = Database(config.db_path, write_lock=lock)
+    storage = SQLiteStorage(db)
+    sessions = TrainingSessionStore(db)
+    attempts = AttemptLog(db)
+    translation = TranslationService(GoogleBackend(), db)
+    lexicon = Lexicon(config.lexicon_path or config.db_path + ".lexicon")
+    catalog = TestCatalog(db=db)
+    dict_cache = DictionaryCache(db)
+    outbound = OutboundQueue(config.outbound_rate, config.outbound_chat_rate, config.outbound_chat_burst)
+    api = AiohttpSession(api=TelegramAPIServer.from_base(config.api_url)) if config.api_url else None
+    bot = Bot(token=config.token, default=DefaultBotProperties(parse_mode=ParseMode.HTML), session=api)
+    setup_session(bot.session)
+    broadcaster = Broadcaster(db, bot, config.reminder_time, config.broadcast_concurrency)
+    dp = Dispatcher(storage=storage)
+    dp.include_router(router)
+    return dp
+
+
+def setup_session(session):
+    # Очередь снаружи, замер внутри: в метрики Bot API попадает каждая попытка отправки
+    session.middleware(outbound)
+    session.middleware(RequestTimingMiddleware())
+
+
+# --- Metrics ---
+router.message.middleware(HandlerTimingMiddleware())
+router.callback_query.middleware(HandlerTimingMiddleware())
+router.inline_query.middleware(HandlerTimingMiddleware())
+Gauge("bot_fsm_sessions", "Состояния FSM в памяти", fn=lambda: len(storage.records))
+Gauge("bot_training_sessions", "Тренировки в памяти", fn=lambda: len(sessions))
+Gauge("bot_attempts_buffered", "Ответы в буфере журнала", fn=lambda: len(attempts))
+Gauge("bot_translation_cache", "Счётчики кэша переводов", ["result"],
+      fn=lambda: {(name,): value for name, value in translation.stats.items()})
+Gauge("bot_lexicon", "Офлайн-словарь: записи и поиски", ["result"],
+      fn=lambda: {("entries",): lexicon.count, **{(name,): value for name, value in lexicon.stats.items()}})
+Gauge("bot_dict_cache", "Кэш метаданных словарей", ["result"],
+      fn=lambda: {(name,): value for name, value in dict_cache.stats.items()})
+Gauge("bot_outbound_queue_depth", "Сообщения в очереди на отправку", ["priority"],
+      fn=lambda: {(PRIORITY_NAMES[p],): depth for p, depth in outbound.depth.items()})
+metrics_runner = None
+maintenance = None
+lexicon_job = None
+broadcast_job = None
+
+
+MAINTENANCE_INTERVAL = 24 * 3600
+
+
+async def run_maintenance():
+    # Чистка устаревших записей раз в сутки; первая — сразу, не задерживая первый апдейт
+    while True:
+        try:
+            await translation.purge_expired()
+            await db.write(purge_weeks)
+            before = time.time() - config.state_ttl_days * 24 * 3600
+            await storage.purge(before)
+            await sessions.purge(before)
+        except Exception as e:
+            print(f"Maintenance: {e}")
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+
+def is_main_worker():
+    return config.worker_index in (None, 0)
+
+
+async def run_lexicon():
+    # Собирает офлайн-словарь один процесс (единственный или воркер 0) — в дочернем процессе,
+    # остальные только подхватывают новый файл
+    builder = is_main_worker()
+    while True:
+        if builder:
+            try:
+                last = await build_lexicon(config.db_path, lexicon.path)
+                if last is not None:
+                    await db.write(trim_delta, last)
+            except Exception as e:
+                print(f"Lexicon: не удалось пересобрать {lexicon.path}: {e}")
+        lexicon.reload()
+        await asyncio.sleep(config.lexicon_interval)
+
+
+@router.startup()
+async def on_startup():
+    global metrics_runner, maintenance, lexicon_job, broadcast_job
+    await storage.start()
+    await sessions.start()
+    await attempts.start()
+    await asyncio.to_thread(catalog.scan)
+    await catalog.load_file_ids()
+    lexicon.reload()
+    maintenance = asyncio.create_task(run_maintenance())
+    lexicon_job = asyncio.create_task(run_lexicon())
+    # Рассылки ведёт один процесс; /broadcast в других воркерах только создаёт строку в базе
+    if is_main_worker():
+        broadcast_job = asyncio.create_task(broadcaster.run())
+    if config.metrics_port and metrics_runner is None:
+        metrics_runner = await start_server(config.metrics_host, config.metrics_port)
+
+
+@router.shutdown()
+async def on_shutdown():
+    global metrics_runner
+    # Фоновые задачи останавливаем и дожидаемся, не глядя на их ошибки: ниже сбрасываются
+    # буферы, а lexicon.close() нельзя звать, пока задача словаря ещё читает файл.
+    # Прогресс рассылки сохранён после последней порции, при следующем запуске она продолжится.
+    jobs = [job for job in (maintenance, lexicon_job, broadcast_job) if job is not None]
+    for job in jobs:
+        job.cancel()
+    await asyncio.gather(*jobs, return_exceptions=True)
+    lexicon.close()
+    await outbound.close()
+    await sessions.close()
+    await attempts.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+        metrics_runner = None
+
+
+# --- Клавиатуры ---
+def back_keyboard(target):
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔙 Назад", callback_data=target)]])
+
+
+MAIN_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📚 Словари", callback_data="menu_dicts")],
+    [InlineKeyboardButton(text="🧪 Тесты", callback_data="menu_tests")],
+    [InlineKeyboardButton(text="🌍 Перевести", callback_data="menu_translate")],
+    [InlineKeyboardButton(text="🔎 Поиск по словарям", callback_data="search")],
+    [InlineKeyboardButton(text="🔥 Трудные слова", callback_data="hardest")],
+    [InlineKeyboardButton(text="🏆 Таблица лидеров", callback_data="top:all")]
+])
+DICTS_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📚 Мои словари", callback_data="list_dicts")],
+    [InlineKeyboardButton(text="➕ Создать словарь", callback_data="create_dict")],
+    [InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")]
+])
+TESTS_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🎧 Listening tests", callback_data="test_listen")],
+    [InlineKeyboardButton(text="✍️ Writing tests", callback_data="test_writ")],
+    [InlineKeyboardButton(text="📖 Reading tests", callback_data="test_read")],
+    [InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")]
+])
+TRANSLATE_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🇷🇺 ➡ 🇬🇧 На английский", callback_data="to_en")],
+    [InlineKeyboardButton(text="🇬🇧 ➡ 🇷🇺 На русский", callback_data="to_ru")],
+    [InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")]
+])
+BACK_TO_MAIN_KB = back_keyboard("main_menu")
+BACK_TO_DICTS_KB = back_keyboard("menu_dicts")
+BACK_TO_LIST_KB = back_keyboard("list_dicts")
+BACK_TO_TESTS_KB = back_keyboard("menu_tests")
+
+
+# --- Словари пользователя ---
+async def callback_dict(callback: CallbackQuery):
+    # Словарь из callback_data "<action>:<id>"; чужие и удалённые id дают None,
+    # как и старые кнопки с названием словаря вместо id
+    dict_id = callback.data.split(":")[1]
+    if not dict_id.isdigit():
+        return None
+    return (await dict_cache.get(callback.from_user.id)).get(int(dict_id))
+
+
+async def state_dict(message: Message, data):
+    info = (await dict_cache.get(message.from_user.id)).get(data.get("dict_id"))
+    if info is None:
+        await message.answer("❌ Словарь не найден, зайчик.", reply_markup=BACK_TO_LIST_KB)
+    return info
+
+
+async def lookup_translation(text, src, dest):
+    # Сначала офлайн-словарь из слов всех пользователей, googletrans — только при промахе.
+    # (перевод, [(вариант, в скольких словарях)] из офлайн-словаря или [])
+    popular = lexicon.lookup(text, src)
+    if not popular:
+        return await translation.translate(text, src, dest), popular
+    variants = [term for term, _ in popular]
+    return (variants[0] if dest == 'en' else "; ".join(variants)), popular
 
 
 async def translate_and_add(message: Message, direction: str, state: FSMContext):
@@ -98,314 +278,492 @@ async def translate_and_add(message: Message, direction: str, state: FSMContext)
     src, dest = ('ru', 'en') if direction == 'to_en' else ('en', 'ru')
 
     try:
-        result = translator.translate(text, src=src, dest=dest)
-        await state.update_data(eng=result.text.lower() if dest == 'en' else text.lower(),
-                                rus=text.lower() if dest == 'en' else result.text.lower())
-        dicts = get_dicts(message.from_user.id)
+        result, popular = await lookup_translation(text, src, dest)
+        await state.update_data(eng=result.lower() if dest == 'en' else text.lower(),
+                                rus=text.lower() if dest == 'en' else result.lower())
+        dicts = await dict_cache.get(message.from_user.id)
         if not dicts:
             await message.answer("❤️У тебя ещё нет словарей, создай сначала словарь!❤️")
             await state.clear()
             return
 
-        builder = InlineKeyboardBuilder()
-
-        for name in dicts:
-            builder.button(text=name, callback_data=f"save_trans:{name}")
-        await message.answer(f"❤️Перевод: <b>{text}</b> ➡ <b>{result.text}</b>\n\nВыбери словарь для добавления:",
-                             reply_markup=builder.as_markup())
+        note = ""
+        if popular:
+            note = "\n📖 Так переводят в словарях: " + ", ".join(f"{html.escape(term)} ({count})"
+                                                                 for term, count in popular)
+        await message.answer(f"❤️Перевод: <b>{html.escape(text)}</b> ➡ <b>{html.escape(result)}</b>{note}\n\n"
+                             f"Выбери словарь для добавления:", reply_markup=dicts.keyboard("save_trans"))
     except Exception as e:
         await message.answer(f"❌ Ошибка перевода: {e}")
         await state.clear()
 
 
 # --- Главный экран ---
-@dp.message(Command("start"))
+@router.message(Command("start"))
 async def start(message: Message):
-    with sqlite3.connect("words.db") as conn:
-        conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (message.from_user.id,))
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📚 Словари", callback_data="menu_dicts")],
-        [InlineKeyboardButton(text="🧪 Тесты", callback_data="menu_tests")],
-        [InlineKeyboardButton(text="🌍 Перевести", callback_data="menu_translate")]
-    ])
-    await message.answer("❤️Привет пупсик!❤️ 🐾 Выбери, что хочешь делать, пупсик:", reply_markup=kb)
+    await db.add_user(message.from_user.id)
+    await message.answer("❤️Привет пупсик!❤️ 🐾 Выбери, что хочешь делать, пупсик:", reply_markup=MAIN_MENU_KB)
 
 
 # --- Словари ---
-@dp.callback_query(F.data == "menu_dicts")
+@router.callback_query(F.data == "menu_dicts")
 async def menu_dicts(callback: CallbackQuery):
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📚 Мои словари", callback_data="list_dicts")],
-        [InlineKeyboardButton(text="➕ Создать словарь", callback_data="create_dict")],
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")]
-    ])
-    await callback.message.answer("❤️Зай, в разделе 'Словари' тебе доступны такие штуки:", reply_markup=kb)
+    await callback.message.answer("❤️Зай, в разделе 'Словари' тебе доступны такие штуки:",
+                                  reply_markup=DICTS_MENU_KB)
 
 
-@dp.callback_query(F.data == "main_menu")
+@router.callback_query(F.data == "main_menu")
 async def back_to_main(callback: CallbackQuery):
     await start(callback.message)
 
 
-@dp.callback_query(F.data == "create_dict")
+@router.callback_query(F.data == "create_dict")
 async def create_dict(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer("❤️Пупсик, напиши название нового словаря, пожалуйста~❤️")
     await state.set_state(DictFSM.waiting_for_dict_name)
 
 
-@dp.message(DictFSM.waiting_for_dict_name)
+@router.message(DictFSM.waiting_for_dict_name)
 async def save_dict(message: Message, state: FSMContext):
     name = message.text.strip()
-    with sqlite3.connect("words.db") as conn:
-        conn.execute("INSERT INTO dictionaries (user_id, name) VALUES (?, ?)", (message.from_user.id, name))
-    await message.answer(f"❤️Заюшь, словарь <b>{name}</b> создан! 🐾")
+    await db.create_dict(message.from_user.id, name)
+    dict_cache.invalidate(message.from_user.id)
+    await message.answer(f"❤️Заюшь, словарь <b>{html.escape(name)}</b> создан! 🐾")
     await state.clear()
 
 
-@dp.callback_query(F.data == "list_dicts")
+@router.callback_query(F.data == "list_dicts")
 async def list_dicts(callback: CallbackQuery):
-    dicts = get_dicts(callback.from_user.id)
+    dicts = await dict_cache.get(callback.from_user.id)
     if not dicts:
         await callback.message.answer("❤️Ой, у тебя пока нет словарей, зайчонок.❤️")
         return
-    builder = InlineKeyboardBuilder()
-    for name in dicts:
-        builder.button(text=name, callback_data=f"dict:{name}")
-    builder.button(text="🔙 Назад", callback_data="menu_dicts")
-    await callback.message.answer("❤️Зай, выбери словарик, пожалуйста:", reply_markup=builder.as_markup())
+    await callback.message.answer("❤️Зай, выбери словарик, пожалуйста:",
+                                  reply_markup=dicts.keyboard("dict", back="menu_dicts"))
 
 
-@dp.callback_query(F.data.startswith("dict:"))
+@router.callback_query(F.data.startswith("dict:"))
 async def dict_menu(callback: CallbackQuery):
-    name = callback.data.split(":")[1]
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="➕ Добавить слово", callback_data=f"add:{name}")],
-        [InlineKeyboardButton(text="🧠 Тренировка", callback_data=f"train:{name}")],
-        [InlineKeyboardButton(text="📄 Показать слова", callback_data=f"show:{name}")],
-        [InlineKeyboardButton(text="📈 Рейтинг", callback_data=f"rate:{name}")],
-        [InlineKeyboardButton(text="🗑️ Удалить перевод", callback_data=f"del:{name}")],
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="list_dicts")]
-    ])
-    await callback.message.answer(f"❤️Заюшь, ты в словаре <b>{name}</b>: что хочешь сделать?❤️", reply_markup=kb)
-
-
-@dp.callback_query(F.data.startswith("add:"))
+    info = await callback_dict(callback)
+    if info is None:
+        return
+    await callback.message.answer(f"❤️Заюшь, ты в словаре <b>{html.escape(info.name)}</b>: что хочешь сделать?❤️",
+                                  reply_markup=dict_menu_keyboard(info.id))
+
+
+@router.callback_query(F.data.startswith("add:"))
 async def add_word(callback: CallbackQuery, state: FSMContext):
-    dict_name = callback.data.split(":")[1]
-    await state.update_data(dict=dict_name)
+    info = await callback_dict(callback)
+    if info is None:
+        return
+    await state.update_data(dict_id=info.id)
     await callback.message.answer("❤️Пупсик, напиши, пожалуйста, английское слово для добавления!❤️")
     await state.set_state(DictFSM.waiting_for_word_eng)
 
 
-@dp.callback_query(F.data.startswith("show:"))
+@router.callback_query(F.data.startswith("show:"))
 async def show_words(callback: CallbackQuery):
-    dict_name = callback.data.split(":")[1]
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="menu_dicts")]
-    ])
-    dict_id = get_dict_id(callback.from_user.id, dict_name)
-    with sqlite3.connect("words.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT eng, rus FROM words WHERE dict_id = ?", (dict_id,))
-        words = c.fetchall()
+    info = await callback_dict(callback)
+    if info is None:
+        return
+    page = await render_words_page(info.id, info.name, "i", None, 0, "") if info.words else None
+    if page is None:
+        await callback.message.answer("❤️Слов в этом словаре пока нет, зайчик!❤️")
+        return
+    text, kb = page
+    await callback.message.answer(text, reply_markup=kb)
+
+
+# --- Постраничный просмотр слов ---
+WORDS_PAGE_SIZE = 30
+CALLBACK_DATA_LIMIT = 64
+
+
+def page_callback(dict_id, order, direction, cursor, prefix, cursor_eng=""):
+    # "page:<dict>:<order>:<direction>:<id>:<длина префикса>:<текст>". Текст — eng слова-курсора
+    # в алфавитном порядке (он начинается с префикса фильтра), иначе сам префикс
+    text = cursor_eng if order == "a" and direction in ("n", "p") else prefix
+    data = f"page:{dict_id}:{order}:{direction}:{cursor}:"
+    # Текст обрезается, чтобы уложиться в лимит callback_data
+    while len(f"{data}{min(len(prefix), len(text))}:{text}".encode()) > CALLBACK_DATA_LIMIT:
+        text = text[:-1]
+    return f"{data}{min(len(prefix), len(text))}:{text}"
+
+
+def parse_page_callback(data):
+    _, dict_id, order, direction, cursor, rest = data.split(":", 5)
+    prefix_length, _, text = rest.partition(":")
+    if not prefix_length.isdigit():
+        # Кнопки старого формата: "page:<dict>:<order>:<direction>:<id>:<префикс>"
+        prefix_length, text = len(rest), rest
+    return (int(dict_id), order, None if direction == "f" else direction, int(cursor),
+            text[:int(prefix_length)], text)
+
+
+async def render_words_page(dict_id, dict_name, order, direction, cursor, prefix, cursor_eng=""):
+    # Читаем на одно слово больше страницы, чтобы узнать, есть ли что-то дальше.
+    # Страница заканчивается раньше, если следующее слово не влезает в сообщение.
+    rows = await db.get_words_page(dict_id, order, direction, cursor, prefix, WORDS_PAGE_SIZE + 1, cursor_eng)
+    if not rows:
+        return None
+    title = f"<b>📄 Слова из словаря {html.escape(dict_name)}</b>"
+    if prefix:
+        title += f" <b>на «{html.escape(prefix)}»</b>"
+    buffer = MessageBuffer(title + ":\n\n")
+    shown = []
+    for word_id, eng, rus in rows[:WORDS_PAGE_SIZE]:
+        line = truncate(f"🔹 <b>{html.escape(eng)}</b> — {html.escape(rus or '')}\n", 1024)
+        if not buffer.add(line):
+            break
+        shown.append((word_id, eng, line))
+    more = len(shown) < len(rows)
+    if direction == "p":
+        shown.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = direction is not None, more
 
-    if not words:
+    text = buffer.parts[0] + "".join(line for _, _, line in shown)
+    builder = InlineKeyboardBuilder()
+    nav = 0
+    if has_prev:
+        first_id, first_eng, _ = shown[0]
+        builder.button(text="⬅️", callback_data=page_callback(dict_id, order, "p", first_id, prefix, first_eng))
+        nav += 1
+    if has_next:
+        last_id, last_eng, _ = shown[-1]
+        builder.button(text="➡️", callback_data=page_callback(dict_id, order, "n", last_id, prefix, last_eng))
+        nav += 1
+    if order == "a":
+        builder.button(text="🕒 По порядку добавления", callback_data=page_callback(dict_id, "i", "f", 0, ""))
+    else:
+        builder.button(text="🔤 По алфавиту", callback_data=page_callback(dict_id, "a", "f", 0, ""))
+    builder.button(text="🔎 Фильтр", callback_data=f"wfilter:{dict_id}")
+    builder.button(text="🔙 Назад", callback_data="menu_dicts")
+    builder.adjust(*([nav] if nav else []), 1)
+    return text, builder.as_markup()
+
+
+@router.callback_query(F.data.startswith("page:"))
+async def words_page(callback: CallbackQuery):
+    dict_id, order, direction, cursor, prefix, cursor_eng = parse_page_callback(callback.data)
+    info = (await dict_cache.get(callback.from_user.id)).get(dict_id)
+    if info is None:
+        return
+    page = await render_words_page(info.id, info.name, order, direction, cursor, prefix, cursor_eng)
+    if page is None:
         await callback.message.answer("❤️Слов в этом словаре пока нет, зайчик!❤️")
         return
+    text, kb = page
+    try:
+        await callback.message.edit_text(text, reply_markup=kb)
+    except TelegramBadRequest as e:
+        # Старое сообщение уже нельзя редактировать — присылаем страницу заново
+        if "message is not modified" not in str(e):
+            await callback.message.answer(text, reply_markup=kb)
+
 
-    message_text = f"<b>📄 Слова из словаря {dict_name}:</b>\n\n"
-    for eng, rus in words:
-        message_text += f"🔹 <b>{eng}</b> — {rus}\n"
+@router.callback_query(F.data.startswith("wfilter:"))
+async def ask_words_filter(callback: CallbackQuery, state: FSMContext):
+    await state.update_data(filter_dict_id=int(callback.data.split(":")[1]))
+    await state.set_state(WordsFSM.waiting_for_prefix)
+    await callback.message.answer("❤️Зай, напиши начало английского слова, покажу подходящие:")
 
-    await callback.message.answer(message_text, reply_markup=kb)
+
+@router.message(WordsFSM.waiting_for_prefix)
+async def show_filtered_words(message: Message, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    info = (await dict_cache.get(message.from_user.id)).get(data.get("filter_dict_id"))
+    if info is None:
+        return
+    prefix = message.text.strip().lower()
+    page = await render_words_page(info.id, info.name, "a", None, 0, prefix)
+    if page is None:
+        await message.answer("❤️Ничего не нашлось, зайчик!❤️")
+        return
+    text, kb = page
+    await message.answer(text, reply_markup=kb)
 
 
-@dp.message(DictFSM.waiting_for_word_eng)
+# --- Поиск по всем словарям ---
+SEARCH_RESULTS = 20
+INLINE_RESULTS = 50  # больше Telegram в ответ на inline-запрос не примет
+
+
+def search_line(eng, dict_name, rus):
+    return (f"🔹 <b>{html.escape(eng)}</b> — {html.escape((rus or '').replace(';', ', '))} "
+            f"<i>({html.escape(dict_name)})</i>\n")
+
+
+async def answer_search(message: Message, user_id, text):
+    rows = await db.read(search_words, user_id, text, SEARCH_RESULTS)
+    if not rows:
+        await message.answer("❤️Ничего не нашлось, зайчик!❤️", reply_markup=BACK_TO_MAIN_KB)
+        return
+    buffer = MessageBuffer(f"<b>🔎 Нашлось по запросу «{html.escape(text)}»:</b>\n\n")
+    for _, eng, dict_name, rus in rows:
+        if not buffer.add(truncate(search_line(eng, dict_name, rus), 1024)):
+            break
+    await message.answer(buffer.parts[0], reply_markup=BACK_TO_MAIN_KB)
+
+
+@router.message(Command("search"))
+async def search_command(message: Message, command: CommandObject, state: FSMContext):
+    if command.args:
+        await answer_search(message, message.from_user.id, command.args)
+        return
+    await state.set_state(SearchFSM.waiting_for_query)
+    await message.answer("❤️Зай, что ищем? Можно начало слова, по-английски или по-русски:")
+
+
+@router.callback_query(F.data == "search")
+async def ask_search_query(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(SearchFSM.waiting_for_query)
+    await callback.message.answer("❤️Зай, что ищем? Можно начало слова, по-английски или по-русски:")
+
+
+@router.message(SearchFSM.waiting_for_query)
+async def search_query(message: Message, state: FSMContext):
+    await state.clear()
+    await answer_search(message, message.from_user.id, message.text or "")
+
+
+@router.inline_query()
+async def inline_search(query: InlineQuery):
+    rows = await db.read(search_words, query.from_user.id, query.query, INLINE_RESULTS)
+    results = [
+        InlineQueryResultArticle(
+            id=str(word_id), title=f"{eng} — {(rus or '').replace(';', ', ')}", description=f"📚 {dict_name}",
+            input_message_content=InputTextMessageContent(
+                message_text=f"<b>{html.escape(eng)}</b> — {html.escape((rus or '').replace(';', ', '))}"))
+        for word_id, eng, dict_name, rus in rows]
+    # Результаты у каждого свои — кэш Telegram не должен отдавать их другим
+    await query.answer(results, cache_time=5, is_personal=True)
+
+
+# --- Импорт и экспорт ---
+MAX_IMPORT_SIZE = 20 * 1024 * 1024  # больше Bot API скачать не даст
+
+
+@router.callback_query(F.data.startswith("import:"))
+async def ask_import_file(callback: CallbackQuery, state: FSMContext):
+    info = await callback_dict(callback)
+    if info is None:
+        return
+    await state.update_data(dict_id=info.id)
+    await state.set_state(ImportFSM.waiting_for_file)
+    await callback.message.answer("❤️Пупсик, пришли файл .csv или .txt: в каждой строке английское слово и перевод "
+                                  "через табуляцию, запятую или точку с запятой. Несколько переводов — через «;».❤️")
+
+
+@router.message(ImportFSM.waiting_for_file, F.document)
+async def import_dictionary(message: Message, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    if message.document.file_size and message.document.file_size > MAX_IMPORT_SIZE:
+        await message.answer("❌ Файл слишком большой, зайчик: максимум 20 МБ.", reply_markup=BACK_TO_LIST_KB)
+        return
+    info = await state_dict(message, data)
+    if info is None:
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "import.csv")
+        await message.bot.download(message.document, destination=path)
+        try:
+            rows, words, translations = await db.write(import_file, message.from_user.id, info.id, path)
+        except ImportFileError as e:
+            await message.answer(f"❌ Не получилось прочитать файл, зайчик: {html.escape(str(e))}. Ничего не добавлено.",
+                                 reply_markup=BACK_TO_LIST_KB)
+            return
+    dict_cache.invalidate(message.from_user.id)
+    await message.answer(f"❤️Заюшь, импорт готов! Строк: <b>{rows}</b>, новых слов: <b>{words}</b>, "
+                         f"новых переводов: <b>{translations}</b>. Рейтинг сброшен.❤️", reply_markup=BACK_TO_LIST_KB)
+
+
+@router.message(ImportFSM.waiting_for_file)
+async def import_expects_file(message: Message):
+    await message.answer("❤️Зай, пришли, пожалуйста, именно файл-документ.❤️")
+
+
+@router.callback_query(F.data.startswith("export:"))
+async def export_dictionary(callback: CallbackQuery):
+    info = await callback_dict(callback)
+    if info is None:
+        return
+    if not info.words:
+        await callback.message.answer("❤️Слов в этом словаре пока нет, зайчик!❤️")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "export.tsv")
+        count = await db.read(export_words, info.id, path)
+        if not count:
+            await callback.message.answer("❤️Слов в этом словаре пока нет, зайчик!❤️")
+            return
+        await callback.message.answer_document(FSInputFile(path, filename=f"{info.name}.tsv"),
+                                               caption=f"❤️Словарь <b>{html.escape(info.name)}</b>, слов: {count}❤️")
+
+
+@router.message(DictFSM.waiting_for_word_eng)
 async def input_translation(message: Message, state: FSMContext):
     await state.update_data(eng=message.text.strip())
     await message.answer("❤️Теперь пиши перевод этого слова, пупсик!❤️")
     await state.set_state(DictFSM.waiting_for_word_rus)
 
 
-@dp.message(DictFSM.waiting_for_word_rus)
+@router.message(DictFSM.waiting_for_word_rus)
 async def save_word(message: Message, state: FSMContext):
     data = await state.get_data()
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="list_dicts")]
-    ])
-    dict_id = get_dict_id(message.from_user.id, data["dict"])
+    info = await state_dict(message, data)
+    if info is None:
+        await state.clear()
+        return
     eng = data["eng"].strip().lower()
     new_rus = message.text.strip().lower()
 
-    with sqlite3.connect("words.db") as conn:
-        c = conn.cursor()
-        # Проверка, есть ли слово уже
-        c.execute("SELECT id, rus FROM words WHERE dict_id = ? AND eng = ?", (dict_id, eng))
-        row = c.fetchone()
-        if row:
-            word_id, existing_rus = row
-            existing_set = set(map(str.strip, existing_rus.split(";")))
-            new_set = set(map(str.strip, new_rus.split(";")))
-            combined = sorted(existing_set.union(new_set))
-            updated_rus = ";".join(combined)
-            c.execute("UPDATE words SET rus = ? WHERE id = ?", (updated_rus, word_id))
-        else:
-            c.execute("INSERT INTO words (dict_id, eng, rus) VALUES (?, ?, ?)", (dict_id, eng, new_rus))
-
-        c.execute("DELETE FROM ratings WHERE user_id = ? AND dict_id = ?", (message.from_user.id, dict_id))
+    # Слово добавляется или дополняется новыми переводами, рейтинг сбрасывается
+    await db.upsert_word(message.from_user.id, info.id, eng, new_rus)
+    dict_cache.invalidate(message.from_user.id)
 
     await message.answer(
-        f"❤️Заюшь, слово <b>{eng}</b> — <b>{new_rus}</b> добавлено или обновлено, пупсик! Рейтинг сброшен.❤️",
-        reply_markup=kb)
+        f"❤️Заюшь, слово <b>{html.escape(eng)}</b> — <b>{html.escape(new_rus)}</b> добавлено или обновлено, пупсик! Рейтинг сброшен.❤️",
+        reply_markup=BACK_TO_LIST_KB)
     await state.clear()
 
 
-@dp.callback_query(F.data.startswith("del:"))
+@router.callback_query(F.data.startswith("del:"))
 async def start_delete_word(callback: CallbackQuery, state: FSMContext):
-    dict_name = callback.data.split(":")[1]
-    await state.update_data(dict=dict_name)
+    info = await callback_dict(callback)
+    if info is None:
+        return
+    await state.update_data(dict_id=info.id)
     await state.set_state(DeleteWordFSM.waiting_for_eng_word)
     await callback.message.answer("❤️Зай, напиши английское слово, у которое хочешь удалить.")
 
 
-@dp.message(DeleteWordFSM.waiting_for_eng_word)
+@router.message(DeleteWordFSM.waiting_for_eng_word)
 async def delete_translation_fsm(message: Message, state: FSMContext):
     await state.update_data(eng=message.text.strip().lower())
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="menu_dicts")]
-    ])
     data = await state.get_data()
-    dict_name = data["dict"]
     eng = data["eng"]
-    dict_id = get_dict_id(message.from_user.id, dict_name)
-
-    with sqlite3.connect("words.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, rus FROM words WHERE dict_id = ? AND eng = ?", (dict_id, eng))
-        row = c.fetchone()
-
-        if not row:
-            await message.answer("❌ Слово не найдено в этом словаре.", reply_markup=kb)
-            await state.clear()
-            return
+    info = await state_dict(message, data)
+    if info is None:
+        await state.clear()
+        return
 
-        c = conn.cursor()
-        c.execute("DELETE FROM words WHERE dict_id = ? AND eng = ?", (dict_id, eng))
-        row = c.fetchone()
-    await message.answer("❤️Зай, слово удаленно.", reply_markup=kb)
+    if not await db.delete_word(info.id, eng):
+        await message.answer("❌ Слово не найдено в этом словаре.", reply_markup=BACK_TO_DICTS_KB)
+        await state.clear()
+        return
+    dict_cache.invalidate(message.from_user.id)
+    await message.answer("❤️Зай, слово удаленно.", reply_markup=BACK_TO_DICTS_KB)
 
     await state.clear()
 
 
 # --- Тесты ---
-@dp.callback_query(F.data == "menu_tests")
+@router.callback_query(F.data == "menu_tests")
 async def menu_tests(callback: CallbackQuery):
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🎧 Listening tests", callback_data="test_listen")],
-        [InlineKeyboardButton(text="✍️ Writing tests", callback_data="test_writ")],
-        [InlineKeyboardButton(text="📖 Reading tests", callback_data="test_read")],
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")]
-    ])
-    await callback.message.answer("❤️Пупсик, выбери, что хочешь потестить:", reply_markup=kb)
+    await callback.message.answer("❤️Пупсик, выбери, что хочешь потестить:", reply_markup=TESTS_MENU_KB)
 
 
-@dp.callback_query(F.data.in_(["test_listen", "test_writ", "test_read"]))
+@router.callback_query(F.data.in_(["test_listen", "test_writ", "test_read"]))
 async def variant_menu(callback: CallbackQuery, state: FSMContext):
     test_type = callback.data.replace("test_", "")  # listen, write, read
     await state.update_data(test_type=test_type + "ing")  # listening, writing, reading
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Вариант 1", callback_data="var1")],
-        [InlineKeyboardButton(text="Вариант 2", callback_data="var2")],
-        [InlineKeyboardButton(text="Вариант 3", callback_data="var3")],
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="menu_tests")],
-        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
-    ])
-    await callback.message.answer("❤️Зайчонок, выбери вариант теста, пожалуйста!❤️", reply_markup=kb)
+    builder = InlineKeyboardBuilder()
+    for name in await catalog.variants(test_type + "ing"):
+        builder.button(text=f"Вариант {name}", callback_data=f"var{name}")
+    builder.button(text="🔙 Назад", callback_data="menu_tests")
+    builder.button(text="🏠 Главное меню", callback_data="main_menu")
+    builder.adjust(1)
+    await callback.message.answer("❤️Зайчонок, выбери вариант теста, пожалуйста!❤️", reply_markup=builder.as_markup())
+
+
+async def send_test_audio(message: Message, test):
+    # Повторно отправляем уже загруженный файл по file_id, без выгрузки mp3
+    file_id = catalog.file_id(test.audio, test.audio_mtime)
+    if file_id:
+        try:
+            await message.answer_audio(audio=file_id)
+            return
+        except TelegramBadRequest:
+            pass
+    sent = await message.answer_audio(audio=FSInputFile(test.audio))
+    await catalog.remember_file_id(test.audio, test.audio_mtime, sent.audio.file_id)
 
 
-@dp.callback_query(F.data.in_(["var1", "var2", "var3"]))
+@router.callback_query(F.data.startswith("var"))
 async def start_test(callback: CallbackQuery, state: FSMContext):
-    variant = callback.data[-1]  # "1", "2" или "3"
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="menu_tests")]
-    ])
+    variant = callback.data[len("var"):]
     user_data = await state.get_data()
-    test_type = user_data.get("test_type")  # слушай / пиши / читай
+    test_type = user_data.get("test_type")  # listening, writing, reading
 
-    base_dir = test_type.lower()  # listening, writing, reading
-    question_path = os.path.join(base_dir, "questions", variant)
-    answer_path = os.path.join(base_dir, "answers", f"{variant}.txt")
+    test = await catalog.get(test_type, variant)
+    if test is None:
+        await callback.message.answer("❌ Не удалось найти файлы теста.", reply_markup=BACK_TO_TESTS_KB)
+        return
 
     # Сохраняем для дальнейшей проверки
-    await state.update_data(variant=variant, test_type=base_dir)
-
-    if base_dir == "listening":
-        # отправка аудио
-        audio_file = os.path.join(question_path, "audio.mp3")
-        questions_file = os.path.join(question_path, "questions.txt")
-        if not os.path.exists(audio_file) or not os.path.exists(questions_file):
-            await callback.message.answer("❌ Не удалось найти файлы теста.", reply_markup=kb)
-            return
-        audio = FSInputFile(audio_file)
-        await callback.message.answer_audio(audio=audio)
-        with open(questions_file, "r", encoding="utf-8") as f:
-            text = f.read()
-        await callback.message.answer(f"<b>Вопросы:</b>\n{text}")
+    await state.update_data(variant=variant, test_type=test_type)
 
-    else:
-        # Writing/Reading
-        question_file = os.path.join(base_dir, "questions", f"{variant}.txt")
-        if not os.path.exists(question_file):
-            await callback.message.answer("❌ Не удалось найти файлы теста.", reply_markup=kb)
-            return
-        with open(question_file, "r", encoding="utf-8") as f:
-            text = f.read()
-        await callback.message.answer(f"<b>Вопросы:</b>\n{text}")
+    if test.audio:
+        await send_test_audio(callback.message, test)
+    await callback.message.answer(f"<b>Вопросы:</b>\n{test.questions}")
 
     await callback.message.answer("📝 Напиши свой ответ сообщением.")
     await state.set_state(TestFSM.waiting_for_answer)
 
 
-@dp.message(TestFSM.waiting_for_answer)
+@router.message(TestFSM.waiting_for_answer)
 async def check_test_answer(message: Message, state: FSMContext):
     data = await state.get_data()
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="menu_tests")]
-    ])
-    variant = data["variant"]
-    base_dir = data["test_type"]
-    answer_file = os.path.join(base_dir, "answers", f"{variant}.txt")
-
-    if not os.path.exists(answer_file):
-        await message.answer("❌ Ответ не найден.", reply_markup=kb)
+    test = await catalog.get(data.get("test_type"), data.get("variant"))
+
+    if test is None or test.key is None:
+        await message.answer("❌ Ответ не найден.", reply_markup=BACK_TO_TESTS_KB)
         await state.clear()
         return
 
-    with open(answer_file, "r", encoding="utf-8") as f:
-        correct_answer = f.read().strip().lower()
-
-    user_answer = message.text.strip().lower()
-
-    if user_answer == correct_answer:
+    results = test.key.grade(message.text or "")
+    if not results:
+        # Ключ без единого пункта — сверять не с чем
+        await message.answer("❌ Ответ не найден.", reply_markup=BACK_TO_TESTS_KB)
+        await state.clear()
+        return
+    passed = sum(result.ok for result in results)
+    if passed == len(results):
         result = "✅ <b>Верно!</b> Молодец, пупсик!"
+    elif len(results) == 1:
+        result = f"❌ <b>Неверно.</b>\nОжидалось:\n{html.escape(test.answer)}"
     else:
-        result = f"❌ <b>Неверно.</b>\nОжидалось:\n{correct_answer}"
-
-    await message.answer(result, parse_mode="HTML", reply_markup=kb)
+        result = f"❌ <b>Неверно.</b> Правильно {passed} из {len(results)}"
+    # Разбор по пунктам, если их несколько или где-то опечатка
+    if len(results) > 1 or results[0].verdict == TYPO:
+        buffer = MessageBuffer(result + "\n\n")
+        for number, item in enumerate(results, 1):
+            if item.verdict == EXACT:
+                line = f"{number}. ✅ {html.escape(item.answer)}\n"
+            elif item.verdict == TYPO:
+                line = f"{number}. ✏️ {html.escape(item.answer)} → {html.escape(item.expected)}\n"
+            elif item.verdict == MISSING:
+                line = f"{number}. ❌ нет ответа → {html.escape(item.expected)}\n"
+            else:
+                line = f"{number}. ❌ {html.escape(item.answer)} → {html.escape(item.expected)}\n"
+            if not buffer.add(truncate(line, 512)):
+                break
+        result = buffer.text()
+
+    await message.answer(result, parse_mode="HTML", reply_markup=BACK_TO_TESTS_KB)
     await state.clear()
 
 
-@dp.callback_query(F.data == "menu_translate")
+@router.callback_query(F.data == "menu_translate")
 async def translate_menu(callback: CallbackQuery):
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🇷🇺 ➡ 🇬🇧 На английский", callback_data="to_en")],
-        [InlineKeyboardButton(text="🇬🇧 ➡ 🇷🇺 На русский", callback_data="to_ru")],
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")]
-    ])
-    await callback.message.answer("❤️Выбери направление перевода, пупсик:", reply_markup=kb)
+    await callback.message.answer("❤️Выбери направление перевода, пупсик:", reply_markup=TRANSLATE_MENU_KB)
 
 
-@dp.callback_query(F.data.in_(["to_en", "to_ru"]))
+@router.callback_query(F.data.in_(["to_en", "to_ru"]))
 async def ask_word_to_translate(callback: CallbackQuery, state: FSMContext):
     direction = callback.data
     await state.update_data(translate_direction=direction)
@@ -413,142 +771,409 @@ async def ask_word_to_translate(callback: CallbackQuery, state: FSMContext):
     await state.set_state(TranslateFSM.waiting_for_word_eng)  # Переиспользуем это состояние
 
 
-@dp.message(TranslateFSM.waiting_for_word_eng)
+@router.message(TranslateFSM.waiting_for_word_eng, F.document)
+async def handle_translation_document(message: Message, state: FSMContext):
+    data = await state.get_data()
+    if "translate_direction" not in data:
+        await message.answer("❤️Зай, напиши перевод текстом.❤️")
+        return
+    if message.document.file_size and message.document.file_size > MAX_BATCH_FILE_SIZE:
+        await message.answer("❌ Файл слишком большой, зайчик: для перевода — до 64 КБ текста.")
+        return
+    buffer = BytesIO()
+    await message.bot.download(message.document, destination=buffer)
+    text = buffer.getvalue().decode("utf-8-sig", errors="replace")
+    await translate_many(message, data["translate_direction"], state, text)
+
+
+@router.message(TranslateFSM.waiting_for_word_eng)
 async def handle_translation_input(message: Message, state: FSMContext):
     data = await state.get_data()
     if "translate_direction" in data:
-        await translate_and_add(message, data["translate_direction"], state)
+        if len(split_phrases(message.text or "")[0]) > 1:
+            await translate_many(message, data["translate_direction"], state, message.text)
+        else:
+            await translate_and_add(message, data["translate_direction"], state)
     else:
         await input_translation(message, state)  # стандартное поведение
 
 
-@dp.callback_query(F.data.startswith("save_trans:"))
+@router.callback_query(F.data.startswith("save_trans:"))
 async def save_translated_word(callback: CallbackQuery, state: FSMContext):
-    dict_name = callback.data.split(":")[1]
+    info = await callback_dict(callback)
     data = await state.get_data()
-    dict_id = get_dict_id(callback.from_user.id, dict_name)
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")]
-    ])
+    if info is None or "eng" not in data:
+        return
 
     eng = data["eng"]
     rus = data["rus"]
 
-    with sqlite3.connect("words.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, rus FROM words WHERE dict_id = ? AND eng = ?", (dict_id, eng))
-        row = c.fetchone()
-        if row:
-            word_id, existing_rus = row
-            existing_set = set(map(str.strip, existing_rus.split(";")))
-            new_set = set(map(str.strip, rus.split(";")))
-            combined = sorted(existing_set.union(new_set))
-            updated_rus = ";".join(combined)
-            c.execute("UPDATE words SET rus = ? WHERE id = ?", (updated_rus, word_id))
-        else:
-            c.execute("INSERT INTO words (dict_id, eng, rus) VALUES (?, ?, ?)", (dict_id, eng, rus))
-        c.execute("DELETE FROM ratings WHERE user_id = ? AND dict_id = ?", (callback.from_user.id, dict_id))
+    await db.upsert_word(callback.from_user.id, info.id, eng, rus)
+    dict_cache.invalidate(callback.from_user.id)
 
-    await callback.message.answer(f"❤️Слово <b>{eng}</b> — <b>{rus}</b> добавлено в словарь <b>{dict_name}</b>!",
-                                  reply_markup=kb)
+    await callback.message.answer(
+        f"❤️Слово <b>{html.escape(eng)}</b> — <b>{html.escape(rus)}</b> добавлено в словарь <b>{html.escape(info.name)}</b>!",
+        reply_markup=BACK_TO_MAIN_KB)
     await state.clear()
 
 
+# --- Пакетный перевод ---
+# Список слов или текст (сообщением или файлом) разбивается на слова и короткие фразы без
+# повторов, они переводятся одним заданием не больше BATCH_CONCURRENCY сразу, а сообщение
+# с прогрессом обновляется по ходу. Потом пользователь отмечает нужные переводы, и они
+# сохраняются в выбранный словарь одной транзакцией.
+BATCH_CONCURRENCY = 3
+MAX_BATCH_FILE_SIZE = 64 * 1024
+PROGRESS_INTERVAL = 1.0  # Telegram не любит частые правки одного сообщения
+BUTTON_LIMIT = 60
+
+
+async def translate_many(message: Message, direction: str, state: FSMContext, text: str):
+    phrases, found = split_phrases(text)
+    if not phrases:
+        await message.answer("❌ Не нашёл слов для перевода, зайчик.")
+        return
+    dicts = await dict_cache.get(message.from_user.id)
+    if not dicts:
+        await message.answer("❤️У тебя ещё нет словарей, создай сначала словарь!❤️")
+        await state.clear()
+        return
+
+    src, dest = ('ru', 'en') if direction == 'to_en' else ('en', 'ru')
+    progress = await message.answer(f"⏳ Перевожу: 0/{len(phrases)}")
+    last_update = time.monotonic()
+
+    async def translate_one(phrase):
+        return (await lookup_translation(phrase, src, dest))[0]
+
+    async def on_progress(done, total):
+        nonlocal last_update
+        if done < total and time.monotonic() - last_update >= PROGRESS_INTERVAL:
+            last_update = time.monotonic()
+            try:
+                await progress.edit_text(f"⏳ Перевожу: {done}/{total}")
+            except TelegramBadRequest:
+                pass
+
+    results = await translate_batch(phrases, translate_one, BATCH_CONCURRENCY, on_progress)
+    batch = [[result.lower(), phrase.lower()] if dest == 'en' else [phrase.lower(), result.lower()]
+             for phrase, result in zip(phrases, results) if result]
+    notes = []
+    if found > len(phrases):
+        notes.append(f"взяты первые {len(phrases)} из {found}")
+    if len(batch) < len(phrases):
+        notes.append(f"не удалось перевести: {len(phrases) - len(batch)}")
+    await state.update_data(batch=batch, selected=list(range(len(batch))),
+                            batch_note="; ".join(notes))
+    text, kb = render_batch(await state.get_data())
+    try:
+        await progress.edit_text(text, reply_markup=kb)
+    except TelegramBadRequest:
+        await message.answer(text, reply_markup=kb)
+
+
+def render_batch(data):
+    batch, selected = data.get("batch", []), set(data.get("selected", []))
+    header = f"❤️Переводы: <b>{len(batch)}</b>"
+    if data.get("batch_note"):
+        header += f" ({data['batch_note']})"
+    buffer = MessageBuffer(header + "\nОтметь, что сохранить, пупсик:\n\n")
+    for i, (eng, rus) in enumerate(batch):
+        if not buffer.add(f"{i + 1}. <b>{html.escape(eng)}</b> — {html.escape(rus)}\n"):
+            break
+    builder = InlineKeyboardBuilder()
+    for i, (eng, rus) in enumerate(batch):
+        builder.button(text=truncate(f"{'✅' if i in selected else '⬜'} {eng} — {rus}", BUTTON_LIMIT),
+                       callback_data=f"bsel:{i}")
+    builder.button(text="☑️ Все", callback_data="bsel:all")
+    builder.button(text="⬜ Ничего", callback_data="bsel:none")
+    builder.button(text="💾 Сохранить выбранные", callback_data="bsave")
+    builder.button(text="🔙 Назад", callback_data="main_menu")
+    builder.adjust(*[1] * len(batch), 2, 1, 1)
+    return buffer.text(), builder.as_markup()
+
+
+@router.callback_query(F.data.startswith("bsel:"))
+async def toggle_batch_item(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    if "batch" not in data:
+        return
+    choice = callback.data.split(":")[1]
+    selected = set(data["selected"])
+    if choice == "all":
+        selected = set(range(len(data["batch"])))
+    elif choice == "none":
+        selected = set()
+    elif choice.isdigit() and int(choice) < len(data["batch"]):
+        selected ^= {int(choice)}
+    await state.update_data(selected=sorted(selected))
+    text, kb = render_batch({**data, "selected": selected})
+    try:
+        await callback.message.edit_text(text, reply_markup=kb)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            await callback.message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(F.data == "bsave")
+async def ask_batch_dict(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    if "batch" not in data:
+        return
+    if not data["selected"]:
+        await callback.message.answer("❤️Зай, отметь хотя бы один перевод.❤️")
+        return
+    dicts = await dict_cache.get(callback.from_user.id)
+    await callback.message.answer(f"❤️Выбрано: <b>{len(data['selected'])}</b>. В какой словарь сохранить?",
+                                  reply_markup=dicts.keyboard("bsave"))
+
+
+@router.callback_query(F.data.startswith("bsave:"))
+async def save_batch(callback: CallbackQuery, state: FSMContext):
+    info = await callback_dict(callback)
+    data = await state.get_data()
+    if info is None or "batch" not in data:
+        return
+    pairs = [(eng, split_translations(rus)) for eng, rus in (data["batch"][i] for i in data["selected"])]
+    # Все выбранные слова — одна транзакция и по запросу на пачку, как при импорте файла
+    rows, words, translations = await db.write(import_pairs, callback.from_user.id, info.id, pairs)
+    dict_cache.invalidate(callback.from_user.id)
+    await callback.message.answer(
+        f"❤️В словарь <b>{html.escape(info.name)}</b> сохранено: <b>{rows}</b>, новых слов: <b>{words}</b>, "
+        f"новых переводов: <b>{translations}</b>.❤️", reply_markup=BACK_TO_MAIN_KB)
+    await state.clear()
+
+
+# --- Таблица лидеров ---
+TOP_SIZE = 10
+MEDALS = ("🥇", "🥈", "🥉")
+
+
+def size_title(bucket):
+    if bucket == 0:
+        return f"до {SIZE_BUCKETS[0]} слов"
+    low = SIZE_BUCKETS[bucket - 1]
+    if bucket == len(SIZE_BUCKETS):
+        return f"{low}+ слов"
+    return f"{low}–{SIZE_BUCKETS[bucket] - 1} слов"
+
+
+LEADERBOARD_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🌐 За всё время", callback_data="top:all"),
+     InlineKeyboardButton(text="📅 За неделю", callback_data="top:week")],
+    [InlineKeyboardButton(text=size_title(i), callback_data=f"top:size:{i}") for i in range(len(SIZE_BUCKETS) + 1)],
+    [InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")]
+])
+
+
+def leaderboard_board(kind):
+    # "all", "week" или "size:<i>" из callback_data; неделя — всегда текущая
+    if kind == "week":
+        return week_board(), "за неделю"
+    if kind.startswith("size:") and kind[5:].isdigit() and int(kind[5:]) <= len(SIZE_BUCKETS):
+        return kind, f"по словарям {size_title(int(kind[5:]))}"
+    return GLOBAL, "за всё время"
+
+
+async def render_leaderboard(user_id, kind):
+    board, title = leaderboard_board(kind)
+    top, score, rank, players = await db.read(standings, board, user_id, TOP_SIZE)
+    lines = [f"🏆 <b>Таблица лидеров {title}</b>\n"]
+    for place, (player_id, name, points) in enumerate(top, 1):
+        mark = MEDALS[place - 1] if place <= len(MEDALS) else f"{place}."
+        name = html.escape(name or "Пупсик")
+        if player_id == user_id:
+            name = f"<b>{name}</b>"
+        lines.append(f"{mark} {name} — {points}")
+    if not top:
+        lines.append("Пока никого нет — будь первым, зайчик!")
+    if score is None:
+        lines.append("\n❤️Закончи тренировку, чтобы попасть в таблицу!❤️")
+    else:
+        lines.append(f"\n❤️Ты на <b>{rank}</b> месте из {players}, очков: <b>{score}</b>")
+    return "\n".join(lines)
+
+
+@router.message(Command("top"))
+async def top_command(message: Message):
+    await message.answer(await render_leaderboard(message.from_user.id, "all"), reply_markup=LEADERBOARD_KB)
+
+
+@router.callback_query(F.data.startswith("top:"))
+async def show_leaderboard(callback: CallbackQuery):
+    text = await render_leaderboard(callback.from_user.id, callback.data[4:])
+    await callback.message.answer(text, reply_markup=LEADERBOARD_KB)
+
+
+# --- Трудные слова ---
+HARDEST_SIZE = 10
+STATS_DAYS = 7
+
+
+async def render_hardest(user_id):
+    words = await db.read(hardest_words, user_id, HARDEST_SIZE)
+    answered, errors = await db.read(recent_stats, user_id, STATS_DAYS)
+    if not words and not answered:
+        return "❤️Зай, статистика появится после первой тренировки!❤️"
+    lines = ["🔥 <b>Твои трудные слова</b>\n"]
+    for place, (eng, rus, word_errors, word_attempts) in enumerate(words, 1):
+        lines.append(f"{place}. <b>{html.escape(eng)}</b> — {html.escape(rus or '')}: "
+                     f"ошибок {word_errors} из {word_attempts} ({word_errors * 100 // word_attempts}%)")
+    if not words:
+        lines.append("Ошибок пока нет, умничка!")
+    if answered:
+        lines.append(f"\n📅 За {STATS_DAYS} дней: ответов <b>{answered}</b>, "
+                     f"верно <b>{(answered - errors) * 100 // answered}%</b>")
+    return "\n".join(lines)
+
+
+@router.message(Command("hardest"))
+async def hardest_command(message: Message):
+    await message.answer(await render_hardest(message.from_user.id), reply_markup=BACK_TO_MAIN_KB)
+
+
+@router.callback_query(F.data == "hardest")
+async def show_hardest(callback: CallbackQuery):
+    await callback.message.answer(await render_hardest(callback.from_user.id), reply_markup=BACK_TO_MAIN_KB)
+
+
+# --- Рассылки ---
+@router.message(Command("broadcast"))
+async def broadcast_command(message: Message, command: CommandObject):
+    # /broadcast <текст> — объявление всем пользователям, без текста — последние рассылки
+    if message.from_user.id not in config.admin_ids:
+        return
+    if not command.args:
+        rows = await db.read(recent_broadcasts, 5)
+        await message.answer("\n".join(describe(row) for row in rows) or "Рассылок ещё не было.")
+        return
+    broadcast_id = await broadcaster.announce(html.escape(command.args), message.from_user.id)
+    await message.answer(f"📣 Рассылка #{broadcast_id} поставлена в очередь, пришлю отчёт по завершении.")
+
+
 # --- Тренировка ---
-user_sessions = {}
+TRAIN_BATCH_SIZE = 20
+
 
+async def current_word(session):
+    # Слово могли удалить во время тренировки — такие просто пропускаем
+    while session["index"] < len(session["word_ids"]):
+        word = await db.get_word(session["word_ids"][session["index"]])
+        if word:
+            return word
+        session["word_ids"].pop(session["index"])
+    return None
 
-@dp.callback_query(F.data.startswith("train:"))
+
+@router.callback_query(F.data.startswith("train:"))
 async def train(callback: CallbackQuery):
-    name = callback.data.split(":")[1]
-    dict_id = get_dict_id(callback.from_user.id, name)
-    with sqlite3.connect("words.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT eng, rus FROM words WHERE dict_id = ?", (dict_id,))
-        words = c.fetchall()
-    if not words:
+    info = await callback_dict(callback)
+    if info is None:
+        return
+    if not info.words:
+        await callback.message.answer("❤️Ой, зайчонок, в словаре нет слов для тренировки!❤️")
+        return
+    dict_id = info.id
+    # Только слова, которые пора повторить по расписанию, и немного новых
+    word_ids = await db.write(next_words, callback.from_user.id, dict_id, TRAIN_BATCH_SIZE)
+    random.shuffle(word_ids)
+    session = {"word_ids": word_ids, "index": 0, "correct": 0, "mistakes": [], "dict_id": dict_id}
+    word = await current_word(session)
+    if word is None:
         await callback.message.answer("❤️Ой, зайчонок, в словаре нет слов для тренировки!❤️")
         return
-    random.shuffle(words)
-    user_sessions[callback.from_user.id] = {
-        "words": words, "index": 0, "correct": 0, "mistakes": [], "dict_id": dict_id
-    }
-    await callback.message.answer(f"❤️Как переводится: <b>{words[0][0]}</b>? Умничка!")
+    sessions.put(callback.from_user.id, session)
+    await callback.message.answer(f"❤️Как переводится: <b>{html.escape(word[0])}</b>? Умничка!")
 
 
-@dp.message()
+@router.message()
 async def answer_check(message: Message):
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="menu_dicts")]
-    ])
-    if message.from_user.id not in user_sessions:
+    session = await sessions.get(message.from_user.id)
+    if session is None:
         return
-    session = user_sessions[message.from_user.id]
-    eng, rus = session["words"][session["index"]]
+    word = await current_word(session)
+    if word is None:
+        sessions.delete(message.from_user.id)
+        return
+    eng, rus = word
     user_answer = message.text.strip().lower()
+    answers = compile_translations(rus)
 
     # Подсказка, если пользователь не может ответить
     if user_answer == "помощь":
-        correct_translation = " / ".join(rus.split(";"))
-        await message.answer(f"Подсказка: правильный ответ: {correct_translation}")
-        return
-    if message.from_user.id not in user_sessions:
+        await message.answer(f"Подсказка: правильный ответ: {html.escape(answers.display)}")
         return
-    session = user_sessions[message.from_user.id]
-    eng, rus = session["words"][session["index"]]
-    user_answer = message.text.strip().lower()
-    valid_answers = [r.strip() for r in rus.split(";")]
-    if user_answer in valid_answers:
+    word_id = session["word_ids"][session["index"]]
+    result = answers.grade(user_answer)
+    note = ""
+    if result.verdict == EXACT:
         session["correct"] += 1
+        quality = QUALITY_CORRECT
+    elif result.verdict == TYPO:
+        session["correct"] += 1
+        quality = QUALITY_TYPO
+        note = f"✏️ Почти! Правильно: <b>{html.escape(answers.display)}</b>\n"
     else:
-        session["mistakes"].append((eng, rus))
+        session["mistakes"].append(word_id)
+        quality = QUALITY_WRONG
+    await db.write(record_answer, message.from_user.id, session["dict_id"], word_id, quality)
+    attempts.add(message.from_user.id, session["dict_id"], word_id, quality)
     session["index"] += 1
-    if session["index"] < len(session["words"]):
-        next_word = session["words"][session["index"]][0]
-        await message.answer(f"❤️Как переводится: <b>{next_word}</b>? Зай, давай ещё!")
+    next_word = await current_word(session)
+    if next_word:
+        sessions.put(message.from_user.id, session)
+        await message.answer(f"{note}❤️Как переводится: <b>{html.escape(next_word[0])}</b>? Зай, давай ещё!")
     else:
-        total, correct = len(session["words"]), session["correct"]
+        total, correct = len(session["word_ids"]), session["correct"]
         dict_id = session["dict_id"]
-        with sqlite3.connect("words.db") as conn:
-            c = conn.cursor()
-            c.execute(
-                "INSERT OR IGNORE INTO ratings (user_id, dict_id, last_score, best_score, total_words) VALUES (?, ?, 0, 0, ?)",
-                (message.from_user.id, dict_id, total))
-            c.execute(
-                "UPDATE ratings SET last_score = ?, best_score = MAX(best_score, ?), total_words = ? WHERE user_id = ? AND dict_id = ?",
-                (correct, correct, total, message.from_user.id, dict_id))
-        response = f"✅ Правильно, зайчонок: <b>{correct}/{total}</b>\n"
+        info = (await dict_cache.get(message.from_user.id)).get(dict_id)
+        await db.finish_session(message.from_user.id, message.from_user.full_name, dict_id,
+                                info.words if info else 0, correct, total)
+        dict_cache.invalidate(message.from_user.id)
+        response = f"{note}✅ Правильно, зайчонок: <b>{correct}/{total}</b>\n"
         if session["mistakes"]:
-            response += "\n❌ Ошибки:\n" + "\n".join([f"{e} — {r}" for e, r in session["mistakes"]])
-        await message.answer(response, reply_markup=kb)
-        user_sessions.pop(message.from_user.id)
+            mistakes = await db.get_words_by_ids(session["mistakes"])
+            response += "\n❌ Ошибки:\n" + "\n".join([f"{e} — {r}" for e, r in mistakes])
+        await message.answer(response, reply_markup=BACK_TO_DICTS_KB)
+        sessions.delete(message.from_user.id)
 
 
 # --- Рейтинг ---
-@dp.callback_query(F.data.startswith("rate:"))
+@router.callback_query(F.data.startswith("rate:"))
 async def show_rating(callback: CallbackQuery):
-    name = callback.data.split(":")[1]
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="menu_dicts")]
-    ])
-    dict_id = get_dict_id(callback.from_user.id, name)
-    with sqlite3.connect("words.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT last_score, best_score, total_words FROM ratings WHERE user_id = ? AND dict_id = ?",
-                  (callback.from_user.id, dict_id))
-        row = c.fetchone()
-    if row:
-        last, best, total = row
+    info = await callback_dict(callback)
+    if info is None:
+        return
+    if info.rating:
+        last, best, total = info.rating
         await callback.message.answer(
-            f"📈 Рейтинг для <b>{name}</b>\n"
+            f"📈 Рейтинг для <b>{html.escape(info.name)}</b>\n"
             f"Последняя попытка: {last}/{total}\n"
-            f"❤️Лучшая❤️ попытка: {best}/{total}", reply_markup=kb
+            f"❤️Лучшая❤️ попытка: {best}/{total}", reply_markup=BACK_TO_DICTS_KB
         )
     else:
-        await callback.message.answer("❤️Пупсик, нет данных о рейтинге для этого словаря!❤️", reply_markup=kb)
+        await callback.message.answer("❤️Пупсик, нет данных о рейтинге для этого словаря!❤️",
+                                      reply_markup=BACK_TO_DICTS_KB)
 
 
 # --- Run ---
-if __name__ == "__main__":
+def main():
+    create_app()
     print("bot is started")
-    asyncio.run(dp.start_polling(bot))
+    try:
+        if config.mode == "supervisor":
+            asyncio.run(run_supervisor(config.workers, config.webhook_host, config.webhook_port, config.webhook_path,
+                                       config.webhook_url, config.webhook_secret, config.worker_port, bot,
+                                       outbound_rate=config.outbound_rate,
+                                       allowed_updates=dp.resolve_used_update_types()))
+        elif config.mode == "webhook":
+            asyncio.run(run_webhook(dp, bot, config.webhook_host, config.webhook_port, config.webhook_path,
+                                    config.webhook_url, config.webhook_secret, config.webhook_concurrency))
+        else:
+            asyncio.run(dp.start_polling(bot))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
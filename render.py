@@ -0,0 +1,41 @@
+# Telegram ограничивает сообщение 4096 символами, считая их в UTF-16
+MESSAGE_LIMIT = 4096
+
+
+def text_length(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate(text, limit):
+    if text_length(text) <= limit:
+        return text
+    text = text[:limit - 1]
+    while text_length(text) > limit - 1:
+        # Символ занимает 1 или 2 единицы UTF-16 — отрезаем не больше, чем нужно
+        text = text[:-((text_length(text) - limit + 2) // 2)]
+    return text + "…"
+
+
+class MessageBuffer:
+    # Собирает текст сообщения по строкам, не выходя за лимит длины.
+    # add() возвращает False, если строка уже не помещается.
+    def __init__(self, header="", limit=MESSAGE_LIMIT):
+        self.limit = limit
+        self.parts = [header]
+        self.length = text_length(header)
+
+    def fits(self, line):
+        return self.length + text_length(line) <= self.limit
+
+    def add(self, line):
+        if not self.fits(line):
+            return False
+        self.parts.append(line)
+        self.length += text_length(line)
+        return True
+
+    def __len__(self):
+        return len(self.parts) - 1
+
+    def text(self):
+        return "".join(self.parts)
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: между процессами остаётся только busy_timeout
+    fcntl = None
+
+from leaderboard import record_session
+from metrics import DB_CALL_SECONDS, TimedConnection
+from migrations import split_translations
+
+DB_PATH = os.getenv("WORDS_DB", "words.db")
+
+# --- SQL ---
+# Тексты запросов — константы: sqlite3 кэширует подготовленные выражения по тексту
+# запроса на каждом соединении, а соединения у нас живут всё время работы бота.
+SQL_ADD_USER = "INSERT OR IGNORE INTO users (user_id) VALUES (?)"
+SQL_CREATE_DICT = "INSERT INTO dictionaries (user_id, name) VALUES (?, ?)"
+SQL_GET_WORD = ("SELECT w.eng, group_concat(t.rus, ';') FROM words w "
+                "JOIN translations t ON t.word_id = w.id WHERE w.id = ? GROUP BY w.id")
+# Всё, что нужно меню словарей, одним запросом: число слов — по индексу (dict_id, id)
+SQL_GET_DICT_META = ("SELECT d.id, d.name, (SELECT count(*) FROM words WHERE dict_id = d.id), "
+                     "r.last_score, r.best_score, r.total_words FROM dictionaries d "
+                     "LEFT JOIN ratings r ON r.user_id = d.user_id AND r.dict_id = d.id "
+                     "WHERE d.user_id = ? ORDER BY d.id")
+# Страницы слов: курсор — id последнего (или первого) показанного слова.
+# Порядок "i" — по добавлению, индекс (dict_id, id); порядок "a" — по алфавиту
+# с фильтром по префиксу, индекс (dict_id, eng). В алфавитном порядке курсор — ещё и eng
+# слова: если слово удалили между страницами, сравниваем с eng из кнопки.
+_PAGE_SELECT = ("SELECT w.id, w.eng, (SELECT group_concat(rus, ';') FROM translations WHERE word_id = w.id) "
+                "FROM words w WHERE w.dict_id = ? ")
+_AFTER_ENG = "coalesce((SELECT eng FROM words WHERE id = ?), ?)"
+SQL_WORDS_PAGE = {
+    ("i", None): _PAGE_SELECT + "ORDER BY w.id LIMIT ?",
+    ("i", "n"): _PAGE_SELECT + "AND w.id > ? ORDER BY w.id LIMIT ?",
+    ("i", "p"): _PAGE_SELECT + "AND w.id < ? ORDER BY w.id DESC LIMIT ?",
+    ("a", None): _PAGE_SELECT + "AND w.eng >= ? AND w.eng < ? ORDER BY w.eng LIMIT ?",
+    ("a", "n"): _PAGE_SELECT + f"AND w.eng >= ? AND w.eng < ? AND w.eng > {_AFTER_ENG} ORDER BY w.eng LIMIT ?",
+    ("a", "p"): _PAGE_SELECT + f"AND w.eng >= ? AND w.eng < ? AND w.eng < {_AFTER_ENG} ORDER BY w.eng DESC LIMIT ?",
+}
+SQL_INSERT_WORD = "INSERT OR IGNORE INTO words (dict_id, eng) VALUES (?, ?)"
+# Все переводы слова одним выражением: триггер поискового индекса срабатывает на каждую
+# строку, а FTS5 сбрасывает накопленное на диск после каждого выражения
+SQL_ADD_TRANSLATIONS = ("INSERT OR IGNORE INTO translations (word_id, rus) "
+                        "SELECT w.id, j.value FROM words w, json_each(?) j WHERE w.dict_id = ? AND w.eng = ?")
+SQL_DELETE_WORD = "DELETE FROM words WHERE dict_id = ? AND eng = ?"
+SQL_RESET_RATING = "DELETE FROM ratings WHERE user_id = ? AND dict_id = ?"
+SQL_INIT_RATING = ("INSERT OR IGNORE INTO ratings (user_id, dict_id, last_score, best_score, total_words) "
+                   "VALUES (?, ?, 0, 0, ?)")
+SQL_UPDATE_RATING = ("UPDATE ratings SET last_score = ?, best_score = MAX(best_score, ?), total_words = ? "
+                     "WHERE user_id = ? AND dict_id = ?")
+SQL_GET_CACHED_TRANSLATION = ("SELECT result FROM translation_cache "
+                              "WHERE text = ? AND src = ? AND dest = ? AND created_at >= ?")
+SQL_PUT_CACHED_TRANSLATION = ("INSERT OR REPLACE INTO translation_cache (text, src, dest, result, created_at) "
+                              "VALUES (?, ?, ?, ?, ?)")
+SQL_GET_FILE_IDS = "SELECT path, mtime, file_id FROM media_files"
+SQL_SAVE_FILE_ID = "INSERT OR REPLACE INTO media_files (path, mtime, file_id) VALUES (?, ?, ?)"
+SQL_PURGE_TRANSLATION_CACHE = "DELETE FROM translation_cache WHERE created_at < ?"
+
+
+# --- Запросы (выполняются в потоках пула, получают готовое соединение) ---
+def _add_user(conn, user_id):
+    conn.execute(SQL_ADD_USER, (user_id,))
+
+
+def _create_dict(conn, user_id, dict_name):
+    return conn.execute(SQL_CREATE_DICT, (user_id, dict_name)).lastrowid
+
+
+def _get_dict_meta(conn, user_id):
+    return conn.execute(SQL_GET_DICT_META, (user_id,)).fetchall()
+
+
+def _get_words_page(conn, dict_id, order, direction, cursor, prefix, limit, cursor_eng=""):
+    params = [dict_id]
+    if order == "a":
+        params += [prefix, prefix + "\U0010ffff"]
+    if direction is not None:
+        params.append(cursor)
+        if order == "a":
+            params.append(cursor_eng)
+    params.append(limit)
+    return conn.execute(SQL_WORDS_PAGE[order, direction], params).fetchall()
+
+
+def _get_word(conn, word_id):
+    return conn.execute(SQL_GET_WORD, (word_id,)).fetchone()
+
+
+def _get_words_by_ids(conn, word_ids):
+    return [word for word in (_get_word(conn, word_id) for word_id in word_ids) if word]
+
+
+def _upsert_word(conn, user_id, dict_id, eng, rus):
+    # Новые переводы просто добавляются в translations: уникальный индекс
+    # (word_id, rus) сам отбрасывает уже известные
+    conn.execute(SQL_INSERT_WORD, (dict_id, eng))
+    conn.execute(SQL_ADD_TRANSLATIONS, (json.dumps(split_translations(rus)), dict_id, eng))
+    conn.execute(SQL_RESET_RATING, (user_id, dict_id))
+
+
+def _delete_word(conn, dict_id, eng):
+    return conn.execute(SQL_DELETE_WORD, (dict_id, eng)).rowcount > 0
+
+
+def _save_rating(conn, user_id, dict_id, correct, total):
+    conn.execute(SQL_INIT_RATING, (user_id, dict_id, total))
+    conn.execute(SQL_UPDATE_RATING, (correct, correct, total, user_id, dict_id))
+
+
+def _finish_session(conn, user_id, name, dict_id, words, correct, total):
+    # Рейтинг словаря и таблицы лидеров меняются одной транзакцией
+    _save_rating(conn, user_id, dict_id, correct, total)
+    record_session(conn, user_id, name, words, correct)
+
+
+def _get_cached_translation(conn, text, src, dest, not_before):
+    row = conn.execute(SQL_GET_CACHED_TRANSLATION, (text, src, dest, not_before)).fetchone()
+    return row[0] if row else None
+
+
+def _put_cached_translation(conn, text, src, dest, result, created_at):
+    conn.execute(SQL_PUT_CACHED_TRANSLATION, (text, src, dest, result, created_at))
+
+
+def _purge_translation_cache(conn, before):
+    return conn.execute(SQL_PURGE_TRANSLATION_CACHE, (before,)).rowcount
+
+
+def _get_file_ids(conn):
+    return conn.execute(SQL_GET_FILE_IDS).fetchall()
+
+
+def _save_file_id(conn, path, mtime, file_id):
+    conn.execute(SQL_SAVE_FILE_ID, (path, mtime, file_id))
+
+
+class Database:
+    # Один поток-писатель и пул потоков-читателей. У каждого потока своё
+    # долгоживущее соединение, поэтому запросы не блокируют event loop,
+    # а записи не мешают друг другу. Если базу делят несколько процессов,
+    # write_lock — путь к файлу-замку: транзакции записи берут его эксклюзивно,
+    # и в каждый момент пишет только один процесс.
+    # Потоки, соединения и файл-замок появляются при первом запросе.
+    def __init__(self, path=DB_PATH, readers=4, write_lock=None):
+        self.path = path
+        self.readers = readers
+        self.write_lock = write_lock
+        self._write_lock = None
+        self._writer = None
+        self._readers = None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self, readonly):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256, factory=TimedConnection)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _call(self, readonly, fn, args):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect(readonly)
+        if readonly:
+            return fn(conn, *args)
+        if self._write_lock is None:
+            with conn:
+                return fn(conn, *args)
+        fcntl.flock(self._write_lock, fcntl.LOCK_EX)
+        try:
+            with conn:
+                return fn(conn, *args)
+        finally:
+            fcntl.flock(self._write_lock, fcntl.LOCK_UN)
+
+    async def _run(self, executor, readonly, fn, args):
+        # Время считается вместе с ожиданием свободного потока: так видно насыщение пула
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(executor, self._call, readonly, fn, args)
+        finally:
+            DB_CALL_SECONDS.observe(time.perf_counter() - start, call=fn.__name__.lstrip("_"),
+                                    mode="read" if readonly else "write")
+
+    def _open(self):
+        if self.write_lock and fcntl:
+            self._write_lock = open(self.write_lock, "a")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="db-reader")
+
+    async def read(self, fn, *args):
+        if self._readers is None:
+            self._open()
+        return await self._run(self._readers, True, fn, args)
+
+    async def write(self, fn, *args):
+        if self._writer is None:
+            self._open()
+        return await self._run(self._writer, False, fn, args)
+
+    def close(self):
+        if self._writer is None:
+            return
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        self._writer = self._readers = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        if self._write_lock is not None:
+            self._write_lock.close()
+            self._write_lock = None
+
+    # --- Репозиторий ---
+    async def add_user(self, user_id):
+        await self.write(_add_user, user_id)
+
+    async def create_dict(self, user_id, dict_name):
+        return await self.write(_create_dict, user_id, dict_name)
+
+    async def get_dict_meta(self, user_id):
+        return await self.read(_get_dict_meta, user_id)
+
+    async def get_words_page(self, dict_id, order, direction, cursor, prefix, limit, cursor_eng=""):
+        # direction: None — первая страница, "n" — после cursor, "p" — перед cursor (в обратном порядке)
+        return await self.read(_get_words_page, dict_id, order, direction, cursor, prefix, limit, cursor_eng)
+
+    async def get_word(self, word_id):
+        return await self.read(_get_word, word_id)
+
+    async def get_words_by_ids(self, word_ids):
+        return await self.read(_get_words_by_ids, word_ids)
+
+    async def upsert_word(self, user_id, dict_id, eng, rus):
+        await self.write(_upsert_word, user_id, dict_id, eng, rus)
+
+    async def delete_word(self, dict_id, eng):
+        return await self.write(_delete_word, dict_id, eng)
+
+    async def finish_session(self, user_id, name, dict_id, words, correct, total):
+        await self.write(_finish_session, user_id, name, dict_id, words, correct, total)
+
+    async def get_cached_translation(self, text, src, dest, not_before):
+        return await self.read(_get_cached_translation, text, src, dest, not_before)
+
+    async def put_cached_translation(self, text, src, dest, result, created_at):
+        await self.write(_put_cached_translation, text, src, dest, result, created_at)
+
+    async def purge_translation_cache(self, before):
+        return await self.write(_purge_translation_cache, before)
+
+    async def get_file_ids(self):
+        return await self.read(_get_file_ids)
+
+    async def save_file_id(self, path, mtime, file_id):
+        await self.write(_save_file_id, path, mtime, file_id)
@@ -0,0 +1,44 @@
+# Поиск по всем словарям пользователя: полнотекстовый индекс FTS5 word_search, по строке
+# на английское слово и на каждый его перевод (см. migrations._word_search). Индекс ведут
+# триггеры на words и translations, так что импорт, добавление и удаление слов про него
+# ничего не знают. Токенизатор без диакритики: café = cafe, ё = е.
+#
+# Сначала ищутся точные совпадения слов запроса, потом — по префиксу в обоих языках.
+# Оба запроса останавливаются на limit найденных словах, без сортировки всех совпадений,
+# поэтому время не растёт с размером словарей; короткие префиксы (2–3 символа) берутся
+# из префиксного индекса, однобуквенные слова запроса ищутся только целиком.
+import json
+import re
+
+_TOKEN = re.compile(r"\w+")
+_YO = str.maketrans("ё", "е")
+MAX_TOKENS = 8
+
+SQL_MATCH_WORDS = "SELECT DISTINCT word FROM word_search WHERE word_search MATCH ? LIMIT ?"
+SQL_SEARCH_RESULTS = ("SELECT w.id, w.eng, d.name, (SELECT group_concat(rus, ';') FROM translations WHERE word_id = w.id) "
+                      "FROM json_each(?) j JOIN words w ON w.id = j.value JOIN dictionaries d ON d.id = w.dict_id "
+                      "ORDER BY j.key")
+
+
+def fts_query(user_id, text, prefix):
+    # Слова запроса — в кавычках, чтобы операторы FTS5 из пользовательского текста не работали
+    tokens = _TOKEN.findall(text.casefold().translate(_YO))[:MAX_TOKENS]
+    if not tokens:
+        return None
+    # Однобуквенный префикс совпал бы с огромной долей всех слов в индексе — такие слова только целиком
+    terms = " AND ".join(f'"{token}"*' if prefix and len(token) > 1 else f'"{token}"' for token in tokens)
+    return f"owner : u{user_id} AND {{eng rus}} : ({terms})"
+
+
+def search_words(conn, user_id, text, limit):
+    # [(word_id, eng, название словаря, переводы через ";")], сначала точные совпадения
+    found = {}
+    for prefix in (False, True):
+        query = fts_query(user_id, text, prefix)
+        if query is None:
+            return []
+        for (word,) in conn.execute(SQL_MATCH_WORDS, (query, limit)):
+            found.setdefault(int(word[1:]))
+        if len(found) >= limit:
+            break
+    return conn.execute(SQL_SEARCH_RESULTS, (json.dumps(list(found)[:limit]),)).fetchall()
@@ -0,0 +1,73 @@
+import time
+
+DAY = 24 * 3600
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+# Оценки ответа по шкале SM-2 (0..5)
+QUALITY_CORRECT = 4
+QUALITY_TYPO = 3
+QUALITY_WRONG = 1
+
+# Следующие N слов: сначала те, чьё повторение уже наступило (индекс user_id, dict_id, due_at),
+# затем ещё не изученные слова по порядку id — после последнего выданного (индекс dict_id, id).
+SQL_DUE_WORDS = ("SELECT word_id FROM review_state WHERE user_id = ? AND dict_id = ? AND due_at <= ? "
+                 "ORDER BY due_at LIMIT ?")
+SQL_NEW_WORDS = ("SELECT id FROM words WHERE dict_id = ? AND id > coalesce("
+                 "(SELECT last_new_id FROM review_progress WHERE user_id = ? AND dict_id = ?), 0) "
+                 "ORDER BY id LIMIT ?")
+# Если повторять нечего — ближайшие по расписанию
+SQL_UPCOMING_WORDS = ("SELECT word_id FROM review_state WHERE user_id = ? AND dict_id = ? "
+                      "ORDER BY due_at LIMIT ?")
+SQL_GET_REVIEW = "SELECT ease, interval_days, repetitions FROM review_state WHERE user_id = ? AND word_id = ?"
+SQL_SAVE_REVIEW = ("INSERT OR REPLACE INTO review_state "
+                   "(user_id, word_id, dict_id, ease, interval_days, repetitions, due_at) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?)")
+SQL_INTRODUCE = ("INSERT OR IGNORE INTO review_state "
+                 "(user_id, word_id, dict_id, ease, interval_days, repetitions, due_at) "
+                 "VALUES (?, ?, ?, ?, 0, 0, ?)")
+SQL_ADVANCE_NEW = ("INSERT INTO review_progress (user_id, dict_id, last_new_id) VALUES (?, ?, ?) "
+                   "ON CONFLICT (user_id, dict_id) DO UPDATE SET last_new_id = MAX(last_new_id, excluded.last_new_id)")
+
+
+def schedule(ease, interval_days, repetitions, quality):
+    # SM-2: при ошибке слово начинается заново, при верном ответе интервал растёт
+    if quality < 3:
+        repetitions, interval_days = 0, 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval_days = 1
+        elif repetitions == 2:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease, 2)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ease, interval_days, repetitions
+
+
+def next_words(conn, user_id, dict_id, limit, now=None):
+    # Выполняется в потоке-писателе: выданные новые слова сразу получают расписание «повторить
+    # сейчас», а курсор новых слов уходит за них. Слова, на которые в сессии не успели ответить
+    # (порядок в тренировке случайный), вернутся в следующий раз как просроченные.
+    now = now or time.time()
+    word_ids = [row[0] for row in conn.execute(SQL_DUE_WORDS, (user_id, dict_id, now, limit))]
+    if len(word_ids) < limit:
+        new_ids = [row[0] for row in conn.execute(SQL_NEW_WORDS, (dict_id, user_id, dict_id, limit - len(word_ids)))]
+        if new_ids:
+            conn.executemany(SQL_INTRODUCE, [(user_id, word_id, dict_id, DEFAULT_EASE, now) for word_id in new_ids])
+            conn.execute(SQL_ADVANCE_NEW, (user_id, dict_id, new_ids[-1]))
+        word_ids += new_ids
+    if not word_ids:
+        word_ids = [row[0] for row in conn.execute(SQL_UPCOMING_WORDS, (user_id, dict_id, limit))]
+    return word_ids
+
+
+def record_answer(conn, user_id, dict_id, word_id, quality, now=None):
+    row = conn.execute(SQL_GET_REVIEW, (user_id, word_id)).fetchone()
+    if row is None:
+        row = (DEFAULT_EASE, 0, 0)
+        conn.execute(SQL_ADVANCE_NEW, (user_id, dict_id, word_id))
+    ease, interval_days, repetitions = schedule(*row, quality)
+    due_at = (now or time.time()) + interval_days * DAY
+    conn.execute(SQL_SAVE_REVIEW, (user_id, word_id, dict_id, ease, interval_days, repetitions, due_at))
+    return due_at
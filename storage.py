@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+log = logging.getLogger("pick_me_bot.storage")
+
+SQL_LOAD_FSM = "SELECT state, data FROM fsm_storage WHERE key = ?"
+SQL_RECENT_FSM = "SELECT key, state, data FROM fsm_storage WHERE updated_at >= ? ORDER BY updated_at DESC LIMIT ?"
+SQL_SAVE_FSM = "INSERT OR REPLACE INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)"
+SQL_DELETE_FSM = "DELETE FROM fsm_storage WHERE key = ?"
+SQL_PURGE_FSM = "DELETE FROM fsm_storage WHERE updated_at < ? RETURNING key"
+SQL_LOAD_SESSION = ("SELECT dict_id, word_ids, idx, correct, mistakes FROM training_sessions "
+                    "WHERE user_id = ?")
+SQL_RECENT_SESSIONS = ("SELECT user_id, dict_id, word_ids, idx, correct, mistakes FROM training_sessions "
+                       "WHERE updated_at >= ? ORDER BY updated_at DESC LIMIT ?")
+SQL_SAVE_SESSION = ("INSERT OR REPLACE INTO training_sessions "
+                    "(user_id, dict_id, word_ids, idx, correct, mistakes, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)")
+SQL_DELETE_SESSION = "DELETE FROM training_sessions WHERE user_id = ?"
+SQL_PURGE_SESSIONS = "DELETE FROM training_sessions WHERE updated_at < ? RETURNING user_id"
+
+
+class WriteBehind:
+    # Накопленное в памяти уходит в базу раз в flush_interval секунд, досрочно — через
+    # _flush_soon() и при close(). Наследники реализуют flush(): забрать буфер и записать.
+    # Цикл останавливается событием, а не cancel(): отмена посреди flush() потеряла бы
+    # уже изъятое из буфера, пока запись ждёт своей очереди к потоку-писателю.
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._task = None
+        self._stop = None
+        self._flushing = None
+
+    async def flush(self):
+        raise NotImplementedError
+
+    async def _tick(self):
+        await self.flush()
+
+    def _flush_soon(self):
+        if self._flushing is None:
+            self._flushing = asyncio.ensure_future(self.flush())
+            self._flushing.add_done_callback(self._flushed)
+
+    def _flushed(self, task):
+        self._flushing = None
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("%s: не удалось сохранить: %s", type(self).__name__, task.exception())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.flush_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._tick()
+            except Exception as e:
+                log.warning("%s: не удалось сохранить: %s", type(self).__name__, e)
+
+    async def start(self):
+        if self._task is None:
+            self._stop = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = None
+        if self._flushing is not None:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+        await self.flush()
+
+
+class WriteBackStore(WriteBehind):
+    # Горячие записи живут в ограниченном LRU в памяти, изменения копятся в _dirty
+    # и пачкой уходят в базу раз в flush_interval секунд (или когда их набралось
+    # batch_size). Записи, к которым не обращались idle_timeout секунд, выгружаются
+    # из памяти — на диске они остаются и подгружаются при следующем обращении.
+    # Значение None означает «записи нет»: так кэшируется и отсутствие данных.
+    # Строки, не менявшиеся дольше срока хранения, удаляет purge() из периодического обслуживания.
+    sql_load = sql_recent = sql_save = sql_delete = sql_purge = None
+
+    def __init__(self, db, max_entries=10_000, idle_timeout=1800, flush_interval=1.0, batch_size=500):
+        super().__init__(flush_interval)
+        self.db = db
+        self.max_entries = max_entries
+        self.idle_timeout = idle_timeout
+        self.batch_size = batch_size
+        self._cache = OrderedDict()
+        self._touched = {}
+        self._dirty = {}
+
+    # Преобразование между значением и строкой таблицы — в наследниках
+    def _to_row(self, key, value):
+        raise NotImplementedError
+
+    def _from_row(self, row):
+        raise NotImplementedError
+
+    def _remember(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        self._touched[key] = time.monotonic()
+        while len(self._cache) > self.max_entries:
+            old_key, _ = self._cache.popitem(last=False)
+            self._touched.pop(old_key, None)
+
+    async def get(self, key):
+        if key in self._dirty:
+            value = self._dirty[key]
+        elif key in self._cache:
+            value = self._cache[key]
+        else:
+            value = await self.db.read(self._load, key)
+            # Пока читали, запись могли изменить
+            if key in self._dirty:
+                value = self._dirty[key]
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        self._remember(key, value)
+        self._dirty[key] = value
+        if len(self._dirty) >= self.batch_size:
+            self._flush_soon()
+
+    def delete(self, key):
+        self.put(key, None)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _load(self, conn, key):
+        row = conn.execute(self.sql_load, (key,)).fetchone()
+        return self._from_row((key,) + tuple(row))[1] if row else None
+
+    def _write(self, conn, saves, deletes):
+        conn.executemany(self.sql_save, saves)
+        conn.executemany(self.sql_delete, deletes)
+
+    def _recent(self, conn):
+        rows = conn.execute(self.sql_recent, (time.time() - self.idle_timeout, self.max_entries))
+        return [self._from_row(row) for row in rows]
+
+    async def flush(self):
+        dirty, self._dirty = self._dirty, {}
+        if dirty:
+            now = time.time()
+            saves = [self._to_row(key, value) + (now,) for key, value in dirty.items() if value is not None]
+            deletes = [(key,) for key, value in dirty.items() if value is None]
+            try:
+                await self.db.write(self._write, saves, deletes)
+            except Exception:
+                # Не потеряли: вернём в очередь, если ключ с тех пор не менялся
+                for key, value in dirty.items():
+                    self._dirty.setdefault(key, value)
+                raise
+
+    def _purge(self, conn, before):
+        return [row[0] for row in conn.execute(self.sql_purge, (before,))]
+
+    async def purge(self, before):
+        # Удалённое с диска забываем и в памяти; несохранённые изменения остаются
+        keys = await self.db.write(self._purge, before)
+        for key in keys:
+            if key not in self._dirty:
+                self._cache.pop(key, None)
+                self._touched.pop(key, None)
+        return len(keys)
+
+    def evict_idle(self):
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [key for key, touched in self._touched.items() if touched < deadline and key not in self._dirty]
+        for key in idle:
+            self._cache.pop(key, None)
+            self._touched.pop(key, None)
+        return len(idle)
+
+    async def restore(self):
+        # Подгружаем в память сессии, активные за последние idle_timeout секунд
+        for key, value in await self.db.read(self._recent):
+            if key not in self._cache:
+                self._remember(key, value)
+
+    async def _tick(self):
+        await self.flush()
+        self.evict_idle()
+
+    async def start(self):
+        await self.restore()
+        await super().start()
+
+
+class FSMRecords(WriteBackStore):
+    # Значение — (state, data)
+    sql_load, sql_recent, sql_save, sql_delete = SQL_LOAD_FSM, SQL_RECENT_FSM, SQL_SAVE_FSM, SQL_DELETE_FSM
+    sql_purge = SQL_PURGE_FSM
+
+    def _to_row(self, key, value):
+        state, data = value
+        return key, state, json.dumps(data, ensure_ascii=False)
+
+    def _from_row(self, row):
+        key, state, data = row
+        return key, (state, json.loads(data))
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, db, **options):
+        self.records = FSMRecords(db, **options)
+        self.key_builder = DefaultKeyBuilder(with_destiny=True, with_bot_id=True)
+
+    async def _get(self, key):
+        return await self.records.get(self.key_builder.build(key)) or (None, {})
+
+    def _put(self, key, state, data):
+        value = (state, data) if state is not None or data else None
+        self.records.put(self.key_builder.build(key), value)
+
+    async def set_state(self, key, state=None):
+        _, data = await self._get(key)
+        self._put(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key):
+        state, _ = await self._get(key)
+        return state
+
+    async def set_data(self, key, data):
+        state, _ = await self._get(key)
+        self._put(key, state, dict(data))
+
+    async def get_data(self, key):
+        _, data = await self._get(key)
+        return dict(data)
+
+    async def purge(self, before):
+        return await self.records.purge(before)
+
+    async def start(self):
+        await self.records.start()
+
+    async def close(self):
+        await self.records.close()
+
+
+class TrainingSessionStore(WriteBackStore):
+    # Сессия хранит только id слов: {"dict_id", "word_ids", "index", "correct", "mistakes"}.
+    # После изменения сессии её нужно снова отдать в put(), чтобы она попала на диск.
+    sql_load, sql_recent = SQL_LOAD_SESSION, SQL_RECENT_SESSIONS
+    sql_save, sql_delete, sql_purge = SQL_SAVE_SESSION, SQL_DELETE_SESSION, SQL_PURGE_SESSIONS
+
+    def _to_row(self, key, value):
+        return (key, value["dict_id"], json.dumps(value["word_ids"]), value["index"], value["correct"],
+                json.dumps(value["mistakes"]))
+
+    def _from_row(self, row):
+        user_id, dict_id, word_ids, index, correct, mistakes = row
+        return user_id, {"dict_id": dict_id, "word_ids": json.loads(word_ids), "index": index,
+                         "correct": correct, "mistakes": json.loads(mistakes)}
@@ -0,0 +1,138 @@
+# Режим супервизора: N процессов-воркеров, каждый — обычный бот в режиме вебхука на
+# 127.0.0.1. Супервизор принимает апдейты на общем вебхуке и пересылает каждый воркеру
+# from_user.id % N, поэтому FSM, тренировки и кэши пользователя живут в одном процессе.
+# Общие данные остаются в words.db: воркеры пишут в неё по очереди через файл-замок
+# (см. Database(write_lock=...)), читают параллельно благодаря WAL.
+# Лимит Telegram на отправку общий для бота, поэтому OUTBOUND_RATE делится между воркерами
+# поровну; лимит на чат не делится — чат пользователя обслуживает один воркер.
+import asyncio
+import logging
+import os
+import secrets
+import signal
+import sys
+
+import aiohttp
+from aiohttp import web
+
+from webhook import SECRET_HEADER, OrderedQueue, make_app, stop_on_signals, wait_listening
+
+log = logging.getLogger("pick_me_bot.supervisor")
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pick_me_bot.py")
+FORWARD_RETRIES = 20
+
+
+def raw_owner(data):
+    # Владелец апдейта прямо из JSON, без разбора в модели aiogram
+    for key, event in data.items():
+        if key != "update_id" and isinstance(event, dict):
+            owner = event.get("from") or event.get("user") or event.get("chat")
+            return owner.get("id") if owner else None
+    return None
+
+
+class Forwarder(OrderedQueue):
+    # Апдейты одного пользователя пересылаются по одному: воркер ставит их в свою
+    # очередь в порядке получения
+    def __init__(self, urls, secret, concurrency=256, max_pending=10_000):
+        super().__init__(concurrency, max_pending)
+        self.urls = urls
+        self.secret = secret
+        self.http = None
+
+    def owner(self, data):
+        return raw_owner(data)
+
+    def worker_url(self, data):
+        return self.urls[(self.owner(data) or 0) % len(self.urls)]
+
+    async def handle(self, data):
+        url = self.worker_url(data)
+        for attempt in range(FORWARD_RETRIES):
+            try:
+                async with self.http.post(url, json=data, headers={SECRET_HEADER: self.secret}) as response:
+                    if response.status == 200:
+                        return
+                    log.warning("worker %s answered %s", url, response.status)
+            except aiohttp.ClientConnectionError as e:
+                # Воркер перезапускается — подождём
+                log.warning("worker %s is unavailable: %s", url, e)
+            await asyncio.sleep(min(0.1 * (attempt + 1), 1.0))
+        log.error("update %s dropped: worker %s did not accept it", data.get("update_id"), url)
+
+
+class Worker:
+    def __init__(self, index, port, secret, outbound_rate=None):
+        self.index = index
+        self.port = port
+        self.secret = secret
+        self.outbound_rate = outbound_rate
+        self.process = None
+        self.stopping = False
+
+    def env(self):
+        env = dict(os.environ, BOT_MODE="webhook", WEBHOOK_HOST="127.0.0.1", WEBHOOK_PORT=str(self.port),
+                   WEBHOOK_PATH="/webhook", WEBHOOK_SECRET=self.secret, WORKER_INDEX=str(self.index))
+        # Вебхук в Telegram регистрирует только супервизор
+        env.pop("WEBHOOK_URL", None)
+        if env.get("METRICS_PORT"):
+            env["METRICS_PORT"] = str(int(env["METRICS_PORT"]) + self.index)
+        if self.outbound_rate is not None:
+            env["OUTBOUND_RATE"] = str(self.outbound_rate)
+        return env
+
+    async def supervise(self):
+        # Упавший воркер поднимается заново, пока супервизор не остановлен
+        while not self.stopping:
+            self.process = await asyncio.create_subprocess_exec(sys.executable, BOT_SCRIPT, env=self.env())
+            code = await self.process.wait()
+            if not self.stopping:
+                log.warning("worker %d exited with %s, restarting", self.index, code)
+                await asyncio.sleep(1)
+
+    def stop(self):
+        self.stopping = True
+        if self.process is not None and self.process.returncode is None:
+            self.process.send_signal(signal.SIGTERM)
+
+
+async def run_supervisor(workers, host="0.0.0.0", port=8080, path="/webhook", url=None, secret=None,
+                         worker_port=9000, bot=None, drain_timeout=30.0, stop=None, outbound_rate=None,
+                         allowed_updates=None):
+    worker_secret = secrets.token_urlsafe(16)
+    worker_rate = outbound_rate / workers if outbound_rate is not None else None
+    pool = [Worker(i, worker_port + i, worker_secret, worker_rate) for i in range(workers)]
+    tasks = [asyncio.create_task(worker.supervise()) for worker in pool]
+    urls = [f"http://127.0.0.1:{worker.port}/webhook" for worker in pool]
+    forwarder = Forwarder(urls, worker_secret)
+    runner = web.AppRunner(make_app(forwarder, path, secret))
+    await runner.setup()
+    stop = stop or asyncio.Event()
+
+    def stop_restarts():
+        # Ctrl+C получает вся группа процессов, и воркеры завершаются сразу, не дожидаясь
+        # супервизора: перезапускать их уже нельзя
+        for worker in pool:
+            worker.stopping = True
+
+    stop_on_signals(stop, stop_restarts)
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as http:
+            forwarder.http = http
+            await asyncio.gather(*(wait_listening(http, u) for u in urls))
+            await web.TCPSite(runner, host, port).start()
+            if url and bot is not None:
+                await bot.set_webhook(url.rstrip("/") + path, secret_token=secret, allowed_updates=allowed_updates)
+            log.info("supervisor is listening on %s:%s%s with %d workers", host, port, path, workers)
+            await stop.wait()
+            # Сначала дошлём принятые апдейты, потом воркеры доработают свои очереди
+            await forwarder.drain(drain_timeout)
+    finally:
+        await runner.cleanup()
+        for worker in pool:
+            worker.stop()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if bot is not None:
+            await bot.session.close()
+    return forwarder
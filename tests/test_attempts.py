@@ -0,0 +1,32 @@
+import asyncio
+
+from attempts import AttemptLog, hardest_words, recent_stats
+from migrations import migrate
+from repository import Database
+from srs import QUALITY_CORRECT, QUALITY_WRONG
+
+NOW = 1_700_000_000.0
+
+
+def test_rollups(tmp_path):
+    path = str(tmp_path / "words.db")
+    migrate(path)
+    db = Database(path)
+
+    async def run():
+        dict_id = await db.create_dict(1, "d")
+        for eng in ("hard", "easy"):
+            await db.upsert_word(1, dict_id, eng, "слово")
+        hard, easy = await db.read(lambda conn: [row[0] for row in conn.execute("SELECT id FROM words ORDER BY id")])
+        log = AttemptLog(db)
+        for quality in (QUALITY_WRONG, QUALITY_WRONG, QUALITY_CORRECT):
+            log.add(1, dict_id, hard, quality, NOW)
+        log.add(1, dict_id, easy, QUALITY_CORRECT, NOW)
+        await log.flush()
+        return await db.read(hardest_words, 1, 10), await db.read(recent_stats, 1, 7, NOW)
+
+    hardest, stats = asyncio.run(run())
+    db.close()
+    assert hardest == [("hard", "слово", 2, 3)]
+    assert tuple(stats) == (4, 2)
+
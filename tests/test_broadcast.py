@@ -0,0 +1,49 @@
+import asyncio
+
+from broadcast import Broadcaster, recent_broadcasts
+from migrations import migrate
+from repository import Database
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append(chat_id)
+
+
+class FlakyDatabase(Database):
+    # Первое чтение падает, как при «database is locked»
+    failures = 1
+
+    async def read(self, fn, *args):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        return await super().read(fn, *args)
+
+
+def test_run_survives_errors(tmp_path):
+    path = str(tmp_path / "words.db")
+    migrate(path)
+    db = FlakyDatabase(path)
+
+    async def run():
+        for user_id in (1, 2, 3):
+            await db.add_user(user_id)
+        bot = FakeBot()
+        broadcaster = Broadcaster(db, bot)
+        task = asyncio.create_task(broadcaster.run())
+        await asyncio.sleep(0.05)
+        await broadcaster.announce("news", None)
+        for _ in range(100):
+            if len(bot.sent) == 3:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        return sorted(bot.sent), await db.read(recent_broadcasts, 1)
+
+    sent, [(_, _, delivered, *_)] = asyncio.run(run())
+    db.close()
+    assert sent == [1, 2, 3] and delivered == 3
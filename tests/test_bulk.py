@@ -0,0 +1,37 @@
+import sqlite3
+
+import pytest
+
+from bulk import ImportFileError, import_file
+from migrations import migrate
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / "words.db")
+    migrate(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("INSERT INTO dictionaries (user_id, name) VALUES (1, 'd')")
+    yield conn
+    conn.close()
+
+
+def run_import(conn, tmp_path, data):
+    path = tmp_path / "import.csv"
+    path.write_bytes(data)
+    return import_file(conn, 1, 1, str(path))
+
+
+def test_import_utf8_with_bom(conn, tmp_path):
+    data = "﻿eng\trus\ncat\tкошка;кот\r\ndog\tсобака\n".encode()
+    assert run_import(conn, tmp_path, data) == (2, 2, 3)
+
+
+@pytest.mark.parametrize("data, line", [
+    ("cat\tкошка\n".encode() + "dog\tсобака\n".encode("cp1251"), 2),
+    # Поле длиннее csv.field_size_limit()
+    (b"cat\tcat\ndog\tdog\nbad\t" + b"x" * 200_000 + b"\n", 3),
+])
+def test_import_reports_bad_line(conn, tmp_path, data, line):
+    with pytest.raises(ImportFileError, match=f"строка {line}"):
+        run_import(conn, tmp_path, data)
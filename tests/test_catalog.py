@@ -0,0 +1,48 @@
+import asyncio
+import os
+import threading
+
+from catalog import TestCatalog as Catalog
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_refresh_rebuilds_only_after_changes(tmp_path, monkeypatch):
+    write(str(tmp_path / "reading" / "questions" / "1.txt"), "q1")
+    write(str(tmp_path / "reading" / "answers" / "1.txt"), "1) a")
+    catalog = Catalog(str(tmp_path), check_interval=0)
+    catalog.scan()
+    scans = []
+    scan = catalog.scan
+    monkeypatch.setattr(catalog, "scan", lambda: (scans.append(threading.current_thread()), scan()))
+
+    async def scenario():
+        assert await catalog.variants("reading") == ["1"]
+        assert scans == []
+        write(str(tmp_path / "reading" / "questions" / "2.txt"), "q2")
+        os.utime(tmp_path / "reading" / "questions" / "1.txt", ns=(1, 1))
+        names = await catalog.variants("reading")
+        test = await catalog.get("reading", "2")
+        return names, test
+
+    names, test = asyncio.run(scenario())
+    assert names == ["1", "2"]
+    assert test.questions == "q2" and test.answer is None
+    # Перестройка один раз и не в потоке цикла событий
+    assert len(scans) == 1 and scans[0] is not threading.main_thread()
+
+
+def test_concurrent_requests_share_one_refresh(tmp_path, monkeypatch):
+    catalog = Catalog(str(tmp_path), check_interval=0)
+    calls = []
+    monkeypatch.setattr(catalog, "_rescan", lambda: calls.append(1))
+
+    async def scenario():
+        await asyncio.gather(*(catalog.get("reading", "1") for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert calls == [1]
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from grading import EXACT, MISSING, TYPO, WRONG, AnswerKey, AnswerSet, compile_translations, within_distance
+
+
+def levenshtein(a, b):
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        prev, row[0] = row[0], i
+        for j, cb in enumerate(b, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ca != cb))
+    return row[-1]
+
+
+def test_within_distance_matches_levenshtein():
+    rng = random.Random(1)
+    for _ in range(2000):
+        a = "".join(rng.choice("abc") for _ in range(rng.randint(0, 9)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randint(0, 9)))
+        limit = rng.randint(0, 3)
+        assert within_distance(a, b, limit) == (levenshtein(a, b) <= limit), (a, b, limit)
+
+
+@pytest.mark.parametrize("answer, verdict", [
+    ("кошка", EXACT),
+    ("  Кошка! ", EXACT),
+    ("кощка", TYPO),
+    ("собака", WRONG),
+    ("", MISSING),
+])
+def test_translation_grade(answer, verdict):
+    assert compile_translations("кот;кошка").grade(answer).verdict == verdict
+
+
+@pytest.mark.parametrize("key, answer, verdict", [
+    ("1990", "1991", WRONG),
+    ("1990", "1990", EXACT),
+    ("b2 level", "b3 level", WRONG),
+    ("b2 level", "b2 levle", TYPO),
+    ("a", "b", WRONG),
+    ("a beautiful day", "a beatiful day", TYPO),
+    ("a beautiful day", "the beatiful day", WRONG),
+])
+def test_exact_tokens(key, answer, verdict):
+    assert AnswerSet([key], key).grade(answer).verdict == verdict
+
+
+def test_wrong_year_is_not_a_typo():
+    results = AnswerKey("1) 1990 2) 25").grade("1991 25")
+    assert [result.verdict for result in results] == [WRONG, EXACT]
+
+
+@pytest.mark.parametrize("key, answer", [
+    ("1) cat 2) dog", "1. cat 2. dog"),
+    ("cat, dog", "cat dog"),
+    ("cat\ndog", "cat; dog"),
+    ("big cat\nred dog", "big cat red dog"),
+])
+def test_answer_split(key, answer):
+    assert all(result.verdict == EXACT for result in AnswerKey(key).grade(answer))
@@ -0,0 +1,28 @@
+import sqlite3
+
+from leaderboard import GLOBAL, record_session, size_board, standings
+from migrations import MIGRATIONS, _leaderboards, migrate
+
+
+def test_seed_counts_correct_answers(tmp_path):
+    path = str(tmp_path / "words.db")
+    migrate(path, MIGRATIONS.index(_leaderboards))
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("INSERT INTO dictionaries (id, user_id, name) VALUES (1, 1, 'a'), (2, 1, 'b'), (3, 2, 'c')")
+    conn.executemany("INSERT INTO words (dict_id, eng, rus) VALUES (?, ?, 'с')",
+                     [(dict_id, eng) for dict_id in (1, 3) for eng in "abc"])
+    # user_id, dict_id, last_score, best_score: лучшая и последняя тренировки — разные, одна, одна
+    conn.executemany("INSERT INTO ratings VALUES (?, ?, ?, ?, 3)", [(1, 1, 2, 3), (1, 2, 0, 0), (2, 3, 3, 3)])
+    conn.close()
+    migrate(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    scores = dict(conn.execute("SELECT user_id, score FROM leaderboard_scores WHERE board = ?", (GLOBAL,)))
+    assert scores == {1: 5, 2: 3}
+    assert dict(conn.execute("SELECT score, users FROM leaderboard_histogram WHERE board = ?", (GLOBAL,))) == {5: 1, 3: 1}
+
+    # Дальше доска растёт на верные ответы каждой тренировки — в тех же единицах
+    record_session(conn, 2, "Bo", 3, 3, now=1.0)
+    top, score, place, players = standings(conn, size_board(3), 2, 10)
+    assert (score, place, players) == (6, 1, 2)
+    assert [row[0] for row in top] == [2, 1]
+    conn.close()
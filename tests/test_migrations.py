@@ -0,0 +1,22 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from migrations import SCHEMA_VERSION, migrate
+
+
+def test_migrate_returns_new_version(tmp_path):
+    path = str(tmp_path / "words.db")
+    assert migrate(path, 3) == 3
+    assert migrate(path) == SCHEMA_VERSION
+    assert migrate(path) == SCHEMA_VERSION
+
+
+def test_concurrent_migrations_apply_once(tmp_path):
+    # Несколько процессов стартуют одновременно на холодной базе
+    path = str(tmp_path / "words.db")
+    with ThreadPoolExecutor(4) as pool:
+        versions = list(pool.map(migrate, [path] * 4))
+    assert versions == [SCHEMA_VERSION] * 4
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    conn.close()
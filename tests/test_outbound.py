@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from outbound import OutboundQueue, merged
+
+CHAT_ID = 1
+KB = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="ok", callback_data="ok")]])
+
+
+async def send_all(messages, merge=False):
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append(method.text)
+        await asyncio.sleep(0.01)
+        return method.text
+
+    queue = OutboundQueue(rate=1000, chat_rate=1000, chat_burst=1)
+
+    async def send(text, kb):
+        return await queue(make_request, None, SendMessage(chat_id=CHAT_ID, text=text, reply_markup=kb))
+
+    async def send_each():
+        return await asyncio.gather(*(send(text, kb) for text, kb in messages))
+
+    if merge:
+        with merged():
+            results = await send_each()
+    else:
+        results = await send_each()
+    await queue.close()
+    return sent, results
+
+
+def test_messages_are_not_merged_by_default():
+    sent, results = asyncio.run(send_all([("a", None), ("b", None), ("c", None)]))
+    assert sent == ["a", "b", "c"]
+    assert results == ["a", "b", "c"]
+
+
+def test_queued_texts_are_merged_on_request():
+    # Первое уходит сразу, остальные копятся в очереди чата и уходят одним сообщением
+    sent, results = asyncio.run(send_all([("a", None), ("b", None), ("c", None)], merge=True))
+    assert sent == ["a", "b\n\nc"]
+    assert results == ["a", "b\n\nc", "b\n\nc"]
+
+
+def test_keyboard_messages_are_never_merged():
+    sent, results = asyncio.run(send_all([("a", None), ("b", None), ("page", KB), ("c", None)], merge=True))
+    assert sent == ["a", "b", "page", "c"]
+    assert results[2] == "page"
+
+
+def test_retry_after_pauses_whole_bot():
+    async def scenario():
+        calls = []
+
+        async def make_request(bot, method):
+            calls.append((method.chat_id, time.monotonic()))
+            if len(calls) == 1:
+                raise TelegramRetryAfter(method, "flood", 0.2)
+            return method.text
+
+        queue = OutboundQueue(rate=1000, chat_rate=1000, chat_burst=10)
+        start = time.monotonic()
+        await asyncio.gather(queue(make_request, None, SendMessage(chat_id=1, text="a")),
+                             queue(make_request, None, SendMessage(chat_id=2, text="b")))
+        await queue.close()
+        return [(chat_id, at - start) for chat_id, at in calls]
+
+    calls = asyncio.run(scenario())
+    assert calls[0][0] == 1
+    # Второй чат ждёт окончания паузы, хотя его собственный лимит свободен
+    assert all(at >= 0.15 for _, at in calls[1:])
+    assert sorted(chat_id for chat_id, _ in calls[1:]) == [1, 2]
@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+from migrations import migrate
+from pick_me_bot import CALLBACK_DATA_LIMIT, page_callback, parse_page_callback
+from repository import _delete_word, _get_words_page, _upsert_word
+
+WORDS = ["apple", "apricot", "banana", "berry", "cherry", "date"]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / "words.db")
+    migrate(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("INSERT INTO dictionaries (user_id, name) VALUES (1, 'd')")
+    for eng in WORDS:
+        _upsert_word(conn, 1, 1, eng, "слово")
+    yield conn
+    conn.close()
+
+
+def page(conn, direction=None, cursor=0, cursor_eng="", prefix=""):
+    return [eng for _, eng, _ in _get_words_page(conn, 1, "a", direction, cursor, prefix, 2, cursor_eng)]
+
+
+def test_alphabetical_pages_survive_deleted_cursor(conn):
+    first = _get_words_page(conn, 1, "a", None, 0, "", 2)
+    assert [eng for _, eng, _ in first] == ["apple", "apricot"]
+    last_id, last_eng, _ = first[-1]
+    # Слово-курсор удалили, пока пользователь смотрел страницу
+    _delete_word(conn, 1, last_eng)
+    assert page(conn, "n", last_id, last_eng) == ["banana", "berry"]
+    assert page(conn, "p", last_id, last_eng) == ["apple"]
+
+
+def test_prefix_filter(conn):
+    assert page(conn, prefix="b") == ["banana", "berry"]
+    assert page(conn, "n", 0, "banana", "b") == ["berry"]
+
+
+@pytest.mark.parametrize("order, direction, prefix, eng", [
+    ("a", "n", "ap", "apricot"),
+    ("a", "p", "", "cherry"),
+    ("i", "n", "", ""),
+    ("a", "f", "b", ""),
+])
+def test_page_callback_round_trip(order, direction, prefix, eng):
+    data = page_callback(7, order, direction, 42, prefix, eng)
+    dict_id, order_, direction_, cursor, prefix_, cursor_eng = parse_page_callback(data)
+    assert (dict_id, order_, cursor, prefix_) == (7, order, 42, prefix)
+    assert direction_ == (None if direction == "f" else direction)
+    if order == "a" and direction != "f":
+        assert cursor_eng == eng
+
+
+def test_page_callback_fits_limit():
+    data = page_callback(123456, "a", "n", 10 ** 9, "при", "привет" * 20)
+    assert len(data.encode()) <= CALLBACK_DATA_LIMIT
+    _, _, _, _, prefix, cursor_eng = parse_page_callback(data)
+    assert prefix == "при" and ("привет" * 20).startswith(cursor_eng)
+
+
+def test_old_callback_format():
+    assert parse_page_callback("page:7:a:n:42:ab") == (7, "a", "n", 42, "ab", "ab")
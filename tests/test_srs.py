@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from migrations import migrate
+from srs import QUALITY_CORRECT, next_words, record_answer
+
+USER_ID = 1
+WORDS = 40
+BATCH = 20
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / "words.db")
+    migrate(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    dict_id = conn.execute("INSERT INTO dictionaries (user_id, name) VALUES (?, 'd')", (USER_ID,)).lastrowid
+    conn.executemany("INSERT INTO words (dict_id, eng) VALUES (?, ?)", [(dict_id, f"w{i}") for i in range(WORDS)])
+    yield conn
+    conn.close()
+
+
+def dict_id(conn):
+    return conn.execute("SELECT id FROM dictionaries").fetchone()[0]
+
+
+def test_unanswered_new_words_come_back(conn):
+    # Сессия в случайном порядке, ответ на два слова — остальные выданные не должны потеряться
+    now = 1000.0
+    first = next_words(conn, USER_ID, dict_id(conn), BATCH, now)
+    assert first == list(range(1, BATCH + 1))
+    for word_id in (9, 4):
+        record_answer(conn, USER_ID, dict_id(conn), word_id, QUALITY_CORRECT, now)
+
+    second = next_words(conn, USER_ID, dict_id(conn), BATCH, now + 1)
+    assert set(first) - {9, 4} <= set(second)
+
+
+def test_every_word_is_offered_before_repeats(conn):
+    now, seen = 1000.0, set()
+    for _ in range(WORDS // BATCH):
+        word_ids = next_words(conn, USER_ID, dict_id(conn), BATCH, now)
+        seen.update(word_ids)
+        for word_id in word_ids:
+            record_answer(conn, USER_ID, dict_id(conn), word_id, QUALITY_CORRECT, now)
+    assert seen == set(range(1, WORDS + 1))
+
+
+def test_due_words_go_first(conn):
+    now = 1000.0
+    word_ids = next_words(conn, USER_ID, dict_id(conn), 5, now)
+    record_answer(conn, USER_ID, dict_id(conn), word_ids[0], QUALITY_CORRECT, now)
+    # Через день первое слово пора повторить, остальные четыре выданы и не отвечены
+    later = next_words(conn, USER_ID, dict_id(conn), 10, now + 2 * 86400)
+    assert set(later[:5]) == set(word_ids)
+    assert later[5:] == list(range(6, 11))
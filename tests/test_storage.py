@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from attempts import AttemptLog
+from migrations import migrate
+from repository import Database
+from storage import TrainingSessionStore
+
+SESSION = {"dict_id": 1, "word_ids": [1, 2, 3], "index": 1, "correct": 1, "mistakes": []}
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "words.db")
+    migrate(path)
+    db = Database(path)
+    yield db
+    db.close()
+
+
+def count(table):
+    return lambda conn: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+def test_session_survives_restart(db):
+    async def run():
+        store = TrainingSessionStore(db)
+        await store.start()
+        store.put(1, SESSION)
+        store.delete(2)
+        await store.close()
+        reopened = TrainingSessionStore(db)
+        return await reopened.get(1), await reopened.get(2)
+
+    assert asyncio.run(run()) == (SESSION, None)
+
+
+@pytest.mark.parametrize("make, add, table", [
+    (lambda db: TrainingSessionStore(db, flush_interval=0.05), lambda store, i: store.put(i, SESSION),
+     "training_sessions"),
+    (lambda db: AttemptLog(db, flush_interval=0.05), lambda log, i: log.add(1, 1, i, 4, 0.0), "attempts"),
+], ids=["sessions", "attempts"])
+def test_close_keeps_buffer_while_writer_is_busy(db, make, add, table):
+    # Фоновый сброс ждёт занятого потока-писателя, и в этот момент бот останавливается
+    async def run():
+        store = make(db)
+        await store.start()
+        busy = asyncio.ensure_future(db.write(lambda conn: time.sleep(0.3)))
+        for i in range(10):
+            add(store, i)
+        await asyncio.sleep(0.1)
+        await store.close()
+        await busy
+        return await db.read(count(table))
+
+    assert asyncio.run(run()) == 10
+
+
+def test_purge_removes_stale_rows(db):
+    async def run():
+        store = TrainingSessionStore(db)
+        store.put(1, SESSION)
+        store.put(2, SESSION)
+        await store.flush()
+        await db.write(lambda conn: conn.execute("UPDATE training_sessions SET updated_at = 0 WHERE user_id = 1"))
+        purged = await store.purge(time.time() - 3600)
+        return purged, await store.get(1), await store.get(2), await db.read(count("training_sessions"))
+
+    assert asyncio.run(run()) == (1, None, SESSION, 1)
@@ -0,0 +1,34 @@
+import asyncio
+import os
+import signal
+
+import supervisor
+from supervisor import Worker, raw_owner
+from webhook import stop_on_signals
+
+
+def test_raw_owner():
+    assert raw_owner({"update_id": 1, "message": {"from": {"id": 7}, "chat": {"id": 8}}}) == 7
+    assert raw_owner({"update_id": 1, "poll": {"id": "x"}}) is None
+
+
+def test_ctrl_c_does_not_restart_workers(tmp_path, monkeypatch):
+    script = tmp_path / "bot.py"
+    script.write_text("import time\ntime.sleep(30)\n")
+    monkeypatch.setattr(supervisor, "BOT_SCRIPT", str(script))
+
+    async def scenario():
+        worker = Worker(0, 0, "secret")
+        stop = asyncio.Event()
+        stop_on_signals(stop, lambda: setattr(worker, "stopping", True))
+        task = asyncio.create_task(worker.supervise())
+        while worker.process is None:
+            await asyncio.sleep(0.01)
+        first = worker.process
+        # Ctrl+C в терминале: SIGINT получают и супервизор, и воркер
+        os.kill(os.getpid(), signal.SIGINT)
+        first.send_signal(signal.SIGINT)
+        await asyncio.wait_for(task, 5)
+        return stop.is_set(), worker.process is first
+
+    assert asyncio.run(scenario()) == (True, True)
@@ -0,0 +1,215 @@
+import asyncio
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import TRANSLATOR_SECONDS, check_slow
+
+
+class TranslationError(Exception):
+    pass
+
+
+# --- Бэкенды ---
+class TranslationBackend:
+    name = "base"
+
+    async def translate(self, text, src, dest):
+        raise NotImplementedError
+
+
+class GoogleBackend(TranslationBackend):
+    # googletrans 4.0.0rc1 синхронный, поэтому запросы уходят в отдельный пул потоков.
+    # Сам googletrans (а с ним httpx и h2) импортируется при первом переводе, не при старте бота.
+    name = "google"
+
+    def __init__(self, workers=4):
+        self._translator = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="googletrans")
+
+    def _get_translator(self):
+        with self._lock:
+            if self._translator is None:
+                from googletrans import Translator
+                self._translator = Translator()
+            return self._translator
+
+    def _translate(self, text, src, dest):
+        return self._get_translator().translate(text, src=src, dest=dest).text
+
+    async def translate(self, text, src, dest):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._translate, text, src, dest)
+
+
+class StubBackend(TranslationBackend):
+    # Локальный словарь вместо сети — для тестов и бенчмарков
+    name = "stub"
+
+    def __init__(self, table=None, delay=0.0):
+        self.table = table or {}
+        self.delay = delay
+        self.calls = 0
+
+    async def translate(self, text, src, dest):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.table.get((text, src, dest), text)
+
+
+# --- Кэш в памяти ---
+class LRUCache:
+    # Вытесняет давно не использованные записи, когда суммарный размер
+    # ключей и значений (в символах) превышает max_size
+    def __init__(self, max_size=1_000_000):
+        self.max_size = max_size
+        self.size = 0
+        self._items = OrderedDict()
+
+    @staticmethod
+    def _sizeof(key, value):
+        return sum(len(part) for part in key) + len(value)
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= self._sizeof(key, old)
+        self._items[key] = value
+        self.size += self._sizeof(key, value)
+        while self.size > self.max_size and self._items:
+            old_key, old_value = self._items.popitem(last=False)
+            self.size -= self._sizeof(old_key, old_value)
+
+    def __len__(self):
+        return len(self._items)
+
+
+# --- Сервис ---
+class TranslationService:
+    # Порядок поиска: LRU в памяти -> таблица translation_cache -> бэкенд.
+    # Одновременные запросы одного и того же (text, src, dest) ждут один вызов бэкенда.
+    def __init__(self, backend, db=None, timeout=5.0, concurrency=4, cache_size=1_000_000, ttl=30 * 24 * 3600):
+        self.backend = backend
+        self.db = db
+        self.timeout = timeout
+        self.ttl = ttl
+        self.stats = Counter()
+        self._memory = LRUCache(cache_size)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._inflight = {}
+
+    async def translate(self, text, src, dest):
+        key = (text.strip().lower(), src, dest)
+        cached = self._memory.get(key)
+        if cached is not None:
+            self.stats["memory_hits"] += 1
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.stats["coalesced"] += 1
+        # shield: отмена одного ожидающего не должна отменять запрос для остальных
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(self, key):
+        text, src, dest = key
+        if self.db is not None:
+            cached = await self.db.get_cached_translation(text, src, dest, time.time() - self.ttl)
+            if cached is not None:
+                self.stats["disk_hits"] += 1
+                self._memory.put(key, cached)
+                return cached
+        self.stats["misses"] += 1
+        async with self._semaphore:
+            start = time.perf_counter()
+            outcome = "ok"
+            try:
+                result = await asyncio.wait_for(self.backend.translate(text, src, dest), self.timeout)
+            except asyncio.TimeoutError:
+                self.stats["errors"] += 1
+                outcome = "timeout"
+                raise TranslationError("переводчик не ответил вовремя")
+            except Exception as e:
+                self.stats["errors"] += 1
+                outcome = "error"
+                raise TranslationError(str(e)) from e
+            finally:
+                elapsed = time.perf_counter() - start
+                TRANSLATOR_SECONDS.observe(elapsed, backend=self.backend.name, outcome=outcome)
+                check_slow("translate", self.backend.name, elapsed)
+        self._memory.put(key, result)
+        if self.db is not None:
+            await self.db.put_cached_translation(text, src, dest, result, time.time())
+        return result
+
+    async def purge_expired(self):
+        if self.db is not None:
+            return await self.db.purge_translation_cache(time.time() - self.ttl)
+        return 0
+
+
+# --- Пакетный перевод ---
+# Список слов или короткий текст: части между переносами строк, запятыми, «;» и концами
+# предложений. Часть до MAX_PHRASE_WORDS слов переводится целиком как фраза, длиннее —
+# по словам. Повторы (без учёта регистра) отбрасываются, берутся первые MAX_BATCH_ITEMS.
+MAX_BATCH_ITEMS = 50
+MAX_PHRASE_WORDS = 3
+_SEPARATORS = re.compile(r"[\n\r\t,;.!?]+")
+_WORD = re.compile(r"[^\W\d_]+(?:[-'’][^\W\d_]+)*")
+
+
+def split_phrases(text):
+    # (фразы, сколько всего нашлось до ограничения)
+    phrases, seen = [], set()
+    for part in _SEPARATORS.split(text):
+        words = _WORD.findall(part)
+        for phrase in [" ".join(words)] if len(words) <= MAX_PHRASE_WORDS else words:
+            key = phrase.lower()
+            if phrase and key not in seen:
+                seen.add(key)
+                phrases.append(phrase)
+    return phrases[:MAX_BATCH_ITEMS], len(phrases)
+
+
+async def translate_batch(items, translate, concurrency=3, on_progress=None):
+    # translate(item) — корутина перевода одного элемента. Одновременно не больше concurrency
+    # переводов; on_progress(готово, всего) вызывается по мере готовности. Результаты —
+    # в порядке items, None там, где перевести не удалось.
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [None] * len(items)
+
+    async def one(i):
+        async with semaphore:
+            try:
+                results[i] = await translate(items[i])
+            except TranslationError:
+                pass
+
+    tasks = [asyncio.ensure_future(one(i)) for i in range(len(items))]
+    try:
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            await task
+            if on_progress is not None:
+                await on_progress(done, len(items))
+    finally:
+        for task in tasks:
+            task.cancel()
+    return results
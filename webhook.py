@@ -0,0 +1,197 @@
+# Приём апдейтов вебхуком на aiohttp. Апдейты обрабатываются параллельно, но не больше
+# concurrency одновременно, а апдейты одного пользователя — строго по очереди: от порядка
+# сообщений зависят DictFSM, TestFSM и тренировка. При остановке новые апдейты получают 503
+# (Telegram пришлёт их повторно), а уже принятые дорабатываются до конца.
+import asyncio
+import contextlib
+import hmac
+import logging
+import signal
+from collections import deque
+
+import aiohttp
+from aiogram.types import Update
+from aiohttp import web
+
+from metrics import Counter, Gauge
+
+log = logging.getLogger("pick_me_bot.webhook")
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+WEBHOOK_PENDING = Gauge("bot_webhook_pending", "Принятые, но ещё не обработанные апдейты")
+WEBHOOK_REJECTED = Counter("bot_webhook_rejected_total", "Апдейты, отклонённые с 503", ["reason"])
+
+
+def update_owner(update):
+    # Ключ очереди: пользователь, а если его нет — чат
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id
+    return None
+
+
+class OrderedQueue:
+    # Очереди по владельцу апдейта поверх общего лимита параллельности;
+    # наследники решают, что такое владелец и как обработать апдейт
+    def __init__(self, concurrency=64, max_pending=10_000):
+        self.max_pending = max_pending
+        self.accepting = True
+        self.pending = 0
+        self.processed = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._queues = {}
+        self._tasks = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def submit(self, update):
+        if not self.accepting:
+            WEBHOOK_REJECTED.inc(reason="shutdown")
+            return False
+        if self.pending >= self.max_pending:
+            WEBHOOK_REJECTED.inc(reason="overload")
+            return False
+        self.pending += 1
+        WEBHOOK_PENDING.set(self.pending)
+        self._idle.clear()
+        owner = self.owner(update)
+        if owner is None:
+            self._spawn(self._process(update))
+        elif owner in self._queues:
+            self._queues[owner].append(update)
+        else:
+            self._queues[owner] = deque([update])
+            self._spawn(self._run_queue(owner))
+        return True
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_queue(self, owner):
+        # Одна задача на пользователя; очередь удаляется, когда опустела
+        queue = self._queues[owner]
+        try:
+            while queue:
+                await self._process(queue.popleft())
+        finally:
+            del self._queues[owner]
+
+    def parse(self, data):
+        return data
+
+    def owner(self, update):
+        raise NotImplementedError
+
+    async def handle(self, update):
+        raise NotImplementedError
+
+    async def _process(self, update):
+        try:
+            async with self._semaphore:
+                await self.handle(update)
+        except Exception:
+            log.exception("update processing failed")
+        finally:
+            self.pending -= 1
+            self.processed += 1
+            WEBHOOK_PENDING.set(self.pending)
+            if not self.pending:
+                self._idle.set()
+
+    async def drain(self, timeout=30.0):
+        # Перестаём принимать новые апдейты и ждём принятые
+        self.accepting = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("drain timed out, cancelling %d pending updates", self.pending)
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class UpdateProcessor(OrderedQueue):
+    def __init__(self, dp, bot, concurrency=64, max_pending=10_000):
+        super().__init__(concurrency, max_pending)
+        self.dp = dp
+        self.bot = bot
+
+    def parse(self, data):
+        return Update.model_validate(data, context={"bot": self.bot})
+
+    def owner(self, update):
+        return update_owner(update)
+
+    async def handle(self, update):
+        await self.dp.feed_update(self.bot, update)
+
+
+def make_app(processor, path="/webhook", secret=None):
+    async def handle(request):
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=401)
+        if not processor.submit(processor.parse(await request.json())):
+            return web.Response(status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
+
+
+async def wait_listening(http, url, timeout=30.0):
+    # Ждём, пока сервер начнёт принимать соединения (ответ на GET не важен)
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        try:
+            async with http.get(url):
+                return
+        except aiohttp.ClientConnectionError:
+            if asyncio.get_running_loop().time() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+def stop_on_signals(stop, on_signal=None):
+    # on_signal вызывается прямо в обработчике сигнала, до того как кто-то дождётся stop
+    def handler():
+        if on_signal is not None:
+            on_signal()
+        stop.set()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, handler)
+
+
+async def run_webhook(dp, bot, host="0.0.0.0", port=8080, path="/webhook", url=None, secret=None,
+                      concurrency=64, drain_timeout=30.0, stop=None):
+    # url — публичный адрес, по которому Telegram достучится до сервера; без него вебхук
+    # не регистрируется (например, когда апдейты шлёт локальная заглушка)
+    processor = UpdateProcessor(dp, bot, concurrency)
+    runner = web.AppRunner(make_app(processor, path, secret))
+    await runner.setup()
+    stop = stop or asyncio.Event()
+    stop_on_signals(stop)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await web.TCPSite(runner, host, port).start()
+        if url:
+            await bot.set_webhook(url.rstrip("/") + path, secret_token=secret,
+                                  allowed_updates=dp.resolve_used_update_types())
+        log.info("webhook is listening on %s:%s%s", host, port, path)
+        await stop.wait()
+        await processor.drain(drain_timeout)
+    finally:
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+    return processor